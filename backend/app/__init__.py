@@ -11,15 +11,24 @@ from .routes.owner import owner_bp
 from .routes.reservation import reservation_bp
 from .routes.staff import staff_bp
 from .routes.pickup_places import pp_bp
+from .routes.frontend import frontend_bp
 from .mongodb import init_mongodb
+from .utils.auth import init_auth
+from .utils.json_provider import OrjsonProvider
+from .utils.compression import init_compression
+from .utils.replica import LSN_HEADER, init_replica
+from .commands import init_commands
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # 以 orjson 序列化所有 API 回應
+    app.json = OrjsonProvider(app)
+
     # 啟用 CORS (允許前端請求)
-    CORS(app, resources={r"/*": {"origins": "*"}})
+    CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=[LSN_HEADER])
 
     # 初始化 SQLAlchemy
     db.init_app(app)
@@ -31,6 +40,12 @@ def create_app():
         # 初始化 MongoDB（建立索引、驗證連線）
         init_mongodb(app)
 
+    # 註冊 auth middleware（每個 request 只解析一次 token）
+    init_auth(app)
+
+    # 讀取副本路由：記錄寫入 request，讓同一個使用者之後的讀取短時間內走主庫
+    init_replica(app)
+
     # 註冊 Blueprint
     app.register_blueprint(auth_bp)
     app.register_blueprint(item_bp)
@@ -39,5 +54,13 @@ def create_app():
     app.register_blueprint(reservation_bp)
     app.register_blueprint(staff_bp)
     app.register_blueprint(pp_bp)
+    if app.config.get("FRONTEND_DIR"):
+        app.register_blueprint(frontend_bp)
+
+    # 回應壓縮（after_request）
+    init_compression(app)
+
+    # 註冊排程用的 CLI 指令（flask mark-overdue）
+    init_commands(app)
 
     return app
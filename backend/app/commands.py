@@ -0,0 +1,207 @@
+"""
+排程 / 維運用的 Flask CLI 指令
+
+用法：
+    cd backend
+    flask --app run mark-overdue                  # 執行一次
+    flask --app run mark-overdue --interval 300   # 每 300 秒執行一次
+    flask --app run archive --older-than-months 6 # 封存已刪除 / 已結束的資料
+    flask --app run compress-frontend             # 產生前端靜態檔的 .gz / .br
+    flask --app run check-credits [--repair]      # 核對 member_root_credit 帳本與 contribution
+    flask --app run relay-outbox --interval 5     # 持續把 outbox 事件送到 MongoDB
+    flask --app run deactivate-staff 12           # 停用員工並改派尚未結案的檢舉 / 驗證
+    flask --app run export-sessions               # TTL 刪除前把舊的 user_sessions 匯出成 .jsonl.gz
+    flask --app run load-sessions --start 2026-01-01 --end 2026-01-31  # 匯回一段日期供分析
+"""
+import os
+import time
+
+import click
+from flask import current_app
+from sqlalchemy import text
+
+from app.extensions import db
+from app.services.loan_service import mark_overdue_loans
+from app.services.contribution import check_credit_ledger
+from app.services.archive_service import archive_cold_rows, ARCHIVE_AFTER_MONTHS
+from app.services.staff_assignment import deactivate_staff
+from app.services.outbox import JsonlSink, outbox_status, prune_outbox, relay_outbox
+from app.mongodb.session_retention import export_sessions, load_sessions
+from app.routes.frontend import FRONTEND_FILES
+from app.utils.compression import precompress_file
+
+
+@click.command("mark-overdue")
+@click.option("--batch-size", default=1000, show_default=True, help="每個 transaction 標記的 loan 數量上限")
+@click.option("--interval", default=0, show_default=True, help="大於 0 時持續執行，每次間隔秒數")
+def mark_overdue_command(batch_size, interval):
+    """標記已逾期且尚未歸還的 loan（寫入 Mark_overdue 事件）。"""
+    while True:
+        stats = mark_overdue_loans(batch_size)
+        if stats.get("skipped"):
+            click.echo(f"⏭️  {stats['message']}")
+        else:
+            click.echo(f"✅ 標記 {stats['marked_count']} 筆逾期借用"
+                       f"（{stats['batch_count']} 批，{stats['duration_ms']} ms）")
+        if interval <= 0:
+            break
+        time.sleep(interval)
+
+
+@click.command("archive")
+@click.option("--older-than-months", default=ARCHIVE_AFTER_MONTHS, show_default=True,
+              help="歸還超過幾個月的預約才封存（已刪除的預約不受此限制）")
+@click.option("--batch-size", default=500, show_default=True, help="每個 transaction 搬移的資料列數量上限")
+@click.option("--sleep", default=0.1, show_default=True, help="批次之間暫停秒數")
+def archive_command(older_than_months, batch_size, sleep):
+    """把已軟刪除與已結束的資料列搬到 *_archive 表。"""
+    stats = archive_cold_rows(older_than_months, batch_size, sleep)
+    if stats.get("skipped"):
+        click.echo(f"⏭️  {stats['message']}")
+        return
+    duration_ms = stats.pop("duration_ms")
+    click.echo("✅ 封存完成：" + "，".join(f"{table} {count} 筆" for table, count in stats.items())
+               + f"（{duration_ms} ms）")
+
+
+@click.command("compress-frontend")
+@click.option("--directory", default=None, help="前端目錄（預設為 FRONTEND_DIR 或專案的 frontend/）")
+def compress_frontend_command(directory):
+    """預先壓縮 index.html、app.js（部署或修改前端後執行）。"""
+    directory = directory or current_app.config.get("FRONTEND_DIR") or os.path.join(
+        current_app.root_path, "..", "..", "frontend")
+    for filename in FRONTEND_FILES:
+        path = os.path.join(os.path.abspath(directory), filename)
+        for target in precompress_file(path):
+            click.echo(f"✅ {target}（{os.path.getsize(path)} -> {os.path.getsize(target)} bytes）")
+
+
+@click.command("check-credits")
+@click.option("--repair", is_flag=True, help="以 contribution 為準修正 root_c_id 與額度帳本")
+@click.option("--limit", default=20, show_default=True, help="最多列出幾筆不一致的資料")
+def check_credits_command(repair, limit):
+    """核對 member_root_credit 帳本與 contribution 是否一致。"""
+    try:
+        db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+        result = check_credit_ledger(db.session, repair=repair)
+        if repair:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for row in result["root_mismatches"][:limit]:
+        click.echo(f"   contribution (m_id={row['m_id']}, i_id={row['i_id']}): "
+                   f"root_c_id {row['root_c_id']} -> {row['expected_root_c_id']}")
+    for row in result["credit_mismatches"][:limit]:
+        click.echo(f"   member_root_credit (m_id={row['m_id']}, root_c_id={row['root_c_id']}): "
+                   f"available {row['available_credits']} -> {row['expected_available']}, "
+                   f"used {row['used_credits']} -> {row['expected_used']}")
+
+    count = len(result["root_mismatches"]) + len(result["credit_mismatches"])
+    if not count:
+        click.echo("✅ 額度帳本與 contribution 一致")
+    elif repair:
+        click.echo(f"🔧 已修正 {count} 筆不一致的資料")
+    else:
+        click.echo(f"❌ {count} 筆不一致（加上 --repair 修正）")
+        raise SystemExit(1)
+
+
+@click.command("relay-outbox")
+@click.option("--sink", type=click.Choice(["mongo", "jsonl"]), default="mongo", show_default=True,
+              help="事件送往 MongoDB（domain_events / user_sessions）或 JSON Lines 檔案")
+@click.option("--path", default="outbox.jsonl", show_default=True, help="--sink jsonl 時寫入的檔案")
+@click.option("--batch-size", default=500, show_default=True, help="每批送出的事件數量上限")
+@click.option("--max-attempts", default=10, show_default=True, help="失敗超過此次數的事件不再重送")
+@click.option("--interval", default=0, show_default=True, help="大於 0 時持續執行，每次間隔秒數")
+@click.option("--retention-days", default=0, show_default=True, help="大於 0 時刪除送出超過此天數的事件")
+def relay_outbox_command(sink, path, batch_size, max_attempts, interval, retention_days):
+    """把 outbox 中尚未送出的事件送到 sink（at-least-once，接收端以 dedup_key 去重）。"""
+    if sink == "mongo":
+        from app.mongodb.outbox_sink import MongoSink
+        target = MongoSink()
+    else:
+        target = JsonlSink(path)
+
+    while True:
+        stats = relay_outbox(target, batch_size, max_attempts)
+        click.echo(f"✅ 送出 {stats['published']} 個事件（{stats['batches']} 批，{stats['duration_ms']} ms）")
+        if stats.get("error"):
+            click.echo(f"⚠️  {stats['failed']} 個事件送出失敗：{stats['error']}")
+        if retention_days > 0:
+            click.echo(f"🧹 刪除 {prune_outbox(retention_days)} 個已送出的事件")
+        if interval <= 0:
+            status = outbox_status(max_attempts)
+            click.echo(f"待送出 {status['pending']} 個（最舊 {status['oldest_pending_at'] or '-'}），"
+                       f"超過重試次數 {status['dead']} 個")
+            break
+        time.sleep(interval)
+
+
+@click.command("deactivate-staff")
+@click.argument("s_id", type=int)
+def deactivate_staff_command(s_id):
+    """停用員工，並把尚未結案的檢舉與驗證改派給負載最低的其他員工。"""
+    try:
+        moved = deactivate_staff(db.session, s_id)
+        if moved is None:
+            db.session.rollback()
+            raise click.ClickException(f"找不到員工 s_id={s_id}（role 需為 Employee）")
+        db.session.commit()
+    except click.ClickException:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo(f"✅ 已停用員工 {s_id}，改派 {moved['reports']} 筆檢舉、{moved['verifications']} 筆驗證")
+
+
+@click.command("export-sessions")
+@click.option("--directory", default=None, help="匯出目錄（預設為 SESSION_EXPORT_DIR）")
+@click.option("--older-than-days", default=None, type=int, help="匯出幾天前的 session（預設為 SESSION_EXPORT_AFTER_DAYS）")
+@click.option("--batch-size", default=1000, show_default=True, help="每次從 MongoDB 讀取的文件數量")
+def export_sessions_command(directory, older_than_days, batch_size):
+    """把 updated_at 較舊的 user_sessions 依日期匯出成 gzip 壓縮的 JSON Lines（已匯出的日期略過）。"""
+    directory = directory or current_app.config["SESSION_EXPORT_DIR"]
+    if older_than_days is None:
+        older_than_days = current_app.config["SESSION_EXPORT_AFTER_DAYS"]
+    ttl_days = current_app.config["SESSION_TTL_DAYS"]
+    if 0 < ttl_days <= older_than_days:
+        raise click.ClickException(f"--older-than-days 需小於 SESSION_TTL_DAYS（{ttl_days}），否則 session 會在匯出前被刪除")
+
+    stats = export_sessions(directory, older_than_days, batch_size)
+    for path in stats["files"]:
+        click.echo(f"   {path}")
+    click.echo(f"✅ 匯出 {stats['sessions']} 個 session（{stats['days']} 天，略過已匯出的 {stats['skipped_days']} 天，"
+               f"{stats['duration_ms']} ms）")
+
+
+@click.command("load-sessions")
+@click.option("--start", required=True, type=click.DateTime(formats=["%Y-%m-%d"]), help="起始日期（包含）")
+@click.option("--end", required=True, type=click.DateTime(formats=["%Y-%m-%d"]), help="結束日期（包含）")
+@click.option("--directory", default=None, help="匯出目錄（預設為 SESSION_EXPORT_DIR）")
+@click.option("--target", default="user_sessions_restored", show_default=True, help="匯入的 collection")
+@click.option("--batch-size", default=1000, show_default=True, help="每次寫入 MongoDB 的文件數量")
+def load_sessions_command(start, end, directory, target, batch_size):
+    """把 export-sessions 匯出的一段日期匯入另一個 collection 分析。"""
+    directory = directory or current_app.config["SESSION_EXPORT_DIR"]
+    try:
+        stats = load_sessions(directory, start.date(), end.date(), target, batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✅ 匯入 {stats['sessions']} 個 session 到 {target}（{stats['days']} 天，"
+               f"{stats['missing_days']} 天沒有檔案，{stats['duration_ms']} ms）")
+
+
+def init_commands(app):
+    app.cli.add_command(mark_overdue_command)
+    app.cli.add_command(archive_command)
+    app.cli.add_command(compress_frontend_command)
+    app.cli.add_command(check_credits_command)
+    app.cli.add_command(relay_outbox_command)
+    app.cli.add_command(deactivate_staff_command)
+    app.cli.add_command(export_sessions_command)
+    app.cli.add_command(load_sessions_command)
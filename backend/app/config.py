@@ -7,6 +7,39 @@ load_dotenv()
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 讀取副本（選填）：@read_only 的 service 函式在副本延遲不超過 REPLICA_MAX_LAG_SECONDS 時改讀副本，
+    # 副本尚未套用到使用者最後一次寫入的位置（X-Last-Write-LSN）時仍讀主庫；副本連線失敗後 REPLICA_RETRY_SECONDS 秒內不使用副本
+    SQLALCHEMY_BINDS = {"replica": os.getenv("REPLICA_DATABASE_URL")} if os.getenv("REPLICA_DATABASE_URL") else {}
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "1"))
+    REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
+    # 已驗證 JWT claims 的 LRU 快取大小（0 表示關閉快取）
+    JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "4096"))
+    # 會員借用資格快照的 LRU 快取大小（0 表示關閉快取）；類別樹每 CATEGORY_TREE_REFRESH_SECONDS 秒重新載入
+    ELIGIBILITY_CACHE_SIZE = int(os.getenv("ELIGIBILITY_CACHE_SIZE", "10000"))
+    CATEGORY_TREE_REFRESH_SECONDS = float(os.getenv("CATEGORY_TREE_REFRESH_SECONDS", "300"))
+    # 密碼雜湊設定：werkzeug method 字串（演算法:參數），變更後使用者登入時會自動重新雜湊
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:260000")
+    # 密碼驗證 process pool 大小（0 表示在 request thread 直接驗證）
+    PASSWORD_VERIFY_WORKERS = int(os.getenv("PASSWORD_VERIFY_WORKERS", "2"))
+    PASSWORD_VERIFY_QUEUE_FACTOR = int(os.getenv("PASSWORD_VERIFY_QUEUE_FACTOR", "4"))
+    PASSWORD_VERIFY_TIMEOUT = float(os.getenv("PASSWORD_VERIFY_TIMEOUT", "10"))
+    # 派工 heap 從資料庫重新載入員工負載的間隔（秒）
+    STAFF_ASSIGNMENT_REFRESH_SECONDS = float(os.getenv("STAFF_ASSIGNMENT_REFRESH_SECONDS", "30"))
+    # 回應壓縮：依 Accept-Encoding 使用 br / gzip，小於 COMPRESSION_MIN_SIZE bytes 的回應不壓縮
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))  # gzip 1-9
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # brotli 0-11
+    COMPRESSION_MIMETYPES = ("application/json", "application/x-ndjson", "text/html", "text/css",
+                             "text/javascript", "application/javascript", "text/plain", "text/csv")
+    # 由後端提供前端靜態檔（index.html、app.js）時的目錄，空字串表示不提供
+    FRONTEND_DIR = os.getenv("FRONTEND_DIR", "")
     # MongoDB 連線設定
     MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+    # user_sessions 超過 SESSION_TTL_DAYS 天沒有更新時由 TTL index 刪除（0 表示不刪除）；
+    # export-sessions 匯出 SESSION_EXPORT_AFTER_DAYS 天前的 session 到 SESSION_EXPORT_DIR（需小於 SESSION_TTL_DAYS）
+    SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "90"))
+    SESSION_EXPORT_AFTER_DAYS = int(os.getenv("SESSION_EXPORT_AFTER_DAYS", "60"))
+    SESSION_EXPORT_DIR = os.getenv("SESSION_EXPORT_DIR", "session_archive")
@@ -7,6 +7,7 @@ PostgreSQL CSV 匯入工具
 
 import os
 import csv
+from datetime import datetime
 import psycopg2
 from psycopg2.extras import execute_values
 from urllib.parse import urlparse
@@ -25,6 +26,8 @@ TARGET_DB_NAME = "our_things"
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 MONGODB_DB_NAME = "our_things_funnel_tracking"
 MONGODB_COLLECTION_NAME = "user_sessions"
+# 與 app/config.py 的 SESSION_TTL_DAYS 相同（後端啟動時也會依設定調整 TTL）
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "90"))
 
 # CSV 檔案路徑（相對於此腳本）
 # 腳本在 backend/app/db/import_csv.py，CSV 在 backend/app/db/csv/
@@ -35,11 +38,20 @@ CSV_DIR = "csv"
 SCHEMA_SQL_PATH = "schema.sql"
 SETNEXTVAL_SQL_PATH = "setnextval.sql"
 SETINDEX_SQL_PATH = "setindex.sql"
+SETREADMODEL_SQL_PATH = "setreadmodel.sql"
 
 # MongoDB 索引腳本路徑
 MONGODB_INDEX_SCRIPT_PATH = "create_nosql_indexes.js"
 
+
+
+def seconds_to_ms(value):
+    """loan_event.csv 的 timestamp 以秒記錄，應用程式與分區邊界使用毫秒"""
+    return str(int(value) * 1000) if int(value) < 10 ** 11 else value
+
+
 # 表格與 CSV 檔案的對應關係
+# transforms：匯入前轉換欄位值；lookups：CSV 沒有的欄位，以另一個欄位查詢已匯入的資料填入
 TABLE_MAPPINGS = {
     "member": {
         "file": "member.csv",
@@ -91,11 +103,13 @@ TABLE_MAPPINGS = {
     },
     "loan": {
         "file": "loan.csv",
-        "columns": ["l_id", "rd_id", "actual_start_at", "actual_return_at", "is_deleted"]
+        "columns": ["l_id", "rd_id", "est_start_at", "actual_start_at", "actual_return_at", "is_deleted"],
+        "lookups": {"est_start_at": ("rd_id", "SELECT rd_id, est_start_at FROM reservation_detail")}
     },
     "loan_event": {
         "file": "loan_event.csv",
-        "columns": ["timestamp", "event_type", "l_id"]
+        "columns": ["timestamp", "event_type", "l_id"],
+        "transforms": {"timestamp": seconds_to_ms}
     },
     "review": {
         "file": "review.csv",
@@ -395,6 +409,20 @@ def init_mongodb():
             if "already exists" not in str(e).lower():
                 print(f"      ⚠️  索引 events.timestamp 建立時發生錯誤: {str(e)[:80]}")
 
+        try:
+            # 7. updated_at (TTL，超過 SESSION_TTL_DAYS 天沒有更新的 session 自動刪除；0 表示不刪除)
+            if SESSION_TTL_DAYS > 0:
+                collection.create_index([("updated_at", 1)], name="updated_at_1",
+                                        expireAfterSeconds=int(SESSION_TTL_DAYS * 86400))
+                print(f"      ✅ 索引 7: updated_at (TTL {SESSION_TTL_DAYS:g} 天) 建立完成")
+            else:
+                collection.create_index([("updated_at", 1)], name="updated_at_1")
+                print("      ✅ 索引 7: updated_at 建立完成")
+            indexes_created += 1
+        except Exception as e:
+            if "already exists" not in str(e).lower():
+                print(f"      ⚠️  索引 updated_at 建立時發生錯誤: {str(e)[:80]}")
+
         print(f"   ✅ MongoDB 索引建立完成（共 {indexes_created} 個索引）")
 
         # 顯示所有索引
@@ -436,21 +464,36 @@ def import_table(conn, table_name, mapping):
 
         # 準備資料
         columns = mapping["columns"]
+        transforms = mapping.get("transforms", {})
+        lookups = {}
         values = []
 
         # 檢查第一筆資料是否包含所有需要的欄位
         if data:
-            missing_cols = [col for col in columns if col not in data[0]]
+            missing_cols = [col for col in columns
+                            if col not in data[0] and col not in mapping.get("lookups", {})]
             if missing_cols:
                 print(f"   ❌ CSV 檔案缺少欄位: {missing_cols}")
                 print(f"   ℹ️  CSV 檔案實際欄位: {list(data[0].keys())}")
                 return False
 
+        cursor = conn.cursor()
+        for col, (key_col, lookup_sql) in mapping.get("lookups", {}).items():
+            cursor.execute(lookup_sql)
+            lookups[col] = (key_col, {str(key): value for key, value in cursor.fetchall()})
+        cursor.close()
+
         for row in data:
             # 只取需要的欄位，並按照順序排列
             row_values = []
             for col in columns:
+                if col in lookups:
+                    key_col, lookup = lookups[col]
+                    row_values.append(lookup.get(row.get(key_col)))
+                    continue
                 value = row.get(col)
+                if value is not None and col in transforms:
+                    value = transforms[col](value)
                 if value is None and col in row:
                     # 欄位存在但值為空字串（已在 read_csv 中轉為 None）
                     pass
@@ -480,6 +523,26 @@ def import_table(conn, table_name, mapping):
         return False
 
 
+def create_seed_partitions(conn):
+    """依 CSV 資料的時間範圍建立月分區（在匯入前執行，讓資料直接寫入各月分區而不是 DEFAULT 分區）"""
+    from partitions import ensure_partitions, add_months
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    seed_times = {
+        "reservation_detail": [
+            datetime.fromisoformat(row["est_start_at"])
+            for row in read_csv(os.path.join(script_dir, CSV_DIR, "reservation_detail.csv"))],
+        "loan_event": [
+            datetime.fromtimestamp(int(seconds_to_ms(row["timestamp"])) / 1000)
+            for row in read_csv(os.path.join(script_dir, CSV_DIR, "loan_event.csv"))],
+    }
+    future = add_months(datetime.now(), 3)
+    for table, times in seed_times.items():
+        first = min(times, default=datetime.now())
+        created = ensure_partitions(conn, table, first, max(max(times, default=future), future))
+        print(f"   ✅ {table}: 建立 {created} 個月分區")
+
+
 def main():
     """主函數"""
     if not DATABASE_URL:
@@ -525,6 +588,9 @@ def main():
             conn.close()
             return
 
+        print("\n📋 步驟 5-1: 建立月分區...")
+        create_seed_partitions(conn)
+
         # 步驟 6: 匯入 CSV 資料
         print("\n📋 步驟 6: 匯入 CSV 資料...")
         import_order = [
@@ -567,8 +633,21 @@ def main():
         else:
             print("✅ 索引建立完成")
 
-        # 步驟 9: 初始化 MongoDB
-        print("\n📋 步驟 9: 初始化 MongoDB...")
+        # 步驟 9: 執行 setreadmodel.sql 重建 read model
+        print("\n📋 步驟 9: 重建 read model...")
+        if not execute_sql_file(conn, SETREADMODEL_SQL_PATH):
+            print("⚠️  重建 read model 時發生錯誤，但資料已匯入")
+        else:
+            print("✅ read model 重建完成")
+
+        # 步驟 10: 標記 migration 為已套用（schema.sql / setindex.sql 已包含所有 migration）
+        print("\n📋 步驟 10: 建立 migration 紀錄...")
+        from migrate import ensure_migrations_table, cmd_baseline
+        ensure_migrations_table(conn)
+        cmd_baseline(conn)
+
+        # 步驟 11: 初始化 MongoDB
+        print("\n📋 步驟 11: 初始化 MongoDB...")
         if not init_mongodb():
             print("⚠️  MongoDB 初始化失敗，但 PostgreSQL 資料庫已準備就緒")
             print("   💡 提示: 請確認 MongoDB 服務是否正在運行")
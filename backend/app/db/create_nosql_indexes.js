@@ -28,6 +28,10 @@ print("✅ 索引 5: funnel_stage 建立完成");
 db.user_sessions.createIndex({ "events.timestamp": 1 });
 print("✅ 索引 6: events.timestamp 建立完成");
 
+// 7. updated_at (TTL：90 天沒有更新的 session 自動刪除，與 SESSION_TTL_DAYS 預設值相同)
+db.user_sessions.createIndex({ "updated_at": 1 }, { expireAfterSeconds: 90 * 86400 });
+print("✅ 索引 7: updated_at (TTL) 建立完成");
+
 print("\n🎉 所有索引建立完成！");
 
 // 顯示所有索引
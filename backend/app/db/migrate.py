@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Forward-only schema migration 工具
+不需要像 SetDB.py 一樣刪除重建整個資料庫，就能套用 schema / index 變更
+
+- migrations/NNNN_name.sql：
+    含 CONCURRENTLY 的語句（或檔案中有 "-- migrate:no-transaction"）逐句以 autocommit 執行，
+    其餘檔案整個包在一個 transaction 中執行
+- migrations/NNNN_name.py：
+    定義 upgrade(m)，可使用 m.execute(sql) 與 m.backfill(sql, ...) 做分批、限速的資料回填
+- 已套用的版本記錄在 schema_migrations；新的 migration 也要同步寫進 schema.sql / setindex.sql，
+  SetDB.py 建立新資料庫後會把現有版本全部標記為已套用（baseline）
+
+用法：
+    cd backend/app/db
+    python migrate.py status
+    python migrate.py up --dry-run
+    python migrate.py up [--target 3] [--batch-size 5000] [--sleep 0.1]
+    python migrate.py baseline
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+from SetDB import parse_database_url, TARGET_DB_NAME
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# 避免多個 migrate 同時執行
+ADVISORY_LOCK_ID = 743_000_001
+
+# DDL 等待 table lock 的上限，逾時就失敗重跑，而不是在鎖佇列中擋住線上查詢
+DEFAULT_LOCK_TIMEOUT = "5s"
+
+_CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+
+def split_sql(sql_content):
+    """
+    依分號切分 SQL 語句（與 SetDB.execute_sql_file 相同的規則：略過空行與註解行）。
+    $$ 包住的 function body 內的分號不會被切開。
+    """
+    statements = []
+    current_stmt = ""
+    in_dollar = False
+    for line in sql_content.split('\n'):
+        stripped = line.strip()
+        if not in_dollar and (not stripped or stripped.startswith('--')):
+            continue
+        current_stmt += line + '\n'
+        if line.count("$$") % 2 == 1:
+            in_dollar = not in_dollar
+        if not in_dollar and stripped.endswith(';'):
+            statements.append(current_stmt.strip())
+            current_stmt = ""
+    if current_stmt.strip():
+        statements.append(current_stmt.strip())
+    return statements
+
+
+def discover_migrations():
+    """
+    回傳依版本排序的 [(version, name, path)]
+    """
+    migrations = []
+    if not os.path.isdir(MIGRATIONS_DIR):
+        return migrations
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r"^(\d+)_(\w+)\.(sql|py)$", filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2),
+                               os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("migration 版本號重複")
+    return migrations
+
+
+def file_checksum(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class MigrationContext:
+    """
+    傳給 Python migration 的 upgrade(m)。
+    每個 execute 是獨立的 transaction；backfill 每一批 commit 一次。
+    """
+
+    def __init__(self, conn, dry_run=False, batch_size=5000, sleep=0.1):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.sleep = sleep
+
+    def execute(self, sql, params=None):
+        if self.dry_run:
+            print(f"      [dry-run] {' '.join(sql.split())[:120]}")
+            return None
+        return run_statement(self.conn, sql, params)
+
+    def backfill(self, sql, params=None, batch_size=None, sleep=None, max_batches=None):
+        """
+        重複執行 sql 直到影響列數為 0。
+        sql 需用 %(batch_size)s 限制每批列數，例如：
+            UPDATE loan SET status = ... WHERE l_id IN (
+                SELECT l_id FROM loan WHERE status IS NULL LIMIT %(batch_size)s
+            )
+        """
+        batch_size = batch_size or self.batch_size
+        sleep = self.sleep if sleep is None else sleep
+        params = dict(params or {}, batch_size=batch_size)
+        if self.dry_run:
+            print(f"      [dry-run] backfill (batch_size={batch_size}, sleep={sleep}s): "
+                  f"{' '.join(sql.split())[:100]}")
+            return 0
+
+        total = 0
+        batches = 0
+        while True:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, params)
+            affected = cursor.rowcount
+            cursor.close()
+            self.conn.commit()
+            total += max(affected, 0)
+            batches += 1
+            if affected <= 0 or (max_batches and batches >= max_batches):
+                break
+            print(f"      ↻ 已回填 {total} 筆")
+            time.sleep(sleep)  # 讓出 I/O 給線上查詢
+        return total
+
+
+def run_statement(conn, stmt, params=None):
+    """
+    以 autocommit 執行單一語句；CREATE INDEX CONCURRENTLY 失敗時清掉留下的 INVALID index。
+    """
+    previous = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute(stmt, params)
+        return cursor.rowcount
+    except psycopg2.Error:
+        match = _CONCURRENT_INDEX.search(stmt)
+        if match:
+            cursor.execute("""
+                SELECT 1 FROM pg_index ix JOIN pg_class c ON c.oid = ix.indexrelid
+                WHERE c.relname = %s AND NOT ix.indisvalid
+            """, (match.group(1),))
+            if cursor.fetchone():
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+                print(f"      🧹 已移除建立失敗的 INVALID index: {match.group(1)}")
+        raise
+    finally:
+        cursor.close()
+        conn.autocommit = previous
+
+
+def ensure_migrations_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+    conn.commit()
+    cursor.close()
+
+
+def applied_migrations(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        conn.commit()
+        cursor.close()
+        return {}
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    result = dict(cursor.fetchall())
+    conn.commit()
+    cursor.close()
+    return result
+
+
+def record_migration(cursor, version, name, checksum):
+    cursor.execute("""
+        INSERT INTO schema_migrations (version, name, checksum)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (version) DO NOTHING
+    """, (version, name, checksum))
+
+
+def apply_sql_migration(conn, version, name, path, dry_run):
+    with open(path, 'r', encoding='utf-8') as f:
+        sql_content = f.read()
+    statements = split_sql(sql_content)
+    no_transaction = ("migrate:no-transaction" in sql_content
+                      or any(_CONCURRENT_INDEX.search(stmt) for stmt in statements))
+
+    if dry_run:
+        mode = "autocommit" if no_transaction else "transaction"
+        print(f"      [dry-run] {len(statements)} 個語句（{mode}）")
+        for stmt in statements:
+            print(f"      [dry-run] {' '.join(stmt.split())[:120]}")
+        return
+
+    if no_transaction:
+        for stmt in statements:
+            run_statement(conn, stmt)
+        cursor = conn.cursor()
+        record_migration(cursor, version, name, file_checksum(path))
+        conn.commit()
+        cursor.close()
+        return
+
+    cursor = conn.cursor()
+    try:
+        for stmt in statements:
+            cursor.execute(stmt)
+        record_migration(cursor, version, name, file_checksum(path))
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def apply_py_migration(conn, version, name, path, dry_run, batch_size, sleep):
+    spec = importlib.util.spec_from_file_location(f"migration_{version:04d}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(MigrationContext(conn, dry_run, batch_size, sleep))
+    if not dry_run:
+        cursor = conn.cursor()
+        record_migration(cursor, version, name, file_checksum(path))
+        conn.commit()
+        cursor.close()
+
+
+def connect():
+    params = parse_database_url(DATABASE_URL)
+    params['database'] = TARGET_DB_NAME
+    conn = psycopg2.connect(**params)
+    cursor = conn.cursor()
+    cursor.execute(f"SET lock_timeout = '{os.getenv('MIGRATION_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)}'")
+    conn.commit()
+    cursor.close()
+    return conn
+
+
+def cmd_status(conn):
+    applied = applied_migrations(conn)
+    for version, name, path in discover_migrations():
+        if version in applied:
+            mark = "✅" if applied[version] == file_checksum(path) else "⚠️  (檔案在套用後被修改)"
+        else:
+            mark = "⏳ pending"
+        print(f"   {version:04d} {name:<40} {mark}")
+
+
+def cmd_up(conn, target, dry_run, batch_size, sleep):
+    applied = applied_migrations(conn)
+    pending = [m for m in discover_migrations()
+               if m[0] not in applied and (target is None or m[0] <= target)]
+    if not pending:
+        print("✅ 沒有待套用的 migration")
+        return True
+
+    for version, name, path in pending:
+        print(f"📄 {version:04d}_{name}{' (dry-run)' if dry_run else ''}")
+        started = time.perf_counter()
+        try:
+            if path.endswith(".py"):
+                apply_py_migration(conn, version, name, path, dry_run, batch_size, sleep)
+            else:
+                apply_sql_migration(conn, version, name, path, dry_run)
+        except (psycopg2.Error, IOError, ValueError) as e:
+            print(f"   ❌ 套用失敗: {str(e)[:200]}")
+            print("   ℹ️  之後的 migration 不會執行，修正後重新執行即可")
+            return False
+        print(f"   ✅ 完成（{time.perf_counter() - started:.1f}s）")
+    return True
+
+
+def cmd_baseline(conn):
+    """
+    將所有現有 migration 標記為已套用（schema.sql / setindex.sql 已包含它們時使用）
+    """
+    cursor = conn.cursor()
+    for version, name, path in discover_migrations():
+        record_migration(cursor, version, name, file_checksum(path))
+    conn.commit()
+    cursor.close()
+    print("✅ 已將現有 migration 標記為已套用")
+
+
+def main():
+    """
+    回傳 exit code：migration 失敗、另一個 migrate 正在執行或沒有 DATABASE_URL 時為 1，供部署腳本 / cron 判斷。
+    """
+    parser = argparse.ArgumentParser(description="forward-only schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="列出 migration 狀態")
+    up = sub.add_parser("up", help="套用待執行的 migration")
+    up.add_argument("--target", type=int, default=None, help="只套用到此版本")
+    up.add_argument("--dry-run", action="store_true", help="只列出將執行的語句")
+    up.add_argument("--batch-size", type=int, default=5000, help="backfill 每批列數")
+    up.add_argument("--sleep", type=float, default=0.1, help="backfill 每批之間暫停秒數")
+    sub.add_parser("baseline", help="將現有 migration 全部標記為已套用")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print("❌ 錯誤: 請設定 DATABASE_URL 環境變數")
+        return 1
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    if not cursor.fetchone()[0]:
+        print("❌ 另一個 migrate 正在執行中")
+        conn.close()
+        return 1
+    conn.commit()
+    cursor.close()
+
+    try:
+        if not (args.command == "up" and args.dry_run):
+            ensure_migrations_table(conn)
+        if args.command == "status":
+            cmd_status(conn)
+        elif args.command == "up":
+            if not cmd_up(conn, args.target, args.dry_run, args.batch_size, args.sleep):
+                return 1
+        elif args.command == "baseline":
+            cmd_baseline(conn)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
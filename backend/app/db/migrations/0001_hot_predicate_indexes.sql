@@ -0,0 +1,11 @@
+-- 熱門查詢條件缺少的 index（由 bench/index_advisor.py 的建議整理）
+-- item.m_id：get_my_items、get_future_reservation_details、get_reviewable_items
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_m_id ON item(m_id);
+-- loan.actual_return_at：get_my_reservations、get_reviewable_items
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_actual_return_at ON loan(actual_return_at);
+-- review(l_id, reviewer_id)：get_reviewable_items 的 NOT EXISTS、review_item 的重複評論檢查
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_review_l_id_reviewer_id ON review(l_id, reviewer_id);
+-- contribution(m_id, is_active)：create_reservation、delete_reservation、change_contribution
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contribution_m_id_is_active ON contribution(m_id, is_active);
+-- loan_event(l_id, event_type)：conclude_report 的歸還紀錄 anti-join
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_event_l_id_event_type ON loan_event(l_id, event_type);
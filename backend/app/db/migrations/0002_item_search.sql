@@ -0,0 +1,6 @@
+-- 物品搜尋（/item/search）
+-- 使用 expression index 而不是新增 tsvector 欄位，避免 ALTER TABLE 重寫整個 item 表
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_search_tsv ON item USING GIN (to_tsvector('simple', i_name || ' ' || coalesce(description, '')));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_i_name_trgm ON item USING GIN (i_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_description_trgm ON item USING GIN (description gin_trgm_ops);
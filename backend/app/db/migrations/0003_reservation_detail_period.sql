@@ -0,0 +1,5 @@
+-- 可借時段查詢（/item/availability、/item/category/<c_id>/available）
+-- (i_id, est_start_at) 的 btree 只能以 est_start_at < :end 單邊掃描該物品所有歷史預約，
+-- GiST range index 可以直接找出與查詢區間重疊的預約
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_detail_i_id_period ON reservation_detail USING GIST (i_id, tsrange(est_start_at, est_due_at));
@@ -0,0 +1,19 @@
+-- 派工負載計數（app/services/staff_assignment.py）
+CREATE TABLE IF NOT EXISTS staff_workload (
+    s_id BIGINT PRIMARY KEY,
+    open_reports INT NOT NULL DEFAULT 0,
+    open_verifications INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (s_id)
+        REFERENCES staff(s_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
+
+INSERT INTO staff_workload (s_id, open_reports, open_verifications)
+SELECT s.s_id,
+       (SELECT COUNT(*) FROM report re WHERE re.s_id = s.s_id AND re.r_conclusion = 'Pending'),
+       (SELECT COUNT(*) FROM item_verification iv WHERE iv.s_id = s.s_id AND iv.v_conclusion = 'Pending')
+FROM staff s
+ON CONFLICT (s_id) DO UPDATE
+SET open_reports = EXCLUDED.open_reports, open_verifications = EXCLUDED.open_verifications;
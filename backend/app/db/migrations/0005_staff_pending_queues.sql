@@ -0,0 +1,3 @@
+-- 員工待處理佇列（/staff/report、/staff/verification）依 create_at 排序的 keyset 分頁
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_report_pending_queue ON report(s_id, create_at, re_id) WHERE r_conclusion = 'Pending';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_verification_pending_queue ON item_verification(s_id, create_at, iv_id) WHERE v_conclusion = 'Pending';
@@ -0,0 +1,9 @@
+-- 逾期標記排程（flask mark-overdue）
+CREATE TABLE IF NOT EXISTS overdue_job_runs (
+    run_id BIGSERIAL PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    marked_count INT NOT NULL,
+    batch_count INT NOT NULL,
+    duration_ms INT NOT NULL
+);
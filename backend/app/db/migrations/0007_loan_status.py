@@ -0,0 +1,57 @@
+"""
+loan.status：Scheduled（已建立揀貨單）/ Out（已交貨）/ Overdue（逾期）/ Returned（已歸還）
+取代以 loan_event 'Return' anti-join 或 actual_return_at IS NULL 判斷借用是否進行中。
+
+1. 先加 nullable 欄位與 default（新的 loan 直接寫入 status，不需重寫整個表）
+2. 依 loan_event 歷史分批回填既有資料
+3. 以 NOT VALID + VALIDATE 的 CHECK constraint 加上 NOT NULL，避免長時間持有 ACCESS EXCLUSIVE lock
+4. 建立進行中狀態的 partial index，移除不再使用的 loan(actual_return_at) index
+"""
+
+# 與 setreadmodel.sql 相同的推導規則
+DERIVE_STATUS = """
+    CASE
+        WHEN l.actual_return_at IS NOT NULL
+             OR EXISTS (SELECT 1 FROM loan_event le WHERE le.l_id = l.l_id AND le.event_type = 'Return')
+            THEN 'Returned'
+        WHEN EXISTS (SELECT 1 FROM loan_event le WHERE le.l_id = l.l_id AND le.event_type = 'Mark_overdue')
+            THEN 'Overdue'
+        WHEN l.actual_start_at IS NOT NULL
+             OR EXISTS (SELECT 1 FROM loan_event le WHERE le.l_id = l.l_id AND le.event_type = 'Handover')
+            THEN 'Out'
+        ELSE 'Scheduled'
+    END
+"""
+
+
+def upgrade(m):
+    m.execute("ALTER TABLE loan ADD COLUMN IF NOT EXISTS status VARCHAR(10)")
+    m.execute("ALTER TABLE loan ALTER COLUMN status SET DEFAULT 'Scheduled'")
+
+    # 回填期間用來找出尚未回填資料列的暫時 index
+    m.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_status_backfill ON loan(l_id) WHERE status IS NULL")
+    m.backfill(f"""
+        UPDATE loan l
+        SET status = {DERIVE_STATUS}
+        WHERE l.l_id IN (
+            SELECT l_id FROM loan WHERE status IS NULL ORDER BY l_id LIMIT %(batch_size)s
+        )
+    """)
+    m.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_loan_status_backfill")
+
+    m.execute("ALTER TABLE loan DROP CONSTRAINT IF EXISTS loan_status_check")
+    m.execute("""
+        ALTER TABLE loan ADD CONSTRAINT loan_status_check
+        CHECK (status IN ('Scheduled', 'Out', 'Overdue', 'Returned')) NOT VALID
+    """)
+    m.execute("ALTER TABLE loan VALIDATE CONSTRAINT loan_status_check")
+    m.execute("ALTER TABLE loan DROP CONSTRAINT IF EXISTS loan_status_not_null")
+    m.execute("ALTER TABLE loan ADD CONSTRAINT loan_status_not_null CHECK (status IS NOT NULL) NOT VALID")
+    m.execute("ALTER TABLE loan VALIDATE CONSTRAINT loan_status_not_null")
+    # 已有 validated 的 IS NOT NULL constraint，SET NOT NULL 不需再掃描整個表
+    m.execute("ALTER TABLE loan ALTER COLUMN status SET NOT NULL")
+    m.execute("ALTER TABLE loan DROP CONSTRAINT loan_status_not_null")
+
+    m.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_open ON loan(rd_id) WHERE status <> 'Returned'")
+    m.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_out ON loan(rd_id) WHERE status = 'Out'")
+    m.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_loan_actual_return_at")
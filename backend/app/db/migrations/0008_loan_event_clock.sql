@@ -0,0 +1,4 @@
+-- loan_event timestamp 的 hybrid logical clock（app/services/loan_events.py）
+-- PostgreSQL 11+ 以常數 default 新增欄位不會重寫整個表；
+-- 既有事件的 timestamp 都早於現在，GREATEST(現在, 0 + 1) 不會與它們衝突，因此不需回填
+ALTER TABLE loan ADD COLUMN IF NOT EXISTS last_event_ts BIGINT NOT NULL DEFAULT 0;
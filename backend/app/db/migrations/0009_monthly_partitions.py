@@ -0,0 +1,319 @@
+"""
+loan_event（依 timestamp）與 reservation_detail（依 est_start_at）改為每月一個分區的 RANGE partition table。
+既有的表不能直接改成 partitioned table，因此：
+
+0. 在舊表加上 trigger，把之後被新增 / 修改 / 刪除的主鍵記到 *_changes
+1. 把舊表的主鍵與 index 改名（*_unpartitioned），建立同名的 partitioned table（暫名 *_partitioned）、
+   DEFAULT 分區與資料範圍內每個月的分區，並建立 index（新表尚未上線，不需 CONCURRENTLY）
+2. loan 加上 est_start_at（參照分區表的外鍵必須包含分區欄位）並分批回填
+3. 依主鍵順序分批複製資料；loan_event 既有的秒級 timestamp 在複製後分批轉成毫秒
+4. 不持有 table lock，分批套用 *_changes 記錄的變動（複製期間的變動）
+5. 在一個 transaction 內鎖住三個表，只套用步驟 4 之後剩下的變動、交換表名、改接外鍵，之後再移除舊表與 trigger
+
+步驟 5 持有 ACCESS EXCLUSIVE lock 的時間只取決於步驟 4 結束到取得 lock 之間的變動量，與表的大小無關。
+"""
+from datetime import datetime
+
+from partitions import add_months, bounds, months_between, partition_name
+
+# 小於此值的 loan_event.timestamp 是秒（10^11 毫秒約為 1973 年）
+SECONDS_THRESHOLD = 100_000_000_000
+
+RESERVATION_DETAIL_INDEXES = {
+    "idx_reservation_detail_r_id": "(r_id)",
+    "idx_reservation_detail_i_id": "(i_id)",
+    "idx_reservation_detail_time_range": "(i_id, est_start_at, est_due_at)",
+    "idx_reservation_detail_i_id_period": "USING GIST (i_id, tsrange(est_start_at, est_due_at))",
+    "idx_reservation_detail_est_start_at_brin": "USING BRIN (est_start_at)",
+}
+
+LOAN_EVENT_INDEXES = {
+    "idx_loan_event_l_id_event_type": "(l_id, event_type)",
+    "idx_loan_event_timestamp_brin": "USING BRIN (timestamp)",
+}
+
+
+# 記錄變動主鍵的 trigger（AFTER ROW，新舊主鍵都記錄，修改主鍵時兩者都要重新套用）
+CHANGE_TRIGGERS = {
+    "reservation_detail": ("rd_id BIGINT NOT NULL", "rd_id"),
+    "loan_event": ("timestamp BIGINT NOT NULL, l_id BIGINT NOT NULL", "timestamp, l_id"),
+}
+
+
+def _install_change_trigger(m, table):
+    columns_sql, keys = CHANGE_TRIGGERS[table]
+    old_keys = ", ".join(f"OLD.{key.strip()}" for key in keys.split(","))
+    new_keys = ", ".join(f"NEW.{key.strip()}" for key in keys.split(","))
+    m.execute(f"CREATE TABLE IF NOT EXISTS {table}_changes ({columns_sql})")
+    m.execute(f"""
+        CREATE OR REPLACE FUNCTION log_{table}_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                INSERT INTO {table}_changes ({keys}) VALUES ({old_keys});
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO {table}_changes ({keys}) VALUES ({new_keys});
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    m.execute(f"""
+        CREATE OR REPLACE TRIGGER {table}_log_change
+        AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION log_{table}_change()
+    """)
+
+
+def _apply_reservation_detail_changes(limit):
+    """
+    取出一批變動的 rd_id，依舊表目前的內容更新新表（以及 loan.est_start_at）。
+    以 SELECT 取出的筆數作為影響列數，*_changes 清空時為 0。
+    """
+    return f"""
+        WITH batch AS (
+            DELETE FROM reservation_detail_changes
+            WHERE ctid = ANY(ARRAY(SELECT ctid FROM reservation_detail_changes LIMIT {limit}))
+            RETURNING rd_id
+        ),
+        keys AS (SELECT DISTINCT rd_id FROM batch),
+        removed AS (
+            DELETE FROM reservation_detail_partitioned p
+            USING keys k
+            WHERE p.rd_id = k.rd_id
+            AND NOT EXISTS (
+                SELECT 1 FROM reservation_detail rd WHERE rd.rd_id = p.rd_id AND rd.est_start_at = p.est_start_at
+            )
+        ),
+        upserted AS (
+            INSERT INTO reservation_detail_partitioned (rd_id, est_start_at, est_due_at, r_id, i_id, p_id)
+            SELECT rd.rd_id, rd.est_start_at, rd.est_due_at, rd.r_id, rd.i_id, rd.p_id
+            FROM keys k
+            JOIN reservation_detail rd ON rd.rd_id = k.rd_id
+            ON CONFLICT (rd_id, est_start_at) DO UPDATE
+            SET est_due_at = EXCLUDED.est_due_at, r_id = EXCLUDED.r_id, i_id = EXCLUDED.i_id, p_id = EXCLUDED.p_id
+        ),
+        loans AS (
+            UPDATE loan l SET est_start_at = rd.est_start_at
+            FROM keys k
+            JOIN reservation_detail rd ON rd.rd_id = k.rd_id
+            WHERE l.rd_id = rd.rd_id AND l.est_start_at IS DISTINCT FROM rd.est_start_at
+        )
+        SELECT 1 FROM batch
+    """
+
+
+def _apply_loan_event_changes(limit):
+    """
+    取出一批變動的 (timestamp, l_id)，依舊表目前的內容更新新表（秒級 timestamp 轉成毫秒）。
+    """
+    return f"""
+        WITH batch AS (
+            DELETE FROM loan_event_changes
+            WHERE ctid = ANY(ARRAY(SELECT ctid FROM loan_event_changes LIMIT {limit}))
+            RETURNING timestamp, l_id
+        ),
+        keys AS (
+            SELECT DISTINCT timestamp, l_id,
+                   CASE WHEN timestamp < {SECONDS_THRESHOLD} THEN timestamp * 1000 ELSE timestamp END AS ms
+            FROM batch
+        ),
+        removed AS (
+            DELETE FROM loan_event_partitioned p
+            USING keys k
+            WHERE p.timestamp = k.ms AND p.l_id = k.l_id
+            AND NOT EXISTS (SELECT 1 FROM loan_event le WHERE le.timestamp = k.timestamp AND le.l_id = k.l_id)
+        ),
+        upserted AS (
+            INSERT INTO loan_event_partitioned (timestamp, event_type, l_id)
+            SELECT DISTINCT ON (k.ms, k.l_id) k.ms, le.event_type, le.l_id
+            FROM keys k
+            JOIN loan_event le ON le.timestamp = k.timestamp AND le.l_id = k.l_id
+            ON CONFLICT (timestamp, l_id) DO UPDATE SET event_type = EXCLUDED.event_type
+        )
+        SELECT 1 FROM batch
+    """
+
+
+def _copied(m):
+    """
+    步驟 3 是否已完成；步驟 4 套用的變動會寫入較大的主鍵，之後重新執行時不能再依新表的最大主鍵續傳。
+    """
+    cursor = m.conn.cursor()
+    cursor.execute("SELECT to_regclass('partition_migration_copied') IS NOT NULL")
+    copied = cursor.fetchone()[0]
+    m.conn.commit()
+    cursor.close()
+    return copied
+
+
+def _time_range(m, sql):
+    cursor = m.conn.cursor()
+    cursor.execute(sql)
+    first, last = cursor.fetchone()
+    m.conn.commit()
+    cursor.close()
+    now = datetime.now()
+    return first or now, max(last or now, add_months(now, 3))
+
+
+def _prepare(m, table, create_sql, indexes):
+    m.execute(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {table}_unpartitioned_pkey")
+    for name in indexes:
+        m.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_unpartitioned")
+    m.execute(create_sql)
+    m.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table}_partitioned DEFAULT")
+
+
+def _create_indexes(m, table, indexes):
+    for name, definition in indexes.items():
+        m.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}_partitioned {definition}")
+
+
+def _ensure_partitions(m, table, first, last):
+    # 與 partitions.py 相同的分區名稱與邊界，先掛在 *_partitioned 上，交換表名後即為正式分區
+    for month in months_between(first, last):
+        lower, upper = bounds(table, month)
+        m.execute(f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} "
+                  f"PARTITION OF {table}_partitioned FOR VALUES FROM ({lower}) TO ({upper})")
+
+
+def upgrade(m):
+    # 0. 之後的變動記錄到 *_changes（必須在開始複製之前）
+    for table in CHANGE_TRIGGERS:
+        _install_change_trigger(m, table)
+
+    # 1. reservation_detail
+    _prepare(m, "reservation_detail", """
+        CREATE TABLE IF NOT EXISTS reservation_detail_partitioned (
+            rd_id BIGINT NOT NULL DEFAULT nextval('reservation_detail_rd_id_seq'),
+            est_start_at TIMESTAMP NOT NULL,
+            est_due_at TIMESTAMP NOT NULL,
+            r_id BIGINT NOT NULL REFERENCES reservation(r_id) ON DELETE CASCADE ON UPDATE CASCADE,
+            i_id BIGINT NOT NULL REFERENCES item(i_id) ON DELETE NO ACTION ON UPDATE CASCADE,
+            p_id BIGINT NOT NULL REFERENCES pick_up_place(p_id) ON DELETE NO ACTION ON UPDATE CASCADE,
+            CONSTRAINT reservation_detail_pkey PRIMARY KEY (rd_id, est_start_at)
+        ) PARTITION BY RANGE (est_start_at)
+    """, RESERVATION_DETAIL_INDEXES)
+    first, last = _time_range(m, "SELECT MIN(est_start_at), MAX(est_start_at) FROM reservation_detail")
+    _ensure_partitions(m, "reservation_detail", first, last)
+    _create_indexes(m, "reservation_detail", RESERVATION_DETAIL_INDEXES)
+
+    # loan_event：先把秒級 timestamp 轉成毫秒後的範圍算進來
+    _prepare(m, "loan_event", """
+        CREATE TABLE IF NOT EXISTS loan_event_partitioned (
+            timestamp BIGINT NOT NULL,
+            event_type VARCHAR(20) NOT NULL
+                CHECK (event_type IN ('Handover','Extend','Mark_overdue','Return')),
+            l_id BIGINT NOT NULL REFERENCES loan(l_id) ON DELETE CASCADE ON UPDATE CASCADE,
+            CONSTRAINT loan_event_pkey PRIMARY KEY (timestamp, l_id)
+        ) PARTITION BY RANGE (timestamp)
+    """, LOAN_EVENT_INDEXES)
+    first, last = _time_range(m, f"""
+        SELECT to_timestamp(MIN(ms) / 1000.0)::timestamp, to_timestamp(MAX(ms) / 1000.0)::timestamp
+        FROM (
+            SELECT CASE WHEN timestamp < {SECONDS_THRESHOLD} THEN timestamp * 1000 ELSE timestamp END AS ms
+            FROM loan_event
+        ) t
+    """)
+    _ensure_partitions(m, "loan_event", first, last)
+    _create_indexes(m, "loan_event", LOAN_EVENT_INDEXES)
+
+    # 2. loan.est_start_at
+    m.execute("ALTER TABLE loan ADD COLUMN IF NOT EXISTS est_start_at TIMESTAMP")
+    m.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loan_est_start_at_backfill ON loan(l_id) "
+              "WHERE est_start_at IS NULL")
+    m.backfill("""
+        UPDATE loan l
+        SET est_start_at = rd.est_start_at
+        FROM reservation_detail rd
+        WHERE rd.rd_id = l.rd_id
+        AND l.l_id IN (
+            SELECT l_id FROM loan WHERE est_start_at IS NULL ORDER BY l_id LIMIT %(batch_size)s
+        )
+    """)
+
+    # 3. 分批複製
+    if not _copied(m):
+        m.backfill("""
+            INSERT INTO reservation_detail_partitioned (rd_id, est_start_at, est_due_at, r_id, i_id, p_id)
+            SELECT rd_id, est_start_at, est_due_at, r_id, i_id, p_id
+            FROM reservation_detail
+            WHERE rd_id > (SELECT COALESCE(MAX(rd_id), 0) FROM reservation_detail_partitioned)
+            ORDER BY rd_id
+            LIMIT %(batch_size)s
+        """)
+        # 依舊表主鍵順序複製：先複製秒級的資料列，再複製毫秒級的資料列，各自從新表中已複製的最大鍵繼續
+        for condition in ("timestamp < %(seconds_threshold)s", "timestamp >= %(seconds_threshold)s"):
+            m.backfill(f"""
+                WITH last AS (
+                    SELECT timestamp, l_id FROM loan_event_partitioned
+                    WHERE {condition}
+                    ORDER BY timestamp DESC, l_id DESC
+                    LIMIT 1
+                )
+                INSERT INTO loan_event_partitioned (timestamp, event_type, l_id)
+                SELECT le.timestamp, le.event_type, le.l_id
+                FROM loan_event le
+                WHERE le.{condition}
+                AND (NOT EXISTS (SELECT 1 FROM last) OR (le.timestamp, le.l_id) > (SELECT timestamp, l_id FROM last))
+                ORDER BY le.timestamp, le.l_id
+                LIMIT %(batch_size)s
+            """, {"seconds_threshold": SECONDS_THRESHOLD})
+        # 秒級 timestamp 轉成毫秒（資料列會從 DEFAULT 分區移到各月分區）；重新執行時先移除已轉換過的重複資料列
+        m.execute(f"""
+            DELETE FROM loan_event_default d
+            WHERE d.timestamp < {SECONDS_THRESHOLD}
+            AND EXISTS (
+                SELECT 1 FROM loan_event_partitioned p WHERE p.timestamp = d.timestamp * 1000 AND p.l_id = d.l_id
+            )
+        """)
+        m.backfill("""
+            UPDATE loan_event_partitioned
+            SET timestamp = timestamp * 1000
+            WHERE (timestamp, l_id) IN (
+                SELECT timestamp, l_id FROM loan_event_default
+                WHERE timestamp < %(seconds_threshold)s
+                LIMIT %(batch_size)s
+            )
+        """, {"seconds_threshold": SECONDS_THRESHOLD})
+        m.execute("CREATE TABLE IF NOT EXISTS partition_migration_copied ()")
+
+    # 4. 不持有 lock，分批套用複製期間的變動
+    m.backfill(_apply_reservation_detail_changes("%(batch_size)s"))
+    m.backfill(_apply_loan_event_changes("%(batch_size)s"))
+
+    # 5. 鎖住後只套用剩下的變動並交換（lock 期間不會再有新的變動；est_start_at 為 NULL 的 loan 以 partial index 找出）
+    m.execute(f"""
+        BEGIN;
+        LOCK TABLE reservation_detail, loan, loan_event IN ACCESS EXCLUSIVE MODE;
+
+        {_apply_reservation_detail_changes("ALL")};
+        {_apply_loan_event_changes("ALL")};
+
+        UPDATE loan l SET est_start_at = rd.est_start_at
+        FROM reservation_detail rd
+        WHERE rd.rd_id = l.rd_id AND l.est_start_at IS NULL;
+
+        ALTER TABLE loan DROP CONSTRAINT IF EXISTS loan_rd_id_fkey;
+        ALTER TABLE reservation_detail RENAME TO reservation_detail_unpartitioned;
+        ALTER TABLE reservation_detail_partitioned RENAME TO reservation_detail;
+        ALTER SEQUENCE reservation_detail_rd_id_seq OWNED BY reservation_detail.rd_id;
+        ALTER TABLE loan_event RENAME TO loan_event_unpartitioned;
+        ALTER TABLE loan_event_partitioned RENAME TO loan_event;
+
+        ALTER TABLE loan ALTER COLUMN est_start_at SET NOT NULL;
+        ALTER TABLE loan ADD CONSTRAINT fk_loan_reservation_detail
+            FOREIGN KEY (rd_id, est_start_at) REFERENCES reservation_detail(rd_id, est_start_at)
+            ON DELETE CASCADE ON UPDATE CASCADE NOT VALID;
+        COMMIT;
+    """)
+    m.execute("ALTER TABLE loan VALIDATE CONSTRAINT fk_loan_reservation_detail")
+    m.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_loan_est_start_at_backfill")
+    m.execute("DROP TABLE IF EXISTS loan_event_unpartitioned")
+    m.execute("DROP TABLE IF EXISTS reservation_detail_unpartitioned")
+    for table in CHANGE_TRIGGERS:
+        m.execute(f"DROP TABLE IF EXISTS {table}_changes")
+        # 舊表的 trigger 已隨舊表刪除；CASCADE 以防重新執行時 trigger 掛到了新表
+        m.execute(f"DROP FUNCTION IF EXISTS log_{table}_change() CASCADE")
+    m.execute("DROP TABLE IF EXISTS partition_migration_copied")
@@ -0,0 +1,95 @@
+-- 冷資料：已軟刪除、或已結束超過保留期的資料列，由封存排程（flask archive）分批從原表搬移
+-- 欄位與原表相同（LIKE，順序一致），最後加上 archived_at；原表新增欄位時封存表也要同步新增
+CREATE TABLE IF NOT EXISTS reservation_archive (
+    LIKE reservation,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (r_id)
+);
+
+CREATE TABLE IF NOT EXISTS reservation_detail_archive (
+    LIKE reservation_detail,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (rd_id),
+
+    FOREIGN KEY (r_id)
+        REFERENCES reservation_archive(r_id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS loan_archive (
+    LIKE loan,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (l_id),
+
+    FOREIGN KEY (rd_id)
+        REFERENCES reservation_detail_archive(rd_id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS loan_event_archive (
+    LIKE loan_event,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (timestamp, l_id),
+
+    FOREIGN KEY (l_id)
+        REFERENCES loan_archive(l_id)
+        ON DELETE CASCADE
+);
+
+-- 軟刪除的 review 可能屬於仍在熱資料中的 loan，因此不參照 loan_archive
+CREATE TABLE IF NOT EXISTS review_archive (
+    LIKE review,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (review_id)
+);
+
+CREATE TABLE IF NOT EXISTS item_pick_archive (
+    LIKE item_pick,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (i_id, p_id)
+);
+
+CREATE TABLE IF NOT EXISTS pick_up_place_archive (
+    LIKE pick_up_place,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (p_id)
+);
+
+-- 同一個 (c_id, m_id) 可能被禁止、解除多次
+CREATE TABLE IF NOT EXISTS category_ban_archive (
+    LIKE category_ban,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (c_id, m_id, ban_at)
+);
+
+-- 包含封存資料的讀取來源（archive_service.source(table, include_archived=True)）
+CREATE OR REPLACE VIEW reservation_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM reservation
+    UNION ALL SELECT * FROM reservation_archive;
+
+CREATE OR REPLACE VIEW reservation_detail_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM reservation_detail
+    UNION ALL SELECT * FROM reservation_detail_archive;
+
+CREATE OR REPLACE VIEW loan_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM loan
+    UNION ALL SELECT * FROM loan_archive;
+
+CREATE OR REPLACE VIEW loan_event_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM loan_event
+    UNION ALL SELECT * FROM loan_event_archive;
+
+CREATE OR REPLACE VIEW review_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM review
+    UNION ALL SELECT * FROM review_archive;
+
+CREATE OR REPLACE VIEW pick_up_place_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM pick_up_place
+    UNION ALL SELECT * FROM pick_up_place_archive;
+
+-- 封存表：只建立包含封存資料的讀取路徑會用到的 index
+CREATE INDEX IF NOT EXISTS idx_reservation_archive_m_id ON reservation_archive(m_id);
+CREATE INDEX IF NOT EXISTS idx_reservation_detail_archive_r_id ON reservation_detail_archive(r_id);
+CREATE INDEX IF NOT EXISTS idx_loan_archive_rd_id ON loan_archive(rd_id);
+CREATE INDEX IF NOT EXISTS idx_loan_event_archive_l_id ON loan_event_archive(l_id);
+CREATE INDEX IF NOT EXISTS idx_review_archive_reviewee_id ON review_archive(reviewee_id);
@@ -0,0 +1,86 @@
+"""
+熱門條件（is_deleted = false、is_active = true）的 partial index，以及涵蓋查詢回傳欄位的 INCLUDE index，
+讓 get_pickup_places、get_item_borrowed_time、get_my_items、get_contributions_and_bans 可以 index-only scan
+（驗證方式見 bench/check_index_only.py）。
+
+- 一般表直接 CREATE INDEX CONCURRENTLY
+- reservation_detail 是 partitioned table，不支援 CONCURRENTLY：先以 ON ONLY 在父表建立（INVALID）index，
+  逐一對各分區 CONCURRENTLY 建立後 ATTACH，全部分區掛上後父表 index 自動變成 valid
+- 被新 index 取代的 index（前導欄位相同）在新 index 建好後才移除
+"""
+from partitions import list_partitions
+
+INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_live ON reservation(r_id) WHERE is_deleted = false",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_m_id_live ON reservation(m_id, r_id) "
+    "WHERE is_deleted = false",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_pick_live ON item_pick(i_id) INCLUDE (p_id) "
+    "WHERE is_deleted = false",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pick_up_place_live ON pick_up_place(p_id) INCLUDE (p_name) "
+    "WHERE is_deleted = false",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_m_id_covering ON item(m_id) "
+    "INCLUDE (i_id, i_name, status, description, out_duration, c_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_i_id_covering ON item(i_id) INCLUDE (i_name, c_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_category_c_id_covering ON category(c_id) INCLUDE (c_name)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contribution_m_id_covering ON contribution(m_id) "
+    "INCLUDE (i_id, is_active)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_category_ban_m_id_live ON category_ban(m_id) INCLUDE (c_id) "
+    "WHERE is_deleted = false",
+]
+
+# partitioned table 上的 index：名稱 -> (table, 定義, 分區 index 名稱後綴)
+PARTITIONED_INDEXES = {
+    "idx_reservation_detail_i_id_due": (
+        "reservation_detail", "(i_id, est_due_at) INCLUDE (est_start_at, r_id)", "i_id_due_idx"),
+}
+
+REPLACED = ["idx_item_m_id", "idx_contribution_m_id_is_active", "idx_category_ban_m_id"]
+
+
+def _query(m, sql, params=None):
+    cursor = m.conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    m.conn.commit()
+    cursor.close()
+    return rows
+
+
+def _attached_partitions(m, index):
+    """
+    已經有 index 掛在父表 index 底下的分區名稱。
+    """
+    return {name for (name,) in _query(m, """
+        SELECT t.relname
+        FROM pg_inherits inh
+        JOIN pg_class parent ON parent.oid = inh.inhparent
+        JOIN pg_index ix ON ix.indexrelid = inh.inhrelid
+        JOIN pg_class t ON t.oid = ix.indrelid
+        WHERE parent.relname = %s
+    """, (index,))}
+
+
+def _create_partitioned_index(m, index, table, definition, suffix):
+    m.execute(f"CREATE INDEX IF NOT EXISTS {index} ON ONLY {table} {definition}")
+    cursor = m.conn.cursor()
+    partitions = list_partitions(cursor, table)
+    m.conn.commit()
+    cursor.close()
+    attached = _attached_partitions(m, index)
+    for partition, _ in partitions:
+        if partition in attached:
+            continue
+        child = f"{partition}_{suffix}"
+        m.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}")
+        m.execute(f"ALTER INDEX {index} ATTACH PARTITION {child}")
+
+
+def upgrade(m):
+    for statement in INDEXES:
+        m.execute(statement)
+    for index, (table, definition, suffix) in PARTITIONED_INDEXES.items():
+        _create_partitioned_index(m, index, table, definition, suffix)
+    for index in REPLACED:
+        m.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+    m.execute("ANALYZE reservation, item_pick, pick_up_place, item, category, contribution, category_ban, "
+              "reservation_detail")
@@ -0,0 +1,76 @@
+"""
+member_root_credit：每位會員在每個 root category 下的 contribution 額度帳本
+取代 change_contribution / create_reservation / delete_reservation 中
+「遞迴展開 root category 的子類別再 join contribution、item 並 FOR UPDATE」的查詢。
+
+1. contribution 加上 root_c_id（物品類別的 root category），依 item.c_id 分批回填
+2. 建立 member_root_credit，依 contribution 彙總 available_credits / used_credits
+3. 建立 (m_id, root_c_id, is_active, i_id) index，供依 root category 查詢有效 contribution 使用
+
+回填到程式部署之間若仍有舊版程式修改 contribution，部署後執行一次 flask check-credits --repair。
+"""
+
+# 每個 category 對應的 root category（與 setreadmodel.sql、services/contribution.py 相同）
+CATEGORY_ROOT_CTE = """
+    WITH RECURSIVE category_root AS (
+        SELECT c_id, c_id AS root_c_id FROM category WHERE parent_c_id IS NULL
+        UNION ALL
+        SELECT c.c_id, cr.root_c_id FROM category c JOIN category_root cr ON c.parent_c_id = cr.c_id
+    )
+"""
+
+
+def upgrade(m):
+    m.execute("ALTER TABLE contribution ADD COLUMN IF NOT EXISTS root_c_id BIGINT")
+
+    # 回填期間用來找出尚未回填資料列的暫時 index
+    m.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contribution_root_backfill ON contribution(i_id) "
+              "WHERE root_c_id IS NULL")
+    m.backfill(f"""
+        {CATEGORY_ROOT_CTE}
+        UPDATE contribution c
+        SET root_c_id = cr.root_c_id
+        FROM item i
+        JOIN category_root cr ON i.c_id = cr.c_id
+        WHERE c.i_id = i.i_id
+        AND c.i_id IN (
+            SELECT i_id FROM contribution WHERE root_c_id IS NULL ORDER BY i_id LIMIT %(batch_size)s
+        )
+    """)
+    m.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_contribution_root_backfill")
+
+    m.execute("ALTER TABLE contribution DROP CONSTRAINT IF EXISTS contribution_root_c_id_fkey")
+    m.execute("""
+        ALTER TABLE contribution ADD CONSTRAINT contribution_root_c_id_fkey
+        FOREIGN KEY (root_c_id) REFERENCES category(c_id)
+        ON DELETE NO ACTION ON UPDATE CASCADE NOT VALID
+    """)
+    m.execute("ALTER TABLE contribution VALIDATE CONSTRAINT contribution_root_c_id_fkey")
+
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS member_root_credit (
+            m_id BIGINT NOT NULL,
+            root_c_id BIGINT NOT NULL,
+            available_credits INT NOT NULL DEFAULT 0,
+            used_credits INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (m_id, root_c_id),
+            CHECK (available_credits >= 0 AND used_credits >= 0),
+            FOREIGN KEY (m_id) REFERENCES member(m_id) ON DELETE CASCADE ON UPDATE CASCADE,
+            FOREIGN KEY (root_c_id) REFERENCES category(c_id) ON DELETE CASCADE ON UPDATE CASCADE
+        )
+    """)
+    m.execute("""
+        INSERT INTO member_root_credit (m_id, root_c_id, available_credits, used_credits)
+        SELECT m_id, root_c_id,
+               COUNT(*) FILTER (WHERE is_active),
+               COUNT(*) FILTER (WHERE NOT is_active)
+        FROM contribution
+        WHERE root_c_id IS NOT NULL
+        GROUP BY m_id, root_c_id
+        ON CONFLICT (m_id, root_c_id) DO UPDATE
+        SET available_credits = EXCLUDED.available_credits, used_credits = EXCLUDED.used_credits
+    """)
+
+    m.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contribution_m_id_root "
+              "ON contribution(m_id, root_c_id, is_active, i_id)")
+    m.execute("ANALYZE contribution, member_root_credit")
@@ -0,0 +1,11 @@
+-- 會員借用資格（禁止類別、有額度的 root category）的版本：新增禁止或額度改變時在同一個 transaction 內遞增，
+-- 各 process 快取的資格快照與此版本不同時重新載入（沒有資料列時視為版本 0）
+CREATE TABLE IF NOT EXISTS member_eligibility_version (
+    m_id BIGINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (m_id)
+        REFERENCES member(m_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
@@ -0,0 +1,15 @@
+-- Transactional outbox（flask relay-outbox 分批送出）
+CREATE TABLE IF NOT EXISTS outbox (
+    event_id BIGSERIAL PRIMARY KEY,
+    dedup_key VARCHAR(100) NOT NULL UNIQUE,
+    aggregate_type VARCHAR(20) NOT NULL,
+    aggregate_id BIGINT,
+    event_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    published_at TIMESTAMP,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_outbox_pending ON outbox(event_id) WHERE published_at IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_outbox_published_at ON outbox(published_at) WHERE published_at IS NOT NULL;
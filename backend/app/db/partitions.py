@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+月分區維護工具
+- loan_event 依 timestamp（毫秒）、reservation_detail 依 est_start_at 做 RANGE partition，每個月一個分區
+  （{table}_pYYYY_MM），另有 DEFAULT 分區（{table}_default）承接尚未建立分區的資料
+- maintain：預先建立未來 N 個月的分區；DEFAULT 分區中已有該月資料時，先把資料搬進新分區再 ATTACH
+- --retain-months：刪除超過保留期、且已清空的分區。舊資料一律由封存排程（flask archive）搬到 *_archive 表，
+  分區維護不另外搬移資料，包含封存資料的讀取（*_all view）因此只需涵蓋一種封存方式；
+  仍有資料（尚未封存）的分區會保留並列出筆數
+- 查詢若帶有時間欄位的範圍條件（例如 est_start_at > 現在 - MAX_RESERVATION_SPAN），planner 只會掃描相關分區
+
+用法（建議交給 cron 每天執行）：
+    cd backend/app/db
+    python partitions.py status
+    python partitions.py maintain [--months-ahead 3] [--dry-run]
+    python partitions.py maintain --retain-months 24
+"""
+
+import argparse
+import re
+from datetime import datetime
+
+# 分區表 -> (分區欄位, 參照此表的 (table, column))
+PARTITIONED_TABLES = {
+    "loan_event": ("timestamp", None),
+    "reservation_detail": ("est_start_at", ("loan", "rd_id")),
+}
+
+# 避免多個維護程序同時執行
+ADVISORY_LOCK_ID = 743_000_002
+
+_PARTITION_NAME = re.compile(r"^(\w+)_p(\d{4})_(\d{2})$")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first, last):
+    """
+    回傳 first 到 last（含）所在月份的月初列表。
+    """
+    months = []
+    month = month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def bound_literal(table, value):
+    """
+    分區邊界：loan_event.timestamp 是毫秒，reservation_detail.est_start_at 是 TIMESTAMP。
+    """
+    if table == "loan_event":
+        return str(int(value.timestamp() * 1000))
+    return f"'{value:%Y-%m-%d %H:%M:%S}'"
+
+
+def bounds(table, month):
+    return bound_literal(table, month), bound_literal(table, add_months(month, 1))
+
+
+def create_partition_sql(table, month):
+    """
+    建立單月分區的 DDL（DEFAULT 分區沒有該月資料時使用）。
+    """
+    lower, upper = bounds(table, month)
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ({lower}) TO ({upper})")
+
+
+def list_partitions(cursor, table):
+    """
+    回傳 [(partition 名稱, 月初 或 None（DEFAULT）)]。
+    """
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits inh
+        JOIN pg_class c ON c.oid = inh.inhrelid
+        JOIN pg_class p ON p.oid = inh.inhparent
+        WHERE p.relname = %s
+        ORDER BY c.relname
+    """, (table,))
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME.match(name)
+        month = datetime(int(match.group(2)), int(match.group(3)), 1) if match else None
+        partitions.append((name, month))
+    return partitions
+
+
+def ensure_partition(conn, table, month, dry_run=False):
+    """
+    建立 table 的單月分區；回傳是否有建立。
+    DEFAULT 分區已有該月資料時，在同一個 transaction 內鎖住 DEFAULT 分區，把資料搬到新表後再 ATTACH。
+    reservation_detail 的資料若已被 loan 參照就不搬（loan 只會在開始前 24 小時建立，未來月份不會發生）。
+    """
+    column, referenced_by = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    default = f"{table}_default"
+    lower, upper = bounds(table, month)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cursor.fetchone()[0]:
+            conn.commit()
+            return False
+        if dry_run:
+            print(f"      [dry-run] 建立分區 {name}")
+            conn.commit()
+            return True
+
+        in_range = f"{column} >= {lower} AND {column} < {upper}"
+        cursor.execute(f"LOCK TABLE {default} IN EXCLUSIVE MODE")
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})")
+        if not cursor.fetchone()[0]:
+            cursor.execute(create_partition_sql(table, month))
+            conn.commit()
+            return True
+
+        if referenced_by:
+            ref_table, ref_column = referenced_by
+            cursor.execute(f"""
+                SELECT EXISTS (
+                    SELECT 1 FROM {default} d JOIN {ref_table} x ON x.{ref_column} = d.{ref_column}
+                    WHERE d.{column} >= {lower} AND d.{column} < {upper}
+                )
+            """)
+            if cursor.fetchone()[0]:
+                conn.rollback()
+                print(f"      ⚠️  {default} 中 {name} 範圍的資料已被 {ref_table} 參照，略過")
+                return False
+
+        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {default} WHERE {in_range} RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """)
+        moved = cursor.rowcount
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})")
+        conn.commit()
+        print(f"      ↻ 已從 {default} 搬移 {moved} 筆到 {name}")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def ensure_partitions(conn, table, first, last, dry_run=False):
+    """
+    確保 first 到 last 之間每個月都有分區，回傳新建立的數量。
+    """
+    return sum(ensure_partition(conn, table, month, dry_run) for month in months_between(first, last))
+
+
+def drop_empty_partition(conn, table, name, dry_run=False):
+    """
+    分區已無資料時 DETACH 並刪除；回傳是否有刪除。
+    在同一個 transaction 內先鎖住分區再確認，檢查後寫入的資料不會被一起刪掉。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"LOCK TABLE {name} IN EXCLUSIVE MODE")
+        cursor.execute(f"SELECT COUNT(*) FROM {name}")
+        remaining = cursor.fetchone()[0]
+        if remaining:
+            conn.rollback()
+            print(f"      ⏭️  {name} 尚有 {remaining} 筆未封存的資料，保留")
+            return False
+        if dry_run:
+            print(f"      [dry-run] 刪除空分區 {name}")
+            conn.rollback()
+            return True
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def maintain(conn, months_ahead=3, retain_months=None, dry_run=False):
+    """
+    每個分區表：建立本月到未來 months_ahead 個月的分區；有 retain_months 時刪除更早、且已清空的分區。
+    """
+    this_month = month_start(datetime.now())
+    for table in PARTITIONED_TABLES:
+        created = ensure_partitions(conn, table, this_month, add_months(this_month, months_ahead), dry_run)
+        print(f"   📅 {table}: 新建 {created} 個分區")
+        if retain_months is None:
+            continue
+        cutoff = add_months(this_month, -retain_months)
+        cursor = conn.cursor()
+        old = [name for name, month in list_partitions(cursor, table) if month and month < cutoff]
+        conn.commit()
+        cursor.close()
+        dropped = sum(drop_empty_partition(conn, table, name, dry_run) for name in old)
+        print(f"   🗑️  {table}: 刪除 {dropped} 個早於 {cutoff:%Y-%m} 的空分區")
+
+
+def cmd_status(conn):
+    cursor = conn.cursor()
+    for table in PARTITIONED_TABLES:
+        print(f"   {table}")
+        for name, _ in list_partitions(cursor, table):
+            cursor.execute("SELECT reltuples::BIGINT FROM pg_class WHERE relname = %s", (name,))
+            print(f"      {name:<40} ~{max(cursor.fetchone()[0], 0)} 筆")
+    conn.commit()
+    cursor.close()
+
+
+def main():
+    from migrate import connect, DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="loan_event / reservation_detail 月分區維護")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="列出分區與估計筆數")
+    maintain_parser = sub.add_parser("maintain", help="建立未來分區並移出過期分區")
+    maintain_parser.add_argument("--months-ahead", type=int, default=3, help="預先建立的月份數")
+    maintain_parser.add_argument("--retain-months", type=int, default=None,
+                                 help="保留的月份數，更早且已由 flask archive 清空的分區會被刪除（不指定則不刪除）")
+    maintain_parser.add_argument("--dry-run", action="store_true", help="只列出將執行的動作")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print("❌ 錯誤: 請設定 DATABASE_URL 環境變數")
+        return
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    if not cursor.fetchone()[0]:
+        print("❌ 另一個分區維護程序正在執行中")
+        conn.close()
+        return
+    conn.commit()
+    cursor.close()
+
+    try:
+        if args.command == "status":
+            cmd_status(conn)
+        elif args.command == "maintain":
+            maintain(conn, args.months_ahead, args.retain_months, args.dry_run)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
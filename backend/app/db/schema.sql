@@ -107,13 +107,15 @@ CREATE TABLE reservation (
         ON UPDATE CASCADE
 );
 
+-- 依 est_start_at 每月一個分區（partitions.py 維護），主鍵需包含分區欄位
 CREATE TABLE reservation_detail (
-    rd_id BIGSERIAL PRIMARY KEY,
+    rd_id BIGSERIAL,
     est_start_at TIMESTAMP NOT NULL,
     est_due_at TIMESTAMP NOT NULL,
     r_id BIGINT NOT NULL,
     i_id BIGINT NOT NULL,
     p_id BIGINT NOT NULL,
+    PRIMARY KEY (rd_id, est_start_at),
 
     FOREIGN KEY (r_id)
         REFERENCES reservation(r_id)
@@ -129,12 +131,16 @@ CREATE TABLE reservation_detail (
         REFERENCES pick_up_place(p_id)
         ON DELETE NO ACTION
         ON UPDATE CASCADE
-);
+) PARTITION BY RANGE (est_start_at);
+
+CREATE TABLE reservation_detail_default PARTITION OF reservation_detail DEFAULT;
 
+-- root_c_id：物品類別的 root category（物品改類別時同步更新）；CSV 匯入後由 setreadmodel.sql 填入
 CREATE TABLE contribution (
     m_id BIGINT NOT NULL,
     i_id BIGINT NOT NULL,
     is_active BOOLEAN NOT NULL DEFAULT FALSE,
+    root_c_id BIGINT,
     PRIMARY KEY (m_id, i_id),
 
     FOREIGN KEY (m_id)
@@ -145,6 +151,33 @@ CREATE TABLE contribution (
     FOREIGN KEY (i_id)
         REFERENCES item(i_id)
         ON DELETE NO ACTION
+        ON UPDATE CASCADE,
+
+    FOREIGN KEY (root_c_id)
+        REFERENCES category(c_id)
+        ON DELETE NO ACTION
+        ON UPDATE CASCADE
+);
+
+-- 每位會員在每個 root category 下的 contribution 額度：available_credits 為 is_active = true 的數量，
+-- used_credits 為 is_active = false 的數量。借用資格檢查與額度的取用 / 歸還只需以主鍵鎖定一列
+-- 由 service 層在 contribution 變更時同一個 transaction 內增量維護（flask check-credits 檢查 / 修復）
+CREATE TABLE member_root_credit (
+    m_id BIGINT NOT NULL,
+    root_c_id BIGINT NOT NULL,
+    available_credits INT NOT NULL DEFAULT 0,
+    used_credits INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (m_id, root_c_id),
+    CHECK (available_credits >= 0 AND used_credits >= 0),
+
+    FOREIGN KEY (m_id)
+        REFERENCES member(m_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE,
+
+    FOREIGN KEY (root_c_id)
+        REFERENCES category(c_id)
+        ON DELETE CASCADE
         ON UPDATE CASCADE
 );
 
@@ -202,16 +235,25 @@ CREATE TABLE report (
 CREATE TABLE loan (
     l_id BIGSERIAL PRIMARY KEY,
     rd_id BIGINT NOT NULL UNIQUE,
+    -- reservation_detail.est_start_at 的複本：參照分區表的外鍵必須包含分區欄位
+    est_start_at TIMESTAMP NOT NULL,
     actual_start_at TIMESTAMP,
     actual_return_at TIMESTAMP,
     is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
-
-    FOREIGN KEY (rd_id)
-        REFERENCES reservation_detail(rd_id)
+    -- 由 service 層隨 loan_event 同步維護：Scheduled -> Out -> (Overdue) -> Returned
+    status VARCHAR(10) NOT NULL DEFAULT 'Scheduled'
+        CONSTRAINT loan_status_check CHECK (status IN ('Scheduled', 'Out', 'Overdue', 'Returned')),
+    -- 最後一個 loan_event 的 timestamp（毫秒），新事件取 GREATEST(現在, last_event_ts + 1) 避免主鍵衝突
+    last_event_ts BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT fk_loan_reservation_detail
+        FOREIGN KEY (rd_id, est_start_at)
+        REFERENCES reservation_detail(rd_id, est_start_at)
         ON DELETE CASCADE
         ON UPDATE CASCADE
 );
 
+-- 依 timestamp（毫秒）每月一個分區（partitions.py 維護）
 CREATE TABLE loan_event (
     timestamp BIGINT NOT NULL,
     event_type VARCHAR(20) NOT NULL 
@@ -223,7 +265,9 @@ CREATE TABLE loan_event (
         REFERENCES loan(l_id)
         ON DELETE CASCADE
         ON UPDATE CASCADE
-);
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE loan_event_default PARTITION OF loan_event DEFAULT;
 
 CREATE TABLE review (
     review_id BIGSERIAL PRIMARY KEY,
@@ -252,4 +296,158 @@ CREATE TABLE review (
     UNIQUE (reviewer_id, l_id)
 );
 
+-- Owner 頁面的 read model：每筆尚未歸還的 loan 一列，依 (owner_m_id, est_start_at) 做 index range scan
+-- 由 service 層在建立 loan、歸還、取消預約時同一個 transaction 內增量維護
+CREATE TABLE owner_upcoming_loans (
+    l_id BIGINT PRIMARY KEY,
+    owner_m_id BIGINT NOT NULL,
+    i_id BIGINT NOT NULL,
+    r_id BIGINT NOT NULL,
+    borrower_name VARCHAR(20) NOT NULL,
+    est_start_at TIMESTAMP NOT NULL,
+    est_due_at TIMESTAMP NOT NULL,
+
+    FOREIGN KEY (l_id)
+        REFERENCES loan(l_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
+
+-- 每位員工尚未結案的檢舉 / 驗證數量，派工時選擇負載最低的員工
+-- 由 service 層在建立與結案 report / item_verification 時同一個 transaction 內增量維護
+CREATE TABLE staff_workload (
+    s_id BIGINT PRIMARY KEY,
+    open_reports INT NOT NULL DEFAULT 0,
+    open_verifications INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (s_id)
+        REFERENCES staff(s_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
+
+-- 會員借用資格（禁止類別、有額度的 root category）的版本：新增禁止或額度改變時在同一個 transaction 內遞增，
+-- 各 process 快取的資格快照與此版本不同時重新載入
+CREATE TABLE member_eligibility_version (
+    m_id BIGINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (m_id)
+        REFERENCES member(m_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
+
+-- Transactional outbox：預約、借用、檢舉的領域事件與資料變更在同一個 transaction 內寫入，
+-- 由 relay（flask relay-outbox）分批送到 MongoDB 等外部系統；dedup_key 讓重送（at-least-once）可以在接收端去重
+CREATE TABLE outbox (
+    event_id BIGSERIAL PRIMARY KEY,
+    dedup_key VARCHAR(100) NOT NULL UNIQUE,
+    aggregate_type VARCHAR(20) NOT NULL,
+    aggregate_id BIGINT,
+    event_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    published_at TIMESTAMP,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+
+-- 逾期標記排程（flask mark-overdue）每次執行的統計
+CREATE TABLE overdue_job_runs (
+    run_id BIGSERIAL PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    marked_count INT NOT NULL,
+    batch_count INT NOT NULL,
+    duration_ms INT NOT NULL
+);
+
+-- 冷資料：已軟刪除、或已結束超過保留期的資料列，由封存排程（flask archive）分批從原表搬移
+-- 欄位與原表相同（LIKE，順序一致），最後加上 archived_at；原表新增欄位時封存表也要同步新增
+CREATE TABLE reservation_archive (
+    LIKE reservation,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (r_id)
+);
+
+CREATE TABLE reservation_detail_archive (
+    LIKE reservation_detail,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (rd_id),
+
+    FOREIGN KEY (r_id)
+        REFERENCES reservation_archive(r_id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE loan_archive (
+    LIKE loan,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (l_id),
+
+    FOREIGN KEY (rd_id)
+        REFERENCES reservation_detail_archive(rd_id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE loan_event_archive (
+    LIKE loan_event,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (timestamp, l_id),
+
+    FOREIGN KEY (l_id)
+        REFERENCES loan_archive(l_id)
+        ON DELETE CASCADE
+);
+
+-- 軟刪除的 review 可能屬於仍在熱資料中的 loan，因此不參照 loan_archive
+CREATE TABLE review_archive (
+    LIKE review,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (review_id)
+);
+
+CREATE TABLE item_pick_archive (
+    LIKE item_pick,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (i_id, p_id)
+);
+
+CREATE TABLE pick_up_place_archive (
+    LIKE pick_up_place,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (p_id)
+);
+
+-- 同一個 (c_id, m_id) 可能被禁止、解除多次
+CREATE TABLE category_ban_archive (
+    LIKE category_ban,
+    archived_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (c_id, m_id, ban_at)
+);
+
+-- 包含封存資料的讀取來源（archive_service.source(table, include_archived=True)）
+CREATE VIEW reservation_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM reservation
+    UNION ALL SELECT * FROM reservation_archive;
+
+CREATE VIEW reservation_detail_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM reservation_detail
+    UNION ALL SELECT * FROM reservation_detail_archive;
+
+CREATE VIEW loan_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM loan
+    UNION ALL SELECT * FROM loan_archive;
+
+CREATE VIEW loan_event_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM loan_event
+    UNION ALL SELECT * FROM loan_event_archive;
+
+CREATE VIEW review_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM review
+    UNION ALL SELECT * FROM review_archive;
 
+CREATE VIEW pick_up_place_all AS
+    SELECT *, NULL::TIMESTAMP AS archived_at FROM pick_up_place
+    UNION ALL SELECT * FROM pick_up_place_archive;
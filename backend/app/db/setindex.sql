@@ -1,24 +1,78 @@
 CREATE INDEX idx_item_c_id ON item(c_id);
+-- 涵蓋 get_my_items 回傳的欄位（index-only scan）；get_contributions_and_bans 以 i_id 取 i_name、c_id
+CREATE INDEX idx_item_m_id_covering ON item(m_id) INCLUDE (i_id, i_name, status, description, out_duration, c_id);
+CREATE INDEX idx_item_i_id_covering ON item(i_id) INCLUDE (i_name, c_id);
+-- 物品搜尋：全文檢索（expression index，查詢需使用相同的 to_tsvector 運算式）與 pg_trgm 模糊比對
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_item_search_tsv ON item USING GIN (to_tsvector('simple', i_name || ' ' || coalesce(description, '')));
+CREATE INDEX idx_item_i_name_trgm ON item USING GIN (i_name gin_trgm_ops);
+CREATE INDEX idx_item_description_trgm ON item USING GIN (description gin_trgm_ops);
+
+-- loan 表：進行中狀態的 partial index（已歸還的 loan 佔大多數，不需要進 index）
+CREATE INDEX idx_loan_open ON loan(rd_id) WHERE status <> 'Returned';
+CREATE INDEX idx_loan_out ON loan(rd_id) WHERE status = 'Out';
+
+-- loan_event 表
+CREATE INDEX idx_loan_event_l_id_event_type ON loan_event(l_id, event_type);
+-- 時間欄位與寫入順序相關，BRIN 只需極小的空間就能略過不相關的 block
+CREATE INDEX idx_loan_event_timestamp_brin ON loan_event USING BRIN (timestamp);
+
+-- contribution 表：get_contributions_and_bans 的回傳欄位；取用 / 歸還額度時在 root category 下挑一筆指定狀態的貢獻
+CREATE INDEX idx_contribution_m_id_covering ON contribution(m_id) INCLUDE (i_id, is_active);
+CREATE INDEX idx_contribution_m_id_root ON contribution(m_id, root_c_id, is_active, i_id);
 
 -- reservation 表
 CREATE INDEX idx_reservation_m_id ON reservation(m_id);
+-- 幾乎所有 join reservation 的查詢都帶 r.is_deleted = false
+CREATE INDEX idx_reservation_live ON reservation(r_id) WHERE is_deleted = false;
+CREATE INDEX idx_reservation_m_id_live ON reservation(m_id, r_id) WHERE is_deleted = false;
 
 -- reservation_detail 表
 CREATE INDEX idx_reservation_detail_r_id ON reservation_detail(r_id);
 CREATE INDEX idx_reservation_detail_i_id ON reservation_detail(i_id);
 CREATE INDEX idx_reservation_detail_time_range ON reservation_detail(i_id, est_start_at, est_due_at);
+-- 時段重疊查詢（tsrange &&）：btree_gist 讓 i_id 等值與時段重疊可以用同一個 GiST index
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE INDEX idx_reservation_detail_i_id_period ON reservation_detail USING GIST (i_id, tsrange(est_start_at, est_due_at));
+CREATE INDEX idx_reservation_detail_est_start_at_brin ON reservation_detail USING BRIN (est_start_at);
+-- 涵蓋 get_item_borrowed_time（est_due_at >= today，回傳 est_start_at、join reservation 用的 r_id）
+CREATE INDEX idx_reservation_detail_i_id_due ON reservation_detail(i_id, est_due_at) INCLUDE (est_start_at, r_id);
 
--- contribution 表
+-- category 表
 CREATE INDEX idx_category_parent_c_id ON category(parent_c_id);
+CREATE INDEX idx_category_c_id_covering ON category(c_id) INCLUDE (c_name);
+
+-- item_pick / pick_up_place 表：涵蓋 get_pickup_places，只收未刪除的資料列
+CREATE INDEX idx_item_pick_live ON item_pick(i_id) INCLUDE (p_id) WHERE is_deleted = false;
+CREATE INDEX idx_pick_up_place_live ON pick_up_place(p_id) INCLUDE (p_name) WHERE is_deleted = false;
 
 -- review 表
 CREATE INDEX idx_review_covering ON review(reviewee_id) INCLUDE (l_id, score, is_deleted);
+CREATE INDEX idx_review_l_id_reviewer_id ON review(l_id, reviewer_id);
 
 -- report 表
 CREATE INDEX idx_report_s_id_conclusion ON report(s_id, r_conclusion);
+-- 員工待處理佇列：依 create_at 分頁
+CREATE INDEX idx_report_pending_queue ON report(s_id, create_at, re_id) WHERE r_conclusion = 'Pending';
 
 -- item_verification 表
 CREATE INDEX idx_item_verification_s_id_conclusion ON item_verification(s_id, v_conclusion);
+CREATE INDEX idx_item_verification_pending_queue ON item_verification(s_id, create_at, iv_id) WHERE v_conclusion = 'Pending';
 
 -- category_ban 表
-CREATE INDEX idx_category_ban_m_id ON category_ban(m_id) WHERE is_deleted = false;
+CREATE INDEX idx_category_ban_m_id_live ON category_ban(m_id) INCLUDE (c_id) WHERE is_deleted = false;
+
+-- owner_upcoming_loans 表
+CREATE INDEX idx_owner_upcoming_loans_owner_start ON owner_upcoming_loans(owner_m_id, est_start_at, l_id);
+CREATE INDEX idx_owner_upcoming_loans_r_id ON owner_upcoming_loans(r_id);
+
+-- 封存表：只建立包含封存資料的讀取路徑會用到的 index
+CREATE INDEX idx_reservation_archive_m_id ON reservation_archive(m_id);
+CREATE INDEX idx_reservation_detail_archive_r_id ON reservation_detail_archive(r_id);
+CREATE INDEX idx_loan_archive_rd_id ON loan_archive(rd_id);
+CREATE INDEX idx_loan_event_archive_l_id ON loan_event_archive(l_id);
+CREATE INDEX idx_review_archive_reviewee_id ON review_archive(reviewee_id);
+
+-- outbox 表：relay 只掃描尚未送出的事件；清理已送出的事件依 published_at
+CREATE INDEX idx_outbox_pending ON outbox(event_id) WHERE published_at IS NULL;
+CREATE INDEX idx_outbox_published_at ON outbox(published_at) WHERE published_at IS NOT NULL;
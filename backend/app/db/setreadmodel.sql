@@ -0,0 +1,55 @@
+-- 重建 read model（在 CSV 匯入之後執行）
+
+-- LOAN.STATUS（依 loan_event 歷史推導，與 migrations/0007_loan_status.py 相同）
+UPDATE loan l
+SET status = CASE
+    WHEN l.actual_return_at IS NOT NULL
+         OR EXISTS (SELECT 1 FROM loan_event le WHERE le.l_id = l.l_id AND le.event_type = 'Return')
+        THEN 'Returned'
+    WHEN EXISTS (SELECT 1 FROM loan_event le WHERE le.l_id = l.l_id AND le.event_type = 'Mark_overdue')
+        THEN 'Overdue'
+    WHEN l.actual_start_at IS NOT NULL
+         OR EXISTS (SELECT 1 FROM loan_event le WHERE le.l_id = l.l_id AND le.event_type = 'Handover')
+        THEN 'Out'
+    ELSE 'Scheduled'
+END;
+
+-- OWNER_UPCOMING_LOANS
+DELETE FROM owner_upcoming_loans;
+INSERT INTO owner_upcoming_loans
+    (l_id, owner_m_id, i_id, r_id, borrower_name, est_start_at, est_due_at)
+SELECT l.l_id, i.m_id, i.i_id, r.r_id, m.m_name, rd.est_start_at, rd.est_due_at
+FROM loan l
+JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+JOIN reservation r ON rd.r_id = r.r_id
+JOIN item i ON rd.i_id = i.i_id
+JOIN member m ON r.m_id = m.m_id
+WHERE r.is_deleted = false AND l.status <> 'Returned';
+
+-- STAFF_WORKLOAD
+DELETE FROM staff_workload;
+INSERT INTO staff_workload (s_id, open_reports, open_verifications)
+SELECT s.s_id,
+       (SELECT COUNT(*) FROM report re WHERE re.s_id = s.s_id AND re.r_conclusion = 'Pending'),
+       (SELECT COUNT(*) FROM item_verification iv WHERE iv.s_id = s.s_id AND iv.v_conclusion = 'Pending')
+FROM staff s;
+
+-- CONTRIBUTION.ROOT_C_ID 與 MEMBER_ROOT_CREDIT（與 migrations/0012_member_root_credit.py 相同）
+WITH RECURSIVE category_root AS (
+    SELECT c_id, c_id AS root_c_id FROM category WHERE parent_c_id IS NULL
+    UNION ALL
+    SELECT c.c_id, cr.root_c_id FROM category c JOIN category_root cr ON c.parent_c_id = cr.c_id
+)
+UPDATE contribution c
+SET root_c_id = cr.root_c_id
+FROM item i
+JOIN category_root cr ON i.c_id = cr.c_id
+WHERE c.i_id = i.i_id;
+
+DELETE FROM member_root_credit;
+INSERT INTO member_root_credit (m_id, root_c_id, available_credits, used_credits)
+SELECT m_id, root_c_id,
+       COUNT(*) FILTER (WHERE is_active),
+       COUNT(*) FILTER (WHERE NOT is_active)
+FROM contribution
+GROUP BY m_id, root_c_id;
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from pymongo import MongoClient
 
-db = SQLAlchemy()  # 拿來做 engine + session，用不用 ORM 你自己決定
+from app.utils.replica import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})  # 拿來做 engine + session，用不用 ORM 你自己決定
 
 # MongoDB client（類似 db 的處理方式）
 _mongo_client = None  # 會在 create_app 中初始化
@@ -8,3 +8,4 @@ class Contribution(db.Model):
     i_id = db.Column(db.Integer, db.ForeignKey("item.i_id"),
                      primary_key=True, autoincrement=False)
     is_active = db.Column(db.Boolean, default=False)
+    root_c_id = db.Column(db.Integer, db.ForeignKey("category.c_id"))
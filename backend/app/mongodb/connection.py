@@ -60,6 +60,14 @@ def init_mongodb(app):
             except Exception:
                 pass  # 索引已存在，忽略
 
+        # updated_at 的 TTL index（SESSION_TTL_DAYS，設定改變時調整期限）
+        from app.mongodb.session_retention import ensure_session_ttl
+        try:
+            expire_after = ensure_session_ttl(user_sessions, app.config.get("SESSION_TTL_DAYS", 90))
+            app.logger.info(f"user_sessions TTL: {expire_after or '不刪除'}")
+        except Exception as e:
+            app.logger.warning(f"⚠️ user_sessions TTL index 建立失敗: {e}")
+
         app.logger.info("✅ MongoDB 索引建立完成")
 
         # 顯示資料庫資訊
@@ -4,9 +4,8 @@
 """
 import uuid
 from datetime import datetime, timezone
-from flask import request
+from flask import request, g
 from app.mongodb.connection import get_mongo_db
-from app.utils.jwt_utils import get_user
 
 
 def get_session_id():
@@ -90,16 +89,9 @@ def log_event(event_type, endpoint, success=True, error_reason=None, **kwargs):
         # 取得 session_id
         session_id = get_session_id()
 
-        # 嘗試從 token 取得 m_id
-        user_token = None
-        m_id = None
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            user_token = auth_header.split(" ")[1]
-            try:
-                m_id, _ = get_user(user_token)
-            except Exception:
-                pass  # token 無效或過期，忽略
+        # 使用 auth middleware 已解析好的 token 與 m_id（token 無效或過期時為 None）
+        user_token = g.get("auth_token")
+        m_id = g.get("user_id")
 
         # 取得或建立 session
         session = get_or_create_session(session_id, user_token, m_id)
@@ -160,6 +152,7 @@ def determine_funnel_stage(event_type, success=True):
         'browse_category': 'browse_category',
         'view_subcategory': 'browse_category',
         'browse_subcategory': 'browse_category',
+        'search_items': 'browse_category',
 
         # Item
         'view_item': 'view_item',
@@ -168,6 +161,8 @@ def determine_funnel_stage(event_type, success=True):
         # Availability
         'check_availability': 'check_availability',
         'get_item_borrowed_time': 'check_availability',
+        'get_items_availability': 'check_availability',
+        'find_available_items': 'check_availability',
 
         # Pickup
         'view_pickup_places': 'view_pickup_places',
@@ -0,0 +1,78 @@
+"""
+outbox 事件的 MongoDB sink（flask relay-outbox --sink mongo）
+- 所有事件以 dedup_key 為 _id upsert 到 domain_events，重送時不會重複
+- 帶有 funnel 的事件同時寫回 user_sessions（與 log_event 相同的文件結構），
+  以 events.event_id 判斷是否已寫入過，重送時不會重複 $push
+"""
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from app.mongodb.connection import get_mongo_db
+from app.mongodb.funnel_tracker import determine_funnel_stage
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _session_ops(dedup_key, occurred_at, funnel):
+    now = datetime.now(timezone.utc)
+    session_id = funnel["session_id"]
+    fields = dict(funnel["event"])
+    event = {
+        "event_id": dedup_key,
+        "event_type": fields.pop("event_type"),
+        "timestamp": occurred_at,
+        "endpoint": funnel.get("endpoint"),
+        "success": fields.pop("success", True),
+        "error_reason": fields.pop("error_reason", None),
+        **fields,
+    }
+    update = {"$push": {"events": event}, "$set": {"updated_at": now}}
+    funnel_stage = determine_funnel_stage(event["event_type"], event["success"])
+    if funnel_stage != "unknown":
+        update["$set"]["funnel_stage"] = funnel_stage
+
+    ops = [
+        UpdateOne({"session_id": session_id}, {"$setOnInsert": {
+            "session_id": session_id,
+            "user_token": None,
+            "m_id": funnel.get("m_id"),
+            "events": [],
+            "funnel_stage": None,
+            "created_at": now,
+            "updated_at": now,
+        }}, upsert=True),
+        UpdateOne({"session_id": session_id, "events.event_id": {"$ne": dedup_key}}, update),
+    ]
+    if funnel.get("m_id"):
+        ops.append(UpdateOne({"session_id": session_id, "m_id": None}, {"$set": {"m_id": funnel["m_id"]}}))
+    return ops
+
+
+class MongoSink:
+    def __init__(self, database=None):
+        self.database = database if database is not None else get_mongo_db()
+
+    def publish(self, events):
+        domain_ops, session_ops = [], []
+        for event in events:
+            payload = event["payload"]
+            occurred_at = _parse_time(payload.get("occurred_at"))
+            domain_ops.append(UpdateOne({"_id": event["dedup_key"]}, {"$setOnInsert": {
+                "event_id": event["event_id"],
+                "aggregate_type": event["aggregate_type"],
+                "aggregate_id": event["aggregate_id"],
+                "event_type": event["event_type"],
+                "data": payload.get("data"),
+                "occurred_at": occurred_at,
+                "created_at": event["created_at"],
+            }}, upsert=True))
+            if payload.get("funnel"):
+                session_ops.extend(_session_ops(event["dedup_key"], occurred_at, payload["funnel"]))
+
+        self.database["domain_events"].bulk_write(domain_ops, ordered=False)
+        if session_ops:
+            # 同一個 session 的操作需依序執行（先建立 session 再 $push）
+            self.database["user_sessions"].bulk_write(session_ops, ordered=True)
@@ -0,0 +1,146 @@
+"""
+user_sessions 的保存期限與冷資料匯出
+- updated_at 上的 TTL index（SESSION_TTL_DAYS 天沒有更新的 session 由 MongoDB 自動刪除，0 表示不刪除）
+- export_sessions：TTL 刪除之前，把 updated_at 超過 older_than_days 天的 session 依 updated_at 的日期（UTC）
+  匯出成 {directory}/user_sessions/YYYY/MM/YYYY-MM-DD.jsonl.gz（MongoDB Extended JSON，保留 ObjectId / 日期型別）；
+  已存在的日期檔案略過，可重複執行。session 匯出後若又被更新，會在之後的日期再匯出一次
+- load_sessions：把一段日期的檔案匯入另一個 collection 分析（預設 user_sessions_restored，不受 TTL 影響），
+  依日期順序以 _id 覆寫，同一個 session 保留最新的版本
+"""
+import gzip
+import os
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+from bson import json_util
+from pymongo import ReplaceOne
+
+from app.mongodb.connection import get_mongo_db
+
+SESSION_COLLECTION = "user_sessions"
+TTL_INDEX_NAME = "updated_at_1"
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+def ensure_session_ttl(collection, ttl_days: float):
+    """
+    建立或調整 updated_at 的 TTL index；ttl_days <= 0 時改為一般 index。回傳目前的 expireAfterSeconds（或 None）。
+    """
+    expire_after = int(ttl_days * 86400) if ttl_days > 0 else None
+    existing = next((index for index in collection.list_indexes() if index["name"] == TTL_INDEX_NAME), None)
+    current = existing.get("expireAfterSeconds") if existing else None
+    if existing is not None and current == expire_after:
+        return current
+
+    if existing is not None and current is not None and expire_after is not None:
+        # 只改期限時以 collMod 調整，不需重建 index
+        collection.database.command("collMod", collection.name, index={
+            "keyPattern": {"updated_at": 1}, "expireAfterSeconds": expire_after})
+        return expire_after
+
+    if existing is not None:
+        collection.drop_index(TTL_INDEX_NAME)
+    if expire_after is None:
+        collection.create_index([("updated_at", 1)], name=TTL_INDEX_NAME)
+    else:
+        collection.create_index([("updated_at", 1)], name=TTL_INDEX_NAME, expireAfterSeconds=expire_after)
+    return expire_after
+
+
+def partition_path(directory: str, day: date) -> str:
+    return os.path.join(directory, SESSION_COLLECTION, f"{day:%Y}", f"{day:%m}", f"{day:%Y-%m-%d}.jsonl.gz")
+
+
+def _day_range(day: date):
+    start = datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _export_day(collection, path: str, day: date, batch_size: int) -> int:
+    start, end = _day_range(day)
+    cursor = collection.find({"updated_at": {"$gte": start, "$lt": end}}).sort("updated_at", 1).batch_size(batch_size)
+    # 先寫入暫存檔再 rename，中斷時不會留下不完整的日期檔案（下次執行會重新匯出）；沒有資料的日期不建立檔案
+    tmp_path = path + ".tmp"
+    count = 0
+    f = None
+    try:
+        for document in cursor:
+            if f is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                f = gzip.open(tmp_path, "wt", encoding="utf-8")
+            f.write(json_util.dumps(document, json_options=JSON_OPTIONS) + "\n")
+            count += 1
+        if f is not None:
+            f.close()
+            os.replace(tmp_path, path)
+    finally:
+        if f is not None and os.path.exists(tmp_path):
+            f.close()
+            os.remove(tmp_path)
+    return count
+
+
+def export_sessions(directory: str, older_than_days: int, batch_size: int = 1000, database=None):
+    """
+    匯出 updated_at 在 older_than_days 天之前（以整天計）且尚未匯出的日期，回傳統計。
+    older_than_days 需小於 SESSION_TTL_DAYS，並保留足夠的時間讓排程在 TTL 刪除之前執行。
+    """
+    started = time.perf_counter()
+    collection = (database if database is not None else get_mongo_db())[SESSION_COLLECTION]
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=older_than_days)
+    stats = {"days": 0, "sessions": 0, "skipped_days": 0, "files": []}
+
+    oldest = collection.find_one({"updated_at": {"$type": "date"}}, {"updated_at": 1}, sort=[("updated_at", 1)])
+    day = oldest["updated_at"].date() if oldest else cutoff
+    while day < cutoff:
+        path = partition_path(directory, day)
+        if os.path.exists(path):
+            stats["skipped_days"] += 1
+        else:
+            count = _export_day(collection, path, day, batch_size)
+            if count:
+                stats["days"] += 1
+                stats["sessions"] += count
+                stats["files"].append(path)
+        day += timedelta(days=1)
+    stats["duration_ms"] = int((time.perf_counter() - started) * 1000)
+    return stats
+
+
+def load_sessions(directory: str, start: date, end: date, target: str = "user_sessions_restored",
+                  batch_size: int = 1000, database=None):
+    """
+    把 start ~ end（包含兩端）的日期檔案匯入 target collection，回傳統計。
+    """
+    if target == SESSION_COLLECTION:
+        # 匯入的 updated_at 都已超過保存期限，寫回 user_sessions 會立刻被 TTL 刪除
+        raise ValueError(f"請匯入 {SESSION_COLLECTION} 以外的 collection")
+    started = time.perf_counter()
+    collection = (database if database is not None else get_mongo_db())[target]
+    # 同一個 session_id 在 TTL 刪除後可能以新的 _id 重新建立，這裡不加 unique
+    collection.create_index([("session_id", 1)])
+    stats = {"days": 0, "sessions": 0, "missing_days": 0}
+
+    day = start
+    while day <= end:
+        path = partition_path(directory, day)
+        if not os.path.exists(path):
+            stats["missing_days"] += 1
+            day += timedelta(days=1)
+            continue
+        ops = []
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                document = json_util.loads(line, json_options=JSON_OPTIONS)
+                ops.append(ReplaceOne({"_id": document["_id"]}, document, upsert=True))
+                if len(ops) >= batch_size:
+                    collection.bulk_write(ops, ordered=False)
+                    stats["sessions"] += len(ops)
+                    ops = []
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+            stats["sessions"] += len(ops)
+        stats["days"] += 1
+        day += timedelta(days=1)
+    stats["duration_ms"] = int((time.perf_counter() - started) * 1000)
+    return stats
@@ -0,0 +1,38 @@
+import mimetypes
+import os
+
+from flask import Blueprint, abort, current_app, request, send_file
+
+from app.utils.compression import precompressed_variant
+
+frontend_bp = Blueprint("frontend", __name__)
+
+FRONTEND_FILES = ("index.html", "app.js")
+
+
+def _serve(filename: str):
+    """
+    回傳前端靜態檔；有較新的 .br / .gz（flask compress-frontend 產生）且 client 接受時直接送出壓縮檔。
+    """
+    path = os.path.join(os.path.abspath(current_app.config["FRONTEND_DIR"]), filename)
+    if not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0]
+    compressed, encoding = precompressed_variant(path, request.headers.get("Accept-Encoding", ""))
+    if compressed is None:
+        # 沒有預先壓縮檔時由壓縮 middleware 處理
+        return send_file(path, mimetype=mimetype)
+    response = send_file(compressed, mimetype=mimetype)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@frontend_bp.get("/")
+def index():
+    return _serve("index.html")
+
+
+@frontend_bp.get("/<any(index.html, app.js):filename>")
+def static_file(filename):
+    return _serve(filename)
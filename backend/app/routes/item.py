@@ -1,9 +1,12 @@
-from flask import Blueprint, request, jsonify
-from app.services.item_service import get_item_detail, get_category_items, get_item_borrowed_time, upload_item, update_item, report_item, verify_item, get_subcategory
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, g
+from app.services.item_service import get_item_detail, get_category_items, search_items, get_item_borrowed_time, get_items_availability, find_available_items, parse_datetime, upload_item, update_item, report_item, verify_item, get_subcategory
 from app.mongodb.funnel_tracker import log_event
+from app.utils.auth import login_required, role_required
 item_bp = Blueprint("item", __name__)
 
 @item_bp.get("/item/<int:i_id>")
+@login_required
 def get_this_item_detail(i_id):
     """
     處理取得物品詳細資訊請求。
@@ -11,17 +14,6 @@ def get_this_item_detail(i_id):
     接收物品 ID，
     取得物品詳細資訊後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
     ok, result = get_item_detail(i_id)
     log_event(
         event_type='get_item_detail',
@@ -35,6 +27,39 @@ def get_this_item_detail(i_id):
     return jsonify(result)
 
 
+@item_bp.get("/item/search")
+def search_this_items():
+    """
+    處理搜尋物品請求。
+
+    Query 參數：q（關鍵字）、c_id（類別，含子類別）、status、limit、
+    after_rank / after_i_id（上一頁回傳的 next_cursor）。
+    """
+    try:
+        c_id = request.args.get("c_id", type=int)
+        limit = int(request.args.get("limit", 20))
+        after_rank = request.args.get("after_rank")
+        after_rank = float(after_rank) if after_rank is not None else None
+        after_i_id = request.args.get("after_i_id", type=int)
+    except ValueError:
+        return jsonify({"error": "Invalid search parameters"}), 400
+    if (after_rank is None) != (after_i_id is None):
+        return jsonify({"error": "Invalid search parameters"}), 400
+    keyword = request.args.get("q", "")
+    ok, result = search_items(keyword, c_id, request.args.get("status"), limit, after_rank, after_i_id)
+    log_event(
+        event_type='search_items',
+        endpoint='/item/search',
+        success=ok,
+        keyword=keyword,
+        category_id=c_id,
+        error_reason=result if not ok else None
+    )
+    if not ok:
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
+
 @item_bp.get("/item/category/<int:c_id>")
 def get_this_category_items(c_id):
     """
@@ -103,7 +128,63 @@ def get_this_item_borrowed_time(i_id):
     return jsonify(result)
 
 
+@item_bp.get("/item/availability")
+def get_these_items_availability():
+    """
+    處理取得多個物品可借時段請求。
+
+    Query 參數：i_ids（以逗號分隔的物品 ID）、start、end（ISO 8601，預設為現在起 30 天）。
+    """
+    try:
+        i_ids = [int(i_id) for i_id in request.args.get("i_ids", "").split(",") if i_id.strip()]
+        start = request.args.get("start")
+        range_start = parse_datetime(start) if start else datetime.now().replace(microsecond=0)
+        end = request.args.get("end")
+        range_end = parse_datetime(end) if end else range_start + timedelta(days=30)
+    except ValueError:
+        return jsonify({"error": "Invalid availability parameters"}), 400
+    ok, result = get_items_availability(i_ids, range_start, range_end)
+    log_event(
+        event_type='get_items_availability',
+        endpoint='/item/availability',
+        success=ok,
+        item_count=len(i_ids),
+        error_reason=result if not ok else None)
+    if not ok:
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
+
+@item_bp.get("/item/category/<int:c_id>/available")
+def get_this_category_available_items(c_id):
+    """
+    處理查詢類別中某段時間可借物品請求。
+
+    Query 參數：start、end（ISO 8601，必填）、p_id（取貨地點，選填）、
+    limit、after_i_id（上一頁回傳的 next_cursor）。
+    """
+    try:
+        range_start = parse_datetime(request.args["start"])
+        range_end = parse_datetime(request.args["end"])
+        p_id = request.args.get("p_id", type=int)
+        limit = int(request.args.get("limit", 20))
+        after_i_id = request.args.get("after_i_id", type=int)
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid availability parameters"}), 400
+    ok, result = find_available_items(c_id, range_start, range_end, p_id, limit, after_i_id)
+    log_event(
+        event_type='find_available_items',
+        endpoint=f'/item/category/{c_id}/available',
+        success=ok,
+        category_id=c_id,
+        error_reason=result if not ok else None)
+    if not ok:
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
+
 @item_bp.post("/item/upload")
+@login_required
 def upload_new_item():
     """
     處理上傳新物品請求。
@@ -111,24 +192,15 @@ def upload_new_item():
     接收物品資訊，
     上傳新物品後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
     data = request.get_json() or {}
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = upload_item(token, data)
+    ok, result = upload_item(g.auth_token, data)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 
 @item_bp.put("/item/<int:i_id>")
+@role_required("member")
 def update_this_item(i_id):
     """
     處理更新物品請求。
@@ -136,22 +208,14 @@ def update_this_item(i_id):
     接收物品 ID 和物品資訊，
     更新物品後回傳。
     """
-    auth_header = request.headers.get("Authorization")
-     
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-        
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
     data = request.get_json() or {}
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = update_item(token, i_id, data)
+    ok, result = update_item(g.auth_token, i_id, data)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 @item_bp.post("/item/<int:i_id>/report")
+@role_required("member")
 def report_this_item(i_id):
     """
     處理檢舉物品請求。
@@ -159,19 +223,14 @@ def report_this_item(i_id):
     接收物品 ID，
     檢舉物品後回傳。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
     data = request.get_json() or {}
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = report_item(token, i_id, data)
+    ok, result = report_item(g.auth_token, i_id, data)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 @item_bp.post("/item/<int:i_id>/verify")
+@role_required("member")
 def verify_this_item(i_id):
     """
     處理驗證物品請求。
@@ -179,14 +238,7 @@ def verify_this_item(i_id):
     接收物品 ID，
     驗證物品後回傳。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = verify_item(token, i_id)
+    ok, result = verify_item(g.auth_token, i_id)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
-
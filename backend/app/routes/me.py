@@ -1,11 +1,13 @@
-from flask import Blueprint, request, jsonify
-from app.services.me_service import get_profile_service, get_my_items, get_my_reservations, get_reservation_detail, get_reviewable_items, get_contributions_and_bans, review_item
+from flask import Blueprint, request, jsonify, g
+from app.services.me_service import get_profile_service, get_my_items, get_my_reservations, get_reservation_detail, get_reviewable_items, get_contributions_and_bans, get_my_eligibility, review_item
+from app.utils.auth import login_required
 
 
 me_bp = Blueprint("me", __name__)
 
 
 @me_bp.get("/me/profile")
+@login_required
 def get_profile():
     """
     處理取得使用者 profile 請求。
@@ -13,23 +15,14 @@ def get_profile():
     接收 JSON 格式的 token，
     取得使用者 profile 後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_profile_service(token)
+    ok, result = get_profile_service(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 
 @me_bp.get("/me/items")
+@login_required
 def get_items():
     """
     處理取得使用者物品請求。
@@ -37,23 +30,14 @@ def get_items():
     接收 JSON 格式的 token，
     取得使用者物品後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_my_items(token)
+    ok, result = get_my_items(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 
 @me_bp.get("/me/reservations")
+@login_required
 def get_reservations():
     """
     處理取得使用者預約請求。
@@ -61,23 +45,14 @@ def get_reservations():
     接收 JSON 格式的 token，
     取得使用者預約後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_my_reservations(token)
+    ok, result = get_my_reservations(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 
 @me_bp.get("/me/reservation_detail/<int:r_id>")
+@login_required
 def get_this_reservation_detail(r_id):
     """
     處理取得使用者預約詳細資訊請求。
@@ -85,23 +60,15 @@ def get_this_reservation_detail(r_id):
     接收 JSON 格式的 token，
     取得使用者預約詳細資訊後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-
-    # 檢查格式是否正確 (Bearer <token>)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_reservation_detail(token, r_id)
+    include_archived = request.args.get("include_archived", "false").lower() in ("1", "true")
+    ok, result = get_reservation_detail(g.auth_token, r_id, include_archived)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 
 @me_bp.get("/me/reviewable_items")
+@login_required
 def get_my_reviewable_items():
     """
     處理取得使用者可評論的物品請求。
@@ -109,36 +76,25 @@ def get_my_reviewable_items():
     接收 JSON 格式的 token，
     取得使用者可評論的物品後回傳。
     """
-
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_reviewable_items(token)
+    ok, result = get_reviewable_items(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 @me_bp.post("/me/review_item/<int:l_id>")
+@login_required
 def review_this_item(l_id):
     """
     處理評論物品請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
     data = request.get_json() or {}
-    ok, result = review_item(token, l_id, data)
+    ok, result = review_item(g.auth_token, l_id, data)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 @me_bp.get("/me/contributions")
+@login_required
 def get_my_contributions():
     """
     處理取得使用者貢獻請求。
@@ -146,13 +102,22 @@ def get_my_contributions():
     接收 JSON 格式的 token，
     取得使用者貢獻後回傳。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_contributions_and_bans(token)
+    ok, result = get_contributions_and_bans(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
-    return jsonify(result)
\ No newline at end of file
+    return jsonify(result)
+
+
+@me_bp.get("/me/eligibility")
+@login_required
+def get_eligibility():
+    """
+    處理取得使用者借用資格請求。
+
+    接收 JSON 格式的 token，
+    取得被禁止的類別與有額度的 root category 後回傳。
+    """
+    ok, result = get_my_eligibility(g.auth_token)
+    if not ok:
+        return jsonify({"error": result}), 401
+    return jsonify(result)
@@ -1,34 +1,86 @@
-from flask import Blueprint, request, jsonify
-from app.services.owner_service import get_future_reservation_details, punch_in_loan
+from datetime import datetime
+from flask import Blueprint, request, jsonify, g
+from app.services.owner_service import get_future_reservation_details, punch_in_loan, get_upcoming_loans, get_overdue_loans, punch_in_loans
+from app.utils.auth import role_required
 
 
 owner_bp = Blueprint("owner", __name__)
 
 @owner_bp.get("/owner/future_reservation_details")
+@role_required("member")
 def get_my_future_reservation_details():
     """
     處理取得未來的預約詳細資訊請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]
-    ok, result = get_future_reservation_details(token)
+    ok, result = get_future_reservation_details(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify({"result": result}), 200
 
+@owner_bp.get("/owner/upcoming_loans")
+@role_required("member")
+def get_my_upcoming_loans():
+    """
+    處理取得未歸還借用（分頁）請求。
+
+    Query 參數：limit、after_start_at、after_l_id（上一頁回傳的 next_cursor）。
+    """
+    try:
+        limit = int(request.args.get("limit", 20))
+        after_start_at = request.args.get("after_start_at")
+        after_start_at = datetime.fromisoformat(after_start_at) if after_start_at else None
+        after_l_id = request.args.get("after_l_id", type=int)
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    if (after_start_at is None) != (after_l_id is None):
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    ok, result = get_upcoming_loans(g.auth_token, limit, after_start_at, after_l_id)
+    if not ok:
+        return jsonify({"error": result}), 401
+    return jsonify(result), 200
+
+@owner_bp.get("/owner/overdue")
+@role_required("member")
+def get_my_overdue_loans():
+    """
+    處理取得逾期借用（分頁）請求。
+
+    Query 參數：limit、after_due_at、after_l_id（上一頁回傳的 next_cursor）。
+    """
+    try:
+        limit = int(request.args.get("limit", 20))
+        after_due_at = request.args.get("after_due_at")
+        after_due_at = datetime.fromisoformat(after_due_at) if after_due_at else None
+        after_l_id = request.args.get("after_l_id", type=int)
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    if (after_due_at is None) != (after_l_id is None):
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    ok, result = get_overdue_loans(g.auth_token, limit, after_due_at, after_l_id)
+    if not ok:
+        return jsonify({"error": result}), 401
+    return jsonify(result), 200
+
 @owner_bp.post("/owner/punch_in_loan/<int:l_id>")
+@role_required("member")
 def punch_in_this_loan(l_id):
     """
     處理打卡請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]
     data = request.get_json() or {}
-    ok, result = punch_in_loan(token, l_id, data)
+    ok, result = punch_in_loan(g.auth_token, l_id, data)
     if not ok:
         return jsonify({"error": result}), 401
-    return jsonify({"result": result}), 200
\ No newline at end of file
+    return jsonify({"result": result}), 200
+
+@owner_bp.post("/owner/punch_in_loans")
+@role_required("member")
+def punch_in_these_loans():
+    """
+    處理批次打卡請求。
+    """
+    data = request.get_json() or {}
+    ok, result = punch_in_loans(g.auth_token, data)
+    if not ok:
+        return jsonify({"error": result}), 400
+    return jsonify(result), 200
@@ -1,52 +1,41 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from app.services.reservation_service import create_reservation, delete_reservation, get_pickup_places
 from app.mongodb.funnel_tracker import log_event
+from app.services import outbox
+from app.utils.auth import role_required
 
 reservation_bp = Blueprint("reservation", __name__)
 
 
 @reservation_bp.post("/reservation/create")
+@role_required("member")
 def create_this_reservation():
     """
     處理建立預約請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]
     data = request.get_json() or {}
-    ok, result = create_reservation(token, data)
-    if ok:
-        log_event(
-            event_type='create_reservation',
-            endpoint=f'/reservation/create',
-            success=True,
-            reservation_id=result["r_id"],
-        )
+    ok, result = create_reservation(g.auth_token, data)
+    # 成功的預約事件已在 create_reservation 的 transaction 內寫入 outbox
     if not ok:
         print(result)
-        log_event(
-            event_type='create_reservation',
-            endpoint=f'/reservation/create',
-            success=False,
-            error_reason=result,
-            item_ids=[rd.get('i_id') for rd in data.get(
-                'rd_list', [])] if isinstance(data, dict) else []
-        )
+        item_ids = [rd.get('i_id') for rd in data.get(
+            'rd_list', [])] if isinstance(data, dict) else []
+        # 預約的 transaction 已 rollback，失敗事件以獨立的 transaction 寫入 outbox
+        outbox.record("reservation", None, "reservation_failed",
+                      {"m_id": g.user_id, "item_ids": item_ids, "error_reason": result},
+                      funnel={"event_type": "create_reservation", "success": False,
+                              "error_reason": result, "item_ids": item_ids})
         return jsonify({"error": result}), 401
     return jsonify({"result": result}), 200
 
 
 @reservation_bp.delete("/reservation/delete/<int:r_id>")
+@role_required("member")
 def delete_this_reservation(r_id):
     """
     處理刪除預約請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]
-    ok, result = delete_reservation(token, r_id)
+    ok, result = delete_reservation(g.auth_token, r_id)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify({"result": result}), 200
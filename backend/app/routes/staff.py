@@ -1,9 +1,31 @@
-from flask import Blueprint, request, jsonify
-from app.services.staff_service import get_this_staff, get_not_deal_reports, conclude_report, get_not_deal_verification, conclude_verification
+from datetime import datetime
+from flask import Blueprint, request, jsonify, g
+from app.services.staff_service import get_this_staff, get_not_deal_reports, conclude_report, get_not_deal_verification, conclude_verification, conclude_reports_batch, conclude_verifications_batch, get_queue_counts
+from app.utils.auth import role_required
 
 staff_bp = Blueprint("staff", __name__)
 
+
+def _queue_args():
+    """
+    解析待處理佇列共用的 Query 參數：limit、order、c_id、owner_m_id、after_create_at、after_id。
+    """
+    after_create_at = request.args.get("after_create_at")
+    after_id = request.args.get("after_id", type=int)
+    if (after_create_at is None) != (after_id is None):
+        raise ValueError("after_create_at and after_id must be given together")
+    return {
+        "limit": int(request.args.get("limit", 50)),
+        "order": request.args.get("order", "asc"),
+        "c_id": request.args.get("c_id", type=int),
+        "owner_m_id": request.args.get("owner_m_id", type=int),
+        "after_create_at": datetime.fromisoformat(after_create_at) if after_create_at else None,
+        "after_id": after_id,
+    }
+
+
 @staff_bp.get("/staff")
+@role_required("staff")
 def get_staff():
     """
     處理取得員工資訊請求。
@@ -11,18 +33,24 @@ def get_staff():
     接收員工 ID，
     取得員工資訊後回傳。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_this_staff(token)
+    ok, result = get_this_staff(g.auth_token)
+    if not ok:
+        return jsonify({"error": result}), 401
+    return jsonify(result)
+
+@staff_bp.get("/staff/queue_counts")
+@role_required("staff")
+def get_my_queue_counts():
+    """
+    處理取得待處理檢舉與驗證數量請求。
+    """
+    ok, result = get_queue_counts(g.auth_token)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 @staff_bp.get("/staff/report")
+@role_required("staff")
 def get_not_deal_reports_route():
     """
     處理取得未處理的檢舉資訊請求。
@@ -30,63 +58,75 @@ def get_not_deal_reports_route():
     接收員工 ID，
     取得未處理的檢舉資訊後回傳。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_not_deal_reports(token)
+    try:
+        args = _queue_args()
+        args["reporter_m_id"] = request.args.get("reporter_m_id", type=int)
+    except ValueError:
+        return jsonify({"error": "Invalid queue parameters"}), 400
+    ok, result = get_not_deal_reports(g.auth_token, **args)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
+@staff_bp.post("/staff/report/batch")
+@role_required("staff")
+def conclude_these_reports():
+    """
+    處理批次結案檢舉請求。
+    """
+    data = request.get_json() or {}
+    ok, result = conclude_reports_batch(g.auth_token, data)
+    if not ok:
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
 @staff_bp.post("/staff/report/<int:re_id>")
+@role_required("staff")
 def conclude_this_report(re_id):
     """
     處理結案檢舉請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
     data = request.get_json() or {}
-    ok, result = conclude_report(token, re_id, data)
+    ok, result = conclude_report(g.auth_token, re_id, data)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
 @staff_bp.get("/staff/verification")
+@role_required("staff")
 def get_not_deal_verification_route():
     """
     處理取得未處理的驗證資訊請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
-    ok, result = get_not_deal_verification(token)
+    try:
+        args = _queue_args()
+    except ValueError:
+        return jsonify({"error": "Invalid queue parameters"}), 400
+    ok, result = get_not_deal_verification(g.auth_token, **args)
     if not ok:
         return jsonify({"error": result}), 401
     return jsonify(result)
 
+@staff_bp.post("/staff/verification/batch")
+@role_required("staff")
+def conclude_these_verifications():
+    """
+    處理批次結案驗證請求。
+    """
+    data = request.get_json() or {}
+    ok, result = conclude_verifications_batch(g.auth_token, data)
+    if not ok:
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
 @staff_bp.post("/staff/verification/<int:iv_id>")
+@role_required("staff")
 def conclude_this_verification(iv_id):
     """
     處理結案驗證請求。
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return jsonify({"error": "Unauthorized: Missing or invalid token"}), 401
-    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
-    if not token:
-        return jsonify({"error": "Unauthorized"}), 401
     data = request.get_json() or {}
-    ok, result = conclude_verification(token, iv_id, data)
+    ok, result = conclude_verification(g.auth_token, iv_id, data)
     if not ok:
         return jsonify({"error": result}), 401
-    return jsonify(result)
\ No newline at end of file
+    return jsonify(result)
@@ -0,0 +1,193 @@
+"""
+冷資料封存
+- 把已軟刪除的資料列、以及已結束超過保留期的借用搬到 *_archive 表（欄位與原表相同，另加 archived_at），
+  熱資料表與其 index 只保留仍在使用的資料，查詢也不必再掃過大量 is_deleted = true 的資料列
+- 以預約為單位封存：預約已刪除、或所有明細的 loan 都已歸還超過保留期時，
+  reservation / reservation_detail / loan / loan_event / review 在同一個 transaction 內一起搬移，
+  熱資料不會參照到已封存的資料列；封存表之間保留外鍵
+- 其他軟刪除資料（review、item_pick、category_ban、沒有被參照的 pick_up_place）各自分批搬移
+- 需要包含已封存資料的讀取以 source(table, True) 取得 *_all view（原表 UNION ALL 封存表）
+"""
+import calendar
+import time
+from datetime import datetime
+
+from app.extensions import db
+from app.utils.prepared import prepared
+
+# 封存排程的 advisory lock，避免多個排程同時執行
+ARCHIVE_JOB_LOCK_ID = 743_000_102
+
+# 預設保留期：歸還超過幾個月的預約才封存
+ARCHIVE_AFTER_MONTHS = 6
+
+# 有 *_all view 的表
+ARCHIVED_VIEWS = ("reservation", "reservation_detail", "loan", "loan_event", "review", "pick_up_place")
+
+# 單獨封存的軟刪除資料：table -> (主鍵欄位, 額外條件, 封存表主鍵衝突時的處理)
+SOFT_DELETED = {
+    "review": ("review_id", "", "DO NOTHING"),
+    "item_pick": ("i_id, p_id", "", "DO UPDATE SET archived_at = EXCLUDED.archived_at"),
+    "category_ban": ("c_id, m_id", "", "DO NOTHING"),
+    # 仍被熱資料參照的取貨地點要等相關預約封存後才搬
+    "pick_up_place": ("p_id", """
+        AND NOT EXISTS (SELECT 1 FROM item_pick ip WHERE ip.p_id = t.p_id)
+        AND NOT EXISTS (SELECT 1 FROM reservation_detail rd WHERE rd.p_id = t.p_id)
+    """, "DO NOTHING"),
+}
+
+
+ARCHIVE_JOB_LOCK = prepared("archive_job_lock", """
+    SELECT pg_try_advisory_xact_lock(:lock_id)
+""")
+
+ARCHIVABLE_RESERVATIONS = prepared("archivable_reservations", """
+    SELECT r.r_id
+    FROM reservation r
+    WHERE r.r_id > :after_r_id
+    AND NOT EXISTS (
+        SELECT 1
+        FROM reservation_detail rd
+        LEFT JOIN loan l ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+        WHERE rd.r_id = r.r_id
+        AND (l.status <> 'Returned'
+             OR (NOT r.is_deleted
+                 AND (l.l_id IS NULL OR COALESCE(l.actual_return_at, rd.est_due_at) >= :cutoff)))
+    )
+    ORDER BY r.r_id
+    LIMIT :batch_size
+    FOR UPDATE OF r SKIP LOCKED
+""")
+
+RESERVATION_LOAN_IDS = prepared("reservation_loan_ids", """
+    SELECT l.l_id
+    FROM reservation_detail rd
+    JOIN loan l ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    WHERE rd.r_id = ANY(CAST(:r_ids AS BIGINT[]))
+""")
+
+# 先寫入封存表（父表在前），再從原表刪除（review 以 RESTRICT 參照 loan，需先刪除）
+ARCHIVE_RESERVATION_STATEMENTS = [prepared(name, sql) for name, sql in (
+    ("archive_reservations", "INSERT INTO reservation_archive SELECT r.*, CAST(:now AS TIMESTAMP) "
+                             "FROM reservation r WHERE r.r_id = ANY(CAST(:r_ids AS BIGINT[]))"),
+    ("archive_reservation_details", "INSERT INTO reservation_detail_archive SELECT rd.*, CAST(:now AS TIMESTAMP) "
+                                    "FROM reservation_detail rd WHERE rd.r_id = ANY(CAST(:r_ids AS BIGINT[]))"),
+    ("archive_loans", "INSERT INTO loan_archive SELECT l.*, CAST(:now AS TIMESTAMP) "
+                      "FROM loan l WHERE l.l_id = ANY(CAST(:l_ids AS BIGINT[]))"),
+    ("archive_loan_events", "INSERT INTO loan_event_archive SELECT le.*, CAST(:now AS TIMESTAMP) "
+                            "FROM loan_event le WHERE le.l_id = ANY(CAST(:l_ids AS BIGINT[]))"),
+    ("archive_reviews", "INSERT INTO review_archive SELECT rv.*, CAST(:now AS TIMESTAMP) "
+                        "FROM review rv WHERE rv.l_id = ANY(CAST(:l_ids AS BIGINT[]))"),
+    ("delete_archived_reviews", "DELETE FROM review WHERE l_id = ANY(CAST(:l_ids AS BIGINT[]))"),
+    # reservation_detail、loan、loan_event、owner_upcoming_loans 以 ON DELETE CASCADE 一併刪除
+    ("delete_archived_reservations", "DELETE FROM reservation WHERE r_id = ANY(CAST(:r_ids AS BIGINT[]))"),
+)]
+
+
+def _archive_soft_deleted_sql(table: str) -> str:
+    key, condition, on_conflict = SOFT_DELETED[table]
+    return f"""
+        WITH moved AS (
+            DELETE FROM {table}
+            WHERE ({key}) IN (
+                SELECT {key} FROM {table} t
+                WHERE t.is_deleted = true {condition}
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        ),
+        archived AS (
+            INSERT INTO {table}_archive
+            SELECT moved.*, CAST(:now AS TIMESTAMP) FROM moved
+            ON CONFLICT {on_conflict}
+        )
+        SELECT COUNT(*) FROM moved
+    """
+
+
+ARCHIVE_SOFT_DELETED = {table: prepared(f"archive_soft_deleted_{table}", _archive_soft_deleted_sql(table))
+                        for table in SOFT_DELETED}
+
+
+def source(table: str, include_archived: bool = False):
+    """
+    回傳查詢用的資料來源：include_archived 時為包含封存資料的 *_all view。
+    """
+    if include_archived and table in ARCHIVED_VIEWS:
+        return f"{table}_all"
+    return table
+
+
+def months_ago(months: int):
+    now = datetime.now()
+    index = now.year * 12 + now.month - 1 - months
+    year, month = index // 12, index % 12 + 1
+    # 目標月份沒有這一天時取該月最後一天（例如 3/31 的一個月前為 2/28 或 2/29）
+    return now.replace(year=year, month=month, day=min(now.day, calendar.monthrange(year, month)[1]))
+
+
+def _lock():
+    return ARCHIVE_JOB_LOCK.execute(db.session, {"lock_id": ARCHIVE_JOB_LOCK_ID}).scalar()
+
+
+def _archive_reservation_batch(after_r_id: int, cutoff: datetime, batch_size: int, now: datetime):
+    """
+    封存一批預約與其明細、loan、loan_event、review；回傳 (r_ids, l_ids)。
+    """
+    r_ids = ARCHIVABLE_RESERVATIONS.execute(
+        db.session, {"after_r_id": after_r_id, "cutoff": cutoff, "batch_size": batch_size}).scalars().all()
+    if not r_ids:
+        return [], []
+    l_ids = RESERVATION_LOAN_IDS.execute(db.session, {"r_ids": r_ids}).scalars().all()
+
+    params = {"r_ids": r_ids, "l_ids": l_ids, "now": now}
+    for statement in ARCHIVE_RESERVATION_STATEMENTS:
+        statement.execute(db.session, params)
+    return r_ids, l_ids
+
+
+def _archive_soft_deleted_batch(table: str, batch_size: int, now: datetime):
+    return ARCHIVE_SOFT_DELETED[table].execute(db.session, {"batch_size": batch_size, "now": now}).scalar()
+
+
+def archive_cold_rows(older_than_months: int = ARCHIVE_AFTER_MONTHS, batch_size: int = 500,
+                      sleep: float = 0.1):
+    """
+    封存排程（見 flask archive）：每批一個 transaction，批次之間暫停 sleep 秒，讓出 I/O 給線上查詢。
+    回傳各表搬移的筆數。
+    """
+    cutoff = months_ago(older_than_months)
+    started = time.perf_counter()
+    stats = {"reservation": 0, "loan": 0}
+    stats.update({table: 0 for table in SOFT_DELETED})
+
+    after_r_id = 0
+    while True:
+        if not _lock():
+            db.session.rollback()
+            return {"skipped": True, "message": "Another archive job is running"}
+        r_ids, l_ids = _archive_reservation_batch(after_r_id, cutoff, batch_size, datetime.now())
+        db.session.commit()
+        if not r_ids:
+            break
+        stats["reservation"] += len(r_ids)
+        stats["loan"] += len(l_ids)
+        after_r_id = r_ids[-1]
+        time.sleep(sleep)
+
+    # 預約封存後，原本被參照的取貨地點才可能可以搬移，因此放在最後
+    for table in SOFT_DELETED:
+        while True:
+            if not _lock():
+                db.session.rollback()
+                return {"skipped": True, "message": "Another archive job is running"}
+            moved = _archive_soft_deleted_batch(table, batch_size, datetime.now())
+            db.session.commit()
+            stats[table] += moved
+            if moved < batch_size:
+                break
+            time.sleep(sleep)
+
+    stats["duration_ms"] = int((time.perf_counter() - started) * 1000)
+    return stats
@@ -1,11 +1,44 @@
-from sqlalchemy import text
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.extensions import db
 from app.utils.jwt_utils import generate_token
+from app.utils.password import hash_password, verify_password, needs_rehash
+from app.utils.prepared import prepared
 from app.models.member import Member
 from sqlalchemy.exc import IntegrityError
 
 
+MEMBER_LOGIN = prepared("member_login", """
+    SELECT m_id, m_password, m_name
+    FROM member
+    WHERE m_mail = :mail and is_active = true
+""")
+
+STAFF_LOGIN = prepared("staff_login", """
+    SELECT s_id, s_password, s_name
+    FROM staff
+    WHERE s_mail = :mail and is_deleted = false
+""")
+
+UPDATE_MEMBER_PASSWORD = prepared("update_member_password", """
+    UPDATE member SET m_password = :pw WHERE m_id = :id
+""")
+
+UPDATE_STAFF_PASSWORD = prepared("update_staff_password", """
+    UPDATE staff SET s_password = :pw WHERE s_id = :id
+""")
+
+
+def _rehash(update_query, user_id: int, password: str):
+    """
+    以目前的雜湊參數重新雜湊密碼。屬於 best-effort，失敗不影響這次登入。
+    """
+    try:
+        update_query.execute(db.session, {"pw": hash_password(password), "id": user_id})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Rehash Error: {e}")
+
+
 def login_service(email: str, password: str, login_as: str):
     """
     處理使用者登入請求。
@@ -15,36 +48,34 @@ def login_service(email: str, password: str, login_as: str):
     """
 
     if login_as == "member":
-        member_row = db.session.execute(
-            text("""
-                SELECT m_id, m_password, m_name
-                FROM member    -- 如果你在 public schema 就改成 public.user 或直接 user
-                WHERE m_mail = :mail and is_active = true
-            """),
-            {"mail": email},
-        ).mappings().first()
+        member_row = MEMBER_LOGIN.execute(db.session, {"mail": email}).mappings().first()
         if not member_row:
             return False, "member not found"
 
-        if not check_password_hash(member_row["m_password"], password):
-            return False, "wrong password"
+        try:
+            if not verify_password(member_row["m_password"], password):
+                return False, "wrong password"
+        except TimeoutError:
+            return False, "System busy, please try again later"
+
+        # 雜湊參數變更過的話，趁登入成功時以新參數重新雜湊
+        if needs_rehash(member_row["m_password"]):
+            _rehash(UPDATE_MEMBER_PASSWORD, member_row["m_id"], password)
 
         # 4. 產生 token
         token = generate_token(member_row["m_id"], "member")
         return True, {"token": token, "role": "member", "m_id": member_row["m_id"], "m_name": member_row["m_name"]}
     elif login_as == "staff":
-        staff_row = db.session.execute(
-            text("""
-                SELECT s_id, s_password, s_name
-                FROM staff
-                WHERE s_mail = :mail and is_deleted = false
-            """),
-            {"mail": email},
-        ).mappings().first()
+        staff_row = STAFF_LOGIN.execute(db.session, {"mail": email}).mappings().first()
         if not staff_row:
             return False, "staff not found"
-        if not check_password_hash(staff_row["s_password"], password):
-            return False, "wrong password"
+        try:
+            if not verify_password(staff_row["s_password"], password):
+                return False, "wrong password"
+        except TimeoutError:
+            return False, "System busy, please try again later"
+        if needs_rehash(staff_row["s_password"]):
+            _rehash(UPDATE_STAFF_PASSWORD, staff_row["s_id"], password)
         token = generate_token(staff_row["s_id"], "staff")
         return True, {"token": token, "role": "staff", "s_id": staff_row["s_id"], "s_name": staff_row["s_name"]}
     else:
@@ -61,8 +92,12 @@ def register_service(name: str, email: str, password: str):
     if not email.endswith("@ntu.edu.tw"):
         return False, "only ntu.edu.tw email is allowed"
     # 3. 新增會員
+    try:
+        pw_hash = hash_password(password)
+    except TimeoutError:
+        return False, "System busy, please try again later"
     new_member = Member(m_name=name, m_mail=email,
-                        m_password=generate_password_hash(password), is_active=True)
+                        m_password=pw_hash, is_active=True)
     db.session.add(new_member)
     try:
         db.session.commit()
@@ -1,139 +1,324 @@
 from sqlalchemy import text
 
+from app.services.eligibility import bump_eligibility_version
+from app.utils.prepared import prepared
+
+ROOT_CATEGORY = prepared("root_category", """
+    WITH RECURSIVE category_path AS (
+        -- 起始點：從給定的 category 開始
+        SELECT c_id, parent_c_id, c_id as root_c_id
+        FROM category
+        WHERE c_id = :c_id
+
+        UNION ALL
+
+        -- 遞迴向上查找父類別
+        SELECT c.c_id, c.parent_c_id,
+               CASE
+                   WHEN c.parent_c_id IS NULL THEN c.c_id
+                   ELSE cp.root_c_id
+               END as root_c_id
+        FROM category c
+        JOIN category_path cp ON c.c_id = cp.parent_c_id
+        WHERE cp.parent_c_id IS NOT NULL
+    )
+    SELECT root_c_id
+    FROM category_path
+    WHERE parent_c_id IS NULL
+    LIMIT 1
+""")
+
 
 def get_root_category(session, c_id: int) -> int:
     """
     找到 category 的 root category（最上層的父類別）。
     如果 category 本身沒有父類別，則返回自己。
     """
-    result = session.execute(text("""
-        WITH RECURSIVE category_path AS (
-            -- 起始點：從給定的 category 開始
-            SELECT c_id, parent_c_id, c_id as root_c_id
-            FROM category
-            WHERE c_id = :c_id
-            
-            UNION ALL
-            
-            -- 遞迴向上查找父類別
-            SELECT c.c_id, c.parent_c_id,
-                   CASE 
-                       WHEN c.parent_c_id IS NULL THEN c.c_id 
-                       ELSE cp.root_c_id 
-                   END as root_c_id
-            FROM category c
-            JOIN category_path cp ON c.c_id = cp.parent_c_id
-            WHERE cp.parent_c_id IS NOT NULL
-        )
-        SELECT root_c_id 
-        FROM category_path 
-        WHERE parent_c_id IS NULL
-        LIMIT 1
-    """), {"c_id": c_id}).scalar()
+    result = ROOT_CATEGORY.execute(session, {"c_id": c_id}).scalar()
 
     # 如果找不到（理論上不應該發生），返回原 c_id
     return result if result else c_id
 
 
+# 每個 category 對應的 root category（帳本檢查用；與 migrations/0012_member_root_credit.py 相同）
+_CATEGORY_ROOT_CTE = """
+    WITH RECURSIVE category_root AS (
+        SELECT c_id, c_id AS root_c_id FROM category WHERE parent_c_id IS NULL
+        UNION ALL
+        SELECT c.c_id, cr.root_c_id FROM category c JOIN category_root cr ON c.parent_c_id = cr.c_id
+    )
+"""
+
+LOCK_CREDIT = prepared("lock_credit", """
+    SELECT available_credits, used_credits
+    FROM member_root_credit
+    WHERE m_id = :m_id AND root_c_id = :root_c_id
+    FOR UPDATE
+""")
+
+ENSURE_CREDIT_ROWS = prepared("ensure_credit_rows", """
+    INSERT INTO member_root_credit (m_id, root_c_id)
+    SELECT * FROM unnest(CAST(:m_ids AS BIGINT[]), CAST(:root_c_ids AS BIGINT[]))
+    ON CONFLICT (m_id, root_c_id) DO NOTHING
+""")
+
+APPLY_CREDIT_DELTAS = prepared("apply_credit_deltas", """
+    UPDATE member_root_credit mrc
+    SET available_credits = mrc.available_credits + d.available,
+        used_credits = mrc.used_credits + d.used
+    FROM unnest(CAST(:m_ids AS BIGINT[]), CAST(:root_c_ids AS BIGINT[]),
+                CAST(:available AS INT[]), CAST(:used AS INT[])) AS d(m_id, root_c_id, available, used)
+    WHERE mrc.m_id = d.m_id AND mrc.root_c_id = d.root_c_id
+""")
+
+INSERT_CONTRIBUTION = prepared("insert_contribution", """
+    INSERT INTO contribution (m_id, i_id, is_active, root_c_id)
+    VALUES (:m_id, :i_id, :is_active, :root_c_id)
+""")
+
+SET_CONTRIBUTIONS_ACTIVE = prepared("set_contributions_active", """
+    UPDATE contribution
+    SET is_active = :is_active
+    WHERE i_id = ANY(:i_ids) AND is_active <> :is_active
+    RETURNING m_id, root_c_id, i_id
+""")
+
+MOVE_CONTRIBUTION = prepared("move_contribution", """
+    UPDATE contribution c
+    SET root_c_id = :root_c_id
+    FROM contribution old
+    WHERE c.m_id = old.m_id AND c.i_id = old.i_id
+    AND c.i_id = :i_id AND old.root_c_id IS DISTINCT FROM :root_c_id
+    RETURNING c.m_id, old.root_c_id AS old_root_c_id, c.is_active
+""")
+
+FIND_CONTRIBUTION = prepared("find_contribution", """
+    SELECT i_id
+    FROM contribution
+    WHERE m_id = :m_id AND root_c_id = :root_c_id AND is_active = :is_active
+    ORDER BY i_id
+    LIMIT 1
+""")
+
+OWNED_CONTRIBUTION_FOR_UPDATE = prepared("owned_contribution_for_update", """
+    SELECT i.i_id, i.c_id, c.is_active, c.root_c_id
+    FROM item i
+    JOIN contribution c ON i.i_id = c.i_id
+    WHERE i.i_id = :i_id AND i.m_id = :user_id
+    FOR UPDATE OF i, c
+""")
+
+SWAP_ACTIVE_CONTRIBUTION = prepared("swap_active_contribution", """
+    UPDATE contribution
+    SET is_active = (i_id = :i_id)
+    WHERE m_id = :m_id AND i_id IN (:old_i_id, :i_id)
+""")
+
+ROOT_MISMATCHES = prepared("root_mismatches", f"""
+    {_CATEGORY_ROOT_CTE}
+    SELECT c.m_id, c.i_id, c.root_c_id, cr.root_c_id AS expected_root_c_id
+    FROM contribution c
+    JOIN item i ON c.i_id = i.i_id
+    JOIN category_root cr ON i.c_id = cr.c_id
+    WHERE c.root_c_id IS DISTINCT FROM cr.root_c_id
+    ORDER BY c.m_id, c.i_id
+""")
+
+REPAIR_ROOTS = prepared("repair_roots", """
+    UPDATE contribution c
+    SET root_c_id = v.root_c_id
+    FROM unnest(CAST(:i_ids AS BIGINT[]), CAST(:root_c_ids AS BIGINT[])) AS v(i_id, root_c_id)
+    WHERE c.i_id = v.i_id
+""")
+
+CREDIT_MISMATCHES = prepared("credit_mismatches", f"""
+    {_CATEGORY_ROOT_CTE},
+    expected AS (
+        SELECT c.m_id, cr.root_c_id,
+               COUNT(*) FILTER (WHERE c.is_active) AS available_credits,
+               COUNT(*) FILTER (WHERE NOT c.is_active) AS used_credits
+        FROM contribution c
+        JOIN item i ON c.i_id = i.i_id
+        JOIN category_root cr ON i.c_id = cr.c_id
+        GROUP BY c.m_id, cr.root_c_id
+    )
+    SELECT COALESCE(e.m_id, mrc.m_id) AS m_id,
+           COALESCE(e.root_c_id, mrc.root_c_id) AS root_c_id,
+           COALESCE(e.available_credits, 0) AS expected_available,
+           COALESCE(e.used_credits, 0) AS expected_used,
+           COALESCE(mrc.available_credits, 0) AS available_credits,
+           COALESCE(mrc.used_credits, 0) AS used_credits
+    FROM expected e
+    FULL JOIN member_root_credit mrc ON e.m_id = mrc.m_id AND e.root_c_id = mrc.root_c_id
+    WHERE COALESCE(e.available_credits, 0) <> COALESCE(mrc.available_credits, 0)
+    OR COALESCE(e.used_credits, 0) <> COALESCE(mrc.used_credits, 0)
+    ORDER BY 1, 2
+""")
+
+REPAIR_CREDITS = prepared("repair_credits", """
+    INSERT INTO member_root_credit (m_id, root_c_id, available_credits, used_credits)
+    SELECT * FROM unnest(CAST(:m_ids AS BIGINT[]), CAST(:root_c_ids AS BIGINT[]),
+                         CAST(:available AS INT[]), CAST(:used AS INT[]))
+    ON CONFLICT (m_id, root_c_id) DO UPDATE
+    SET available_credits = EXCLUDED.available_credits, used_credits = EXCLUDED.used_credits
+""")
+
+
+def lock_credit(session, m_id: int, root_c_id: int):
+    """
+    以主鍵鎖定會員在 root category 下的額度列，回傳 (available_credits, used_credits)。
+    沒有資料列（該 root category 下沒有任何 contribution）時回傳 (0, 0)。
+    """
+    row = LOCK_CREDIT.execute(session, {"m_id": m_id, "root_c_id": root_c_id}).first()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def _apply_credit_deltas(session, deltas: dict):
+    """
+    deltas：{(m_id, root_c_id): (available_credits 增減, used_credits 增減)}。
+    依主鍵排序更新，多列同時更新時的鎖定順序固定。
+    """
+    keys = sorted(key for key, delta in deltas.items() if delta != (0, 0))
+    if not keys:
+        return
+    params = {
+        "m_ids": [m_id for m_id, _ in keys],
+        "root_c_ids": [root_c_id for _, root_c_id in keys],
+        "available": [deltas[key][0] for key in keys],
+        "used": [deltas[key][1] for key in keys],
+    }
+    ENSURE_CREDIT_ROWS.execute(session, params)
+    APPLY_CREDIT_DELTAS.execute(session, params)
+    bump_eligibility_version(session, params["m_ids"])
+
+
+def add_contribution(session, m_id: int, i_id: int, c_id: int, is_active: bool = False):
+    """
+    新增物品時呼叫：建立 contribution 並計入該 root category 的額度。
+    """
+    root_c_id = get_root_category(session, c_id)
+    INSERT_CONTRIBUTION.execute(session, {"m_id": m_id, "i_id": i_id, "is_active": is_active, "root_c_id": root_c_id})
+    _apply_credit_deltas(session, {(m_id, root_c_id): (1, 0) if is_active else (0, 1)})
+
+
+def set_contributions_active(session, i_ids: list, is_active: bool) -> list:
+    """
+    設定物品的 contribution 狀態並同步更新額度帳本；只有狀態真的改變的資料列會計入。
+    回傳狀態有改變的 i_id。
+    """
+    if not i_ids:
+        return []
+    rows = SET_CONTRIBUTIONS_ACTIVE.execute(session, {"i_ids": list(i_ids), "is_active": is_active}).mappings().all()
+    deltas = {}
+    for row in rows:
+        available, used = deltas.get((row["m_id"], row["root_c_id"]), (0, 0))
+        deltas[(row["m_id"], row["root_c_id"])] = (available + 1, used - 1) if is_active else (available - 1, used + 1)
+    _apply_credit_deltas(session, deltas)
+    return [row["i_id"] for row in rows]
+
+
+def move_contribution(session, i_id: int, c_id: int):
+    """
+    物品改類別後呼叫：contribution 與其額度移到新類別的 root category。
+    """
+    root_c_id = get_root_category(session, c_id)
+    row = MOVE_CONTRIBUTION.execute(session, {"i_id": i_id, "root_c_id": root_c_id}).mappings().first()
+    if not row:
+        return
+    delta = (1, 0) if row["is_active"] else (0, 1)
+    deltas = {(row["m_id"], root_c_id): delta}
+    if row["old_root_c_id"] is not None:
+        deltas[(row["m_id"], row["old_root_c_id"])] = (-delta[0], -delta[1])
+    _apply_credit_deltas(session, deltas)
+
+
+def _find_contribution(session, m_id: int, root_c_id: int, is_active: bool):
+    """
+    在 root category 下挑一筆指定狀態的 contribution（idx_contribution_m_id_root），沒有時回傳 None。
+    """
+    return FIND_CONTRIBUTION.execute(session, {"m_id": m_id, "root_c_id": root_c_id, "is_active": is_active}).scalar()
+
+
+def has_credit(session, m_id: int, root_c_id: int) -> bool:
+    """
+    借用資格：會員在 root category 下是否有 active 的 contribution。
+    鎖定額度列直到 transaction 結束，與同時進行的 contribution 變更互斥。
+    """
+    available, _ = lock_credit(session, m_id, root_c_id)
+    return available > 0
+
+
+def restore_credit(session, m_id: int, root_c_id: int) -> bool:
+    """
+    取消預約時呼叫：root category 下有 inactive 的 contribution 時啟用其中一筆。
+    """
+    _, used = lock_credit(session, m_id, root_c_id)
+    if not used:
+        return False
+    i_id = _find_contribution(session, m_id, root_c_id, False)
+    if i_id is None:
+        return False
+    return bool(set_contributions_active(session, [i_id], True))
+
+
 def change_contribution(session, m_id: int, i_id: int) -> bool:
     """
     處理更改貢獻。
     使用 root category 來檢查：只要在同一個 root category 下，就可以互用。
     """
-    # 1. 取得物品資訊並鎖定
-    item_original = session.execute(
-        text("""
-            SELECT i.i_id, i.i_name, i.status, i.description, i.out_duration, i.c_id, c.is_active
-            FROM item i
-            JOIN contribution c ON i.i_id = c.i_id
-            WHERE i.i_id = :i_id AND i.m_id = :user_id
-            FOR UPDATE OF i, c
-        """),
-        {"i_id": i_id, "user_id": m_id}
-    ).mappings().first()
+    # 1. 取得物品與 contribution 資訊並鎖定
+    item_original = OWNED_CONTRIBUTION_FOR_UPDATE.execute(
+        session, {"i_id": i_id, "user_id": m_id}).mappings().first()
 
     if not item_original:
-        print(1)
         return False
 
-    # 2. 檢查當前 contribution 的狀態
-    check_this_contribution = session.execute(text("""
-        SELECT is_active FROM contribution
-        WHERE m_id = :m_id AND i_id = :i_id
-        FOR UPDATE
-    """), {
-        "m_id": m_id,
-        "i_id": i_id
-    }).mappings().first()
-
-    if not check_this_contribution:
-        print(2)
+    # 2. 當前 contribution 已是 active 時不需更換
+    if item_original["is_active"]:
+        return True
+
+    # 3. 鎖定該 root category 的額度列，沒有 active 的 contribution 時無法更換
+    root_c_id = item_original["root_c_id"]
+    if not has_credit(session, m_id, root_c_id):
         return False
 
-    is_active = check_this_contribution["is_active"]
+    # 4. 將同一個 root category 下另一筆 active 的 contribution 設為 inactive，當前的設為 active（額度數量不變）
+    old_i_id = _find_contribution(session, m_id, root_c_id, True)
+    if old_i_id is None:
+        return False
+    SWAP_ACTIVE_CONTRIBUTION.execute(session, {"m_id": m_id, "i_id": i_id, "old_i_id": old_i_id})
 
-    # 3. 如果當前 contribution 是 inactive，直接設為 false 並返回
-    if is_active:
-        return True
+    return True
 
-    # 4. 如果當前 contribution 是 active，需要檢查 root category
-    # 找到物品的 root category
-    root_c_id = get_root_category(session, item_original["c_id"])
-
-    # 5. 檢查用戶在該 root category 及其所有子類別下是否有其他 active contribution
-    check_root_category_contribution = session.execute(
-        text("""
-            SELECT c.i_id
-            FROM contribution c
-            JOIN item ON c.i_id = item.i_id
-            WHERE c.m_id = :m_id
-            AND c.is_active = true
-            AND c.i_id != :current_i_id
-            AND item.c_id IN (
-                -- 找到 root category 下的所有子類別（包括 root 自己）
-                WITH RECURSIVE category_tree AS (
-                    -- 起始點：root category
-                    SELECT c_id FROM category WHERE c_id = :root_c_id
-
-                    UNION ALL
-
-                    -- 遞迴向下查找所有子類別
-                    SELECT c.c_id
-                    FROM category c
-                    JOIN category_tree ct ON c.parent_c_id = ct.c_id
-                )
-                SELECT c_id FROM category_tree
-            )
-            LIMIT 1
-            FOR UPDATE OF c
-        """),
-        {
-            "m_id": m_id,
-            "root_c_id": root_c_id,
-            "current_i_id": i_id
-        }
-    ).mappings().first()
 
-    # 6. 如果沒有找到其他 active contribution，無法啟用（需要至少一個 active）
-    if not check_root_category_contribution:
-        print(3)
-        return False
+def check_credit_ledger(session, repair: bool = False):
+    """
+    以 contribution 與物品目前的類別核對 contribution.root_c_id 與 member_root_credit。
+    repair=True 時以 contribution 為準修正（期間鎖住兩個表的寫入）；呼叫端負責 commit。
+    回傳 {"root_mismatches": [...], "credit_mismatches": [...]}。
+    """
+    if repair:
+        session.execute(text("LOCK TABLE contribution, member_root_credit IN SHARE ROW EXCLUSIVE MODE"))
 
-    # 7. 如果找到了，將舊的設為 inactive，將新的設為 active
-    session.execute(text("""
-        UPDATE contribution
-        SET is_active = false
-        WHERE i_id = :old_i_id
-    """), {
-        "old_i_id": check_root_category_contribution["i_id"]
-    })
-
-    session.execute(text("""
-        UPDATE contribution
-        SET is_active = true
-        WHERE i_id = :i_id
-    """), {
-        "i_id": i_id
-    })
+    root_mismatches = ROOT_MISMATCHES.execute(session).mappings().all()
+    root_mismatches = [dict(row) for row in root_mismatches]
 
-    return True
+    if repair and root_mismatches:
+        REPAIR_ROOTS.execute(session, {"i_ids": [row["i_id"] for row in root_mismatches],
+               "root_c_ids": [row["expected_root_c_id"] for row in root_mismatches]})
+
+    # 修正 root_c_id 後（或只檢查時以推導出的 root）彙總，與帳本比對
+    credit_mismatches = CREDIT_MISMATCHES.execute(session).mappings().all()
+    credit_mismatches = [dict(row) for row in credit_mismatches]
+
+    if repair and credit_mismatches:
+        params = {
+            "m_ids": [row["m_id"] for row in credit_mismatches],
+            "root_c_ids": [row["root_c_id"] for row in credit_mismatches],
+            "available": [row["expected_available"] for row in credit_mismatches],
+            "used": [row["expected_used"] for row in credit_mismatches],
+        }
+        REPAIR_CREDITS.execute(session, params)
+        bump_eligibility_version(session, params["m_ids"])
+
+    return {"root_mismatches": root_mismatches, "credit_mismatches": credit_mismatches}
@@ -0,0 +1,174 @@
+"""
+會員借用資格快照
+- 每位會員一份：被禁止的類別（展開成整棵子樹）與有 active contribution 的 root category，以 frozenset 保存
+- 每個 process 以 LRU 快取（ELIGIBILITY_CACHE_SIZE），每次使用前比對 member_eligibility_version（主鍵查詢）：
+  conclude_report 新增禁止、contribution 變更額度時在同一個 transaction 內遞增版本，其他 process 下次使用時就會重新載入
+- 類別樹（parent / 子類別 / 名稱）整個 process 共用，每 CATEGORY_TREE_REFRESH_SECONDS 秒重新載入；
+  類別樹重新載入後，舊的快照也會重新展開
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.utils.prepared import prepared
+
+MEMBER_ELIGIBILITY_VERSION = prepared("member_eligibility_version", """
+    SELECT version FROM member_eligibility_version WHERE m_id = :m_id
+""")
+
+MEMBER_BANS = prepared("member_bans", """
+    SELECT c_id FROM category_ban WHERE m_id = :m_id AND is_deleted = false
+""")
+
+MEMBER_CREDIT_ROOTS = prepared("member_credit_roots", """
+    SELECT root_c_id FROM member_root_credit WHERE m_id = :m_id AND available_credits > 0
+""")
+
+CATEGORY_TREE = prepared("category_tree", """
+    SELECT c_id, c_name, parent_c_id FROM category
+""")
+
+BUMP_ELIGIBILITY_VERSION = prepared("bump_eligibility_version", """
+    INSERT INTO member_eligibility_version (m_id, version)
+    SELECT m_id, 1 FROM unnest(CAST(:m_ids AS BIGINT[])) AS m_id
+    ON CONFLICT (m_id) DO UPDATE
+    SET version = member_eligibility_version.version + 1
+""")
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # m_id -> Eligibility
+_tree = None
+
+
+class CategoryTree:
+    def __init__(self, rows):
+        self.parent = {}
+        self.names = {}
+        self.children = {}
+        for c_id, c_name, parent_c_id in rows:
+            self.parent[c_id] = parent_c_id
+            self.names[c_id] = c_name
+            if parent_c_id is not None:
+                self.children.setdefault(parent_c_id, []).append(c_id)
+        self.loaded_at = time.monotonic()
+
+    def path(self, c_id: int) -> list:
+        """
+        從 root category 到 c_id 的路徑（包含兩端）。
+        """
+        path, seen = [], set()
+        while c_id is not None and c_id not in seen:
+            seen.add(c_id)
+            path.append(c_id)
+            c_id = self.parent.get(c_id)
+        return path[::-1]
+
+    def root_of(self, c_id: int) -> int:
+        """
+        c_id 的 root category；不在類別樹中時回傳 c_id（與 get_root_category 相同）。
+        """
+        return self.path(c_id)[0]
+
+    def subtree(self, c_ids) -> frozenset:
+        """
+        c_ids 與其所有子類別。
+        """
+        result, stack = set(), list(c_ids)
+        while stack:
+            c_id = stack.pop()
+            if c_id in result:
+                continue
+            result.add(c_id)
+            stack.extend(self.children.get(c_id, ()))
+        return frozenset(result)
+
+
+class Eligibility:
+    __slots__ = ("m_id", "version", "tree", "bans", "banned", "credit_roots")
+
+    def __init__(self, m_id: int, version: int, tree: CategoryTree, bans, credit_roots):
+        self.m_id = m_id
+        self.version = version
+        self.tree = tree
+        self.bans = frozenset(bans)
+        self.banned = tree.subtree(self.bans)
+        self.credit_roots = frozenset(credit_roots)
+
+    def ban_for(self, c_id: int):
+        """
+        禁止借用 c_id 的類別（c_id 自己或祖先，越接近 root 越優先）；沒有被禁止時回傳 None。
+        """
+        if c_id not in self.banned:
+            return None
+        return next((ancestor for ancestor in self.tree.path(c_id) if ancestor in self.bans), c_id)
+
+    def has_credit_for(self, c_id: int) -> bool:
+        return self.tree.root_of(c_id) in self.credit_roots
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "bans": [{"c_id": c_id, "c_name": self.tree.names.get(c_id)} for c_id in sorted(self.bans)],
+            "banned_c_ids": sorted(self.banned),
+            "credit_roots": [{"c_id": c_id, "c_name": self.tree.names.get(c_id)} for c_id in sorted(self.credit_roots)],
+        }
+
+
+def category_tree(session) -> CategoryTree:
+    global _tree
+    refresh = current_app.config.get("CATEGORY_TREE_REFRESH_SECONDS", 300)
+    tree = _tree
+    if tree is None or time.monotonic() - tree.loaded_at > refresh:
+        tree = CategoryTree(CATEGORY_TREE.execute(session).all())
+        _tree = tree
+    return tree
+
+
+def get_eligibility(session, m_id: int) -> Eligibility:
+    """
+    取得會員的資格快照；版本與快取相同時不需重新查詢禁止與額度。
+    先讀版本再讀資料：期間若有其他 transaction 遞增版本，快取的內容只會比版本新，下次使用時重新載入。
+    """
+    tree = category_tree(session)
+    version = MEMBER_ELIGIBILITY_VERSION.execute(session, {"m_id": m_id}).scalar() or 0
+    with _lock:
+        cached = _cache.get(m_id)
+        if cached is not None and cached.version == version and cached.tree is tree:
+            _cache.move_to_end(m_id)
+            return cached
+
+    bans = MEMBER_BANS.execute(session, {"m_id": m_id}).scalars().all()
+    credit_roots = MEMBER_CREDIT_ROOTS.execute(session, {"m_id": m_id}).scalars().all()
+    eligibility = Eligibility(m_id, version, tree, bans, credit_roots)
+
+    max_size = current_app.config.get("ELIGIBILITY_CACHE_SIZE", 10000)
+    if max_size > 0:
+        with _lock:
+            _cache[m_id] = eligibility
+            _cache.move_to_end(m_id)
+            while len(_cache) > max_size:
+                _cache.popitem(last=False)
+    return eligibility
+
+
+def bump_eligibility_version(session, m_ids):
+    """
+    會員的禁止或額度改變時，在同一個 transaction 內呼叫。
+    本 process 的快照直接移除；transaction rollback 時只是多重新載入一次。
+    """
+    m_ids = sorted(set(m_ids))
+    if not m_ids:
+        return
+    BUMP_ELIGIBILITY_VERSION.execute(session, {"m_ids": m_ids})
+    with _lock:
+        for m_id in m_ids:
+            _cache.pop(m_id, None)
+
+
+def clear_eligibility_cache():
+    global _tree
+    with _lock:
+        _cache.clear()
+        _tree = None
@@ -1,31 +1,29 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import text
 from app.extensions import db
 from app.utils.jwt_utils import get_user
 from app.models.item import Item
-from app.models.contribution import Contribution
 from app.models.report import Report
 from sqlalchemy.exc import OperationalError  # 用來抓取 Serialization Failure
 import time
-import random
 from app.models.item_verification import ItemVerification
-from app.services.contribution import change_contribution
+from app.services.contribution import (
+    add_contribution, change_contribution, move_contribution, set_contributions_active)
+from app.services.staff_assignment import assign_staff
+from app.services.reservation_service import MAX_RESERVATION_SPAN
 from app.models.item_pick import ItemPick
+from app.utils.replica import read_only
+from app.utils.prepared import prepared
 
 
-def pick_a_staff():
-    """
-    隨機選擇員工後回傳。
-    """
-    staff_row = db.session.execute(
-        text("""
-            SELECT s_id FROM staff
-            WHERE role = 'Employee' and is_deleted = false
-        """)).mappings().all()
-    random_staff = random.choice(staff_row)
-    return random_staff["s_id"]
+ITEM_DETAIL = prepared("item_detail", """
+    SELECT i_name, status, description, out_duration, c_id
+    FROM item
+    WHERE i_id = :i_id
+""")
 
 
+@read_only
 def get_item_detail(i_id: int):
     """
     處理取得物品詳細資訊請求。
@@ -34,18 +32,33 @@ def get_item_detail(i_id: int):
     取得物品詳細資訊後回傳。
     """
 
-    item_row = db.session.execute(
-        text("""
-            SELECT i_name, status, description, out_duration, c_id
-            FROM item
-            WHERE i_id = :i_id
-        """),
-        {"i_id": i_id}).mappings().first()
+    item_row = ITEM_DETAIL.execute(db.session, {"i_id": i_id}).mappings().first()
     if not item_row:
         return False, "Item not found"
     return True, {"item": dict(item_row)}
 
 
+CATEGORY_ITEMS = prepared("category_items", """
+    WITH RECURSIVE category_tree AS (
+        -- 起始點：給定的類別
+        SELECT c_id
+        FROM category
+        WHERE c_id = :c_id
+
+        UNION ALL
+
+        -- 遞迴向下查找所有子類別
+        SELECT c.c_id
+        FROM category c
+        INNER JOIN category_tree ct ON c.parent_c_id = ct.c_id
+    )
+    SELECT i.i_id, i.i_name, i.status, i.description, i.out_duration, i.c_id
+    FROM item i
+    INNER JOIN category_tree ct ON i.c_id = ct.c_id
+""")
+
+
+@read_only
 def get_category_items(c_id: int):
     """
     處理取得特定類別物品請求。
@@ -55,29 +68,85 @@ def get_category_items(c_id: int):
     取得該類別及其所有子類別下的物品後回傳。
     """
     # 使用 WITH RECURSIVE 遞迴查詢所有子類別（包括自己）
-    items_row = db.session.execute(
-        text("""
-            WITH RECURSIVE category_tree AS (
-                -- 起始點：給定的類別
-                SELECT c_id
-                FROM category
-                WHERE c_id = :c_id
-                
-                UNION ALL
-                
-                -- 遞迴向下查找所有子類別
-                SELECT c.c_id
-                FROM category c
-                INNER JOIN category_tree ct ON c.parent_c_id = ct.c_id
-            )
-            SELECT i.i_id, i.i_name, i.status, i.description, i.out_duration, i.c_id
-            FROM item i
-            INNER JOIN category_tree ct ON i.c_id = ct.c_id
-        """),
-        {"c_id": c_id}).mappings().all()
-
-    items_list = [dict(row) for row in items_row]
-    return True, {"items": items_list}
+    items_row = CATEGORY_ITEMS.execute(db.session, {"c_id": c_id}).mappings().all()
+
+    # RowMapping 直接交給 JSON provider 序列化
+    return True, {"items": items_row}
+
+
+ITEM_STATUSES = ("Borrowed", "Reservable", "Not reservable", "Not verified")
+
+SEARCH_ITEMS = prepared("search_items", """
+    WITH RECURSIVE category_tree AS (
+        SELECT c_id
+        FROM category
+        WHERE c_id = :c_id
+
+        UNION ALL
+
+        SELECT c.c_id
+        FROM category c
+        INNER JOIN category_tree ct ON c.parent_c_id = ct.c_id
+    ),
+    matched AS (
+        SELECT i.i_id, i.i_name, i.status, i.description, i.out_duration, i.c_id,
+               (ts_rank(to_tsvector('simple', i.i_name || ' ' || coalesce(i.description, '')),
+                        websearch_to_tsquery('simple', CAST(:keyword AS TEXT)))
+                + similarity(i.i_name, :keyword))::float8 AS rank
+        FROM item i
+        WHERE (to_tsvector('simple', i.i_name || ' ' || coalesce(i.description, ''))
+                   @@ websearch_to_tsquery('simple', :keyword)
+               OR i.i_name % :keyword
+               OR i.description % :keyword)
+        AND (CAST(:c_id AS BIGINT) IS NULL OR i.c_id IN (SELECT c_id FROM category_tree))
+        AND (CAST(:status AS VARCHAR) IS NULL OR i.status = :status)
+    )
+    SELECT i_id, i_name, status, description, out_duration, c_id, rank
+    FROM matched
+    WHERE CAST(:after_rank AS FLOAT8) IS NULL
+       OR (rank, i_id) < (:after_rank, :after_i_id)
+    ORDER BY rank DESC, i_id DESC
+    LIMIT :limit
+""")
+
+
+def search_items(keyword: str, c_id: int = None, status: str = None, limit: int = 20,
+                 after_rank: float = None, after_i_id: int = None):
+    """
+    處理搜尋物品請求。
+    以 tsvector 全文檢索（GIN expression index）加上 pg_trgm 模糊比對（容許錯字）搜尋
+    item.i_name 與 item.description，依相關度排序。
+
+    可選擇只搜尋某個類別（含所有子類別）與特定狀態，
+    分頁使用 keyset：以上一頁最後一筆的 (rank, i_id) 作為游標。
+    """
+    keyword = (keyword or "").strip()
+    if not keyword:
+        return False, "Keyword is required"
+    if status is not None and status not in ITEM_STATUSES:
+        return False, "Invalid status"
+    limit = max(1, min(limit, 100))
+
+    # 類別、狀態、游標條件都是選填，沒有給就讓條件恆真
+    items_row = SEARCH_ITEMS.execute(
+        db.session,
+        {"keyword": keyword, "c_id": c_id, "status": status, "after_rank": after_rank,
+         "after_i_id": after_i_id, "limit": limit + 1}).mappings().all()
+
+    items_list = [dict(row) for row in items_row[:limit]]
+    next_cursor = None
+    if len(items_row) > limit:
+        last = items_list[-1]
+        next_cursor = {"after_rank": last["rank"], "after_i_id": last["i_id"]}
+    return True, {"items": items_list, "next_cursor": next_cursor}
+
+
+ITEM_BORROWED_TIME = prepared("item_borrowed_time", """
+    SELECT est_start_at, est_due_at
+    FROM reservation_detail
+    join reservation r on reservation_detail.r_id = r.r_id
+    WHERE i_id = :i_id and est_due_at >= :today and est_start_at > :earliest_start and r.is_deleted = false
+""")
 
 
 def get_item_borrowed_time(i_id: int):
@@ -89,20 +158,191 @@ def get_item_borrowed_time(i_id: int):
     """
     today = datetime.now().date()
 
-    borrowed_time_row = db.session.execute(
-        text("""
-            SELECT est_start_at, est_due_at
-            FROM reservation_detail
-            join reservation r on reservation_detail.r_id = r.r_id
-            WHERE i_id = :i_id and (est_start_at >= :today or est_due_at >= :today) and r.is_deleted = false"""
-             ),
-        {"i_id": i_id, "today": today}).mappings().all()
-    if not borrowed_time_row:
-        return False, "No borrowed time"
+    # est_due_at >= today 的預約一定在 today - MAX_RESERVATION_SPAN 之後開始，只需掃描近期分區
+    borrowed_time_row = ITEM_BORROWED_TIME.execute(
+        db.session, {"i_id": i_id, "today": today, "earliest_start": today - MAX_RESERVATION_SPAN}).mappings().all()
     borrowed_time_list = [dict(row) for row in borrowed_time_row]
     return True, {"borrowed_time": borrowed_time_list}
 
 
+MAX_AVAILABILITY_ITEMS = 100
+MAX_AVAILABILITY_RANGE = timedelta(days=366)
+
+
+def parse_datetime(value):
+    """
+    將 ISO 8601 字串轉為 datetime（與 reservation_detail 的 TIMESTAMP 欄位一致，不帶時區）。
+    """
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def merge_intervals(intervals):
+    """
+    合併重疊或相接的 (start, end) 區間，回傳依開始時間排序的 [[start, end], ...]。
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+ITEMS_AVAILABILITY = prepared("items_availability", """
+    SELECT ids.i_id, i.out_duration, rd.est_start_at, rd.est_due_at
+    FROM unnest(CAST(:i_ids AS BIGINT[])) AS ids(i_id)
+    JOIN item i ON i.i_id = ids.i_id
+    LEFT JOIN LATERAL (
+        SELECT rd.est_start_at, rd.est_due_at
+        FROM reservation_detail rd
+        JOIN reservation r ON rd.r_id = r.r_id
+        WHERE rd.i_id = ids.i_id
+        AND r.is_deleted = false
+        AND rd.est_start_at > :earliest_start
+        AND tsrange(rd.est_start_at, rd.est_due_at)
+            && tsrange(CAST(:range_start AS TIMESTAMP), CAST(:range_end AS TIMESTAMP))
+    ) rd ON true
+    ORDER BY ids.i_id, rd.est_start_at
+""")
+
+
+def get_items_availability(i_ids: list, range_start: datetime, range_end: datetime):
+    """
+    處理取得多個物品可借時段請求。
+
+    以一次 unnest 查詢取得所有物品在 [range_start, range_end) 內的預約，
+    合併成 busy 區間後算出 free 區間；每個 free 區間附上可借的最長秒數（不超過 out_duration）。
+    """
+    i_ids = list(dict.fromkeys(i_ids))
+    if not i_ids:
+        return False, "At least one item is required"
+    if len(i_ids) > MAX_AVAILABILITY_ITEMS:
+        return False, f"At most {MAX_AVAILABILITY_ITEMS} items per request"
+    if range_end <= range_start:
+        return False, "end must be later than start"
+    if range_end - range_start > MAX_AVAILABILITY_RANGE:
+        return False, "Date range is too long"
+
+    rows = ITEMS_AVAILABILITY.execute(
+        db.session,
+        {"i_ids": i_ids, "range_start": range_start, "range_end": range_end,
+         "earliest_start": range_start - MAX_RESERVATION_SPAN}).mappings().all()
+
+    busy_by_item = {}
+    out_duration = {}
+    for row in rows:
+        out_duration[row["i_id"]] = row["out_duration"]
+        intervals = busy_by_item.setdefault(row["i_id"], [])
+        if row["est_start_at"] is not None:
+            intervals.append((max(row["est_start_at"], range_start),
+                              min(row["est_due_at"], range_end)))
+
+    availability = []
+    for i_id in i_ids:
+        if i_id not in busy_by_item:
+            continue  # 物品不存在
+        busy = merge_intervals(busy_by_item[i_id])
+        free = []
+        cursor = range_start
+        for start, end in busy:
+            if start > cursor:
+                free.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < range_end:
+            free.append((cursor, range_end))
+        availability.append({
+            "i_id": i_id,
+            "out_duration": out_duration[i_id],
+            "busy": [{"start": start, "end": end} for start, end in busy],
+            "free": [{
+                "start": start,
+                "end": end,
+                "max_borrow_seconds": min(int((end - start).total_seconds()), out_duration[i_id]),
+            } for start, end in free],
+        })
+    return True, {"start": range_start, "end": range_end, "availability": availability}
+
+
+AVAILABLE_ITEMS = prepared("available_items", """
+    WITH RECURSIVE category_tree AS (
+        SELECT c_id
+        FROM category
+        WHERE c_id = :c_id
+
+        UNION ALL
+
+        SELECT c.c_id
+        FROM category c
+        INNER JOIN category_tree ct ON c.parent_c_id = ct.c_id
+    )
+    SELECT i.i_id, i.i_name, i.status, i.description, i.out_duration, i.c_id
+    FROM item i
+    INNER JOIN category_tree ct ON i.c_id = ct.c_id
+    WHERE i.status IN ('Reservable', 'Borrowed')
+    AND i.out_duration >= :duration
+    AND (CAST(:after_i_id AS BIGINT) IS NULL OR i.i_id > :after_i_id)
+    AND (CAST(:p_id AS BIGINT) IS NULL OR EXISTS (
+        SELECT 1
+        FROM item_pick ip
+        JOIN pick_up_place pp ON ip.p_id = pp.p_id
+        WHERE ip.i_id = i.i_id AND ip.p_id = :p_id
+        AND ip.is_deleted = false AND pp.is_deleted = false
+    ))
+    AND NOT EXISTS (
+        SELECT 1
+        FROM reservation_detail rd
+        JOIN reservation r ON rd.r_id = r.r_id
+        WHERE rd.i_id = i.i_id
+        AND rd.est_start_at > :earliest_start
+        AND r.is_deleted = false
+        AND tsrange(rd.est_start_at, rd.est_due_at)
+            && tsrange(CAST(:range_start AS TIMESTAMP), CAST(:range_end AS TIMESTAMP))
+    )
+    ORDER BY i.i_id
+    LIMIT :limit
+""")
+
+
+def find_available_items(c_id: int, range_start: datetime, range_end: datetime, p_id: int = None,
+                         limit: int = 20, after_i_id: int = None):
+    """
+    處理查詢類別中某段時間可借物品請求。
+
+    一次查詢取得類別（含所有子類別）下，在 [range_start, range_end) 沒有任何未刪除預約、
+    out_duration 足夠、且可在 p_id 取貨（有給 p_id 時）的物品。
+    重疊檢查以 NOT EXISTS 反連結交給 reservation_detail 的 GiST range index，
+    分頁使用 keyset：以上一頁最後一筆的 i_id 作為游標。
+    """
+    if range_end <= range_start:
+        return False, "end must be later than start"
+    if range_end - range_start > MAX_AVAILABILITY_RANGE:
+        return False, "Date range is too long"
+    limit = max(1, min(limit, 100))
+
+    items_row = AVAILABLE_ITEMS.execute(
+        db.session,
+        {"c_id": c_id, "p_id": p_id, "range_start": range_start, "range_end": range_end,
+         "earliest_start": range_start - MAX_RESERVATION_SPAN,
+         "duration": int((range_end - range_start).total_seconds()),
+         "after_i_id": after_i_id, "limit": limit + 1}).mappings().all()
+
+    items_list = [dict(row) for row in items_row[:limit]]
+    next_cursor = None
+    if len(items_row) > limit:
+        next_cursor = {"after_i_id": items_list[-1]["i_id"]}
+    return True, {"items": items_list, "next_cursor": next_cursor}
+
+
 def upload_item(token: str, data: dict):
     """
     處理上傳新物品請求。
@@ -133,9 +373,7 @@ def upload_item(token: str, data: dict):
             item_pick_row = ItemPick(i_id=item_row.i_id, p_id=p_id)
             db.session.add(item_pick_row)
 
-        contribution_row = Contribution(
-            m_id=user_id, i_id=item_row.i_id, is_active=False)
-        db.session.add(contribution_row)
+        add_contribution(db.session, user_id, item_row.i_id, data["c_id"])
         db.session.commit()
         return True, {"item_id": item_row.i_id, "name": data["i_name"], "status": item_row.status}
     except Exception as e:
@@ -144,6 +382,71 @@ def upload_item(token: str, data: dict):
         return False, str(e)
 
 
+ITEM_OWNER = prepared("item_owner", """
+    SELECT m_id FROM item
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+ITEM_FOR_UPDATE = prepared("item_for_update", """
+    SELECT item.i_id, item.i_name, item.status, item.description, item.out_duration, item.c_id, contribution.is_active FROM item
+    join contribution on item.i_id = contribution.i_id
+    WHERE item.i_id = :i_id and item.m_id = :user_id
+    FOR UPDATE
+""")
+
+OWNED_ITEM = prepared("owned_item", """
+    SELECT i_id, i_name, status, description, out_duration, c_id
+    FROM item
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+UPDATE_ITEM_NAME = prepared("update_item_name", """
+    UPDATE item
+    SET i_name = :i_name
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+UPDATE_ITEM_STATUS = prepared("update_item_status", """
+    UPDATE item
+    SET status = :status
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+UPDATE_ITEM_DESCRIPTION = prepared("update_item_description", """
+    UPDATE item
+    SET description = :description
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+UPDATE_ITEM_OUT_DURATION = prepared("update_item_out_duration", """
+    UPDATE item
+    SET out_duration = :out_duration
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+UPDATE_ITEM_CATEGORY = prepared("update_item_category", """
+    UPDATE item
+    SET c_id = :c_id
+    WHERE i_id = :i_id and m_id = :user_id
+""")
+
+MEMBER_IS_BANNED = prepared("member_is_banned", """
+    SELECT is_banned FROM member
+    WHERE m_id = :user_id
+""")
+
+ITEM_PICKS = prepared("item_picks", """
+    SELECT p_id, is_deleted FROM item_pick
+    WHERE i_id = :i_id
+""")
+
+SET_ITEM_PICK_DELETED = prepared("set_item_pick_deleted", """
+    UPDATE item_pick
+    SET is_deleted = :is_deleted
+    WHERE i_id = :i_id and p_id = :p_id
+""")
+
+
 def update_item(token: str, i_id: int, data: dict):
     """
     處理更新物品請求。
@@ -164,25 +467,15 @@ def update_item(token: str, i_id: int, data: dict):
             # 2. 執行你的查詢 (拿掉 FOR UPDATE，讓 Serializable 幫你管)
             # 注意：這裡不需要再鎖 contribution 了，Serializable 會監控讀取依賴
 
-            check_owner = db.session.execute(
-                text("""
-                    SELECT m_id FROM item
-                    WHERE i_id = :i_id and m_id = :user_id
-                """),  # 移除了 FOR UPDATE
-                {"i_id": i_id, "user_id": user_id}).mappings().first()
+            check_owner = ITEM_OWNER.execute(  # 移除了 FOR UPDATE
+                db.session, {"i_id": i_id, "user_id": user_id}).mappings().first()
 
             if not check_owner:
                 db.session.rollback()
                 return False, "Item not found"
 
-            item_original = db.session.execute(
-                text("""
-                        SELECT item.i_id, item.i_name, item.status, item.description, item.out_duration, item.c_id, contribution.is_active FROM item
-                        join contribution on item.i_id = contribution.i_id
-                        WHERE item.i_id = :i_id and item.m_id = :user_id
-                        FOR UPDATE
-                    """),
-                {"i_id": i_id, "user_id": user_id}).mappings().first()
+            item_original = ITEM_FOR_UPDATE.execute(
+                db.session, {"i_id": i_id, "user_id": user_id}).mappings().first()
             if item_original["status"] == "Borrowed":
                 db.session.rollback()
                 return False, "Item is borrowed, cannot be edited"
@@ -192,14 +485,8 @@ def update_item(token: str, i_id: int, data: dict):
 
             if data.get("i_name"):  # update name
                 has_updates = True
-                db.session.execute(
-                    text("""
-                        UPDATE item
-                        SET i_name = :i_name
-                        WHERE i_id = :i_id and m_id = :user_id
-                        
-                    """),
-                    {"i_id": i_id, "user_id": user_id, "i_name": data["i_name"]})
+                UPDATE_ITEM_NAME.execute(
+                    db.session, {"i_id": i_id, "user_id": user_id, "i_name": data["i_name"]})
             # update status
             if item_original.get("status") != "Not verified" and data.get("status") and data["status"] != item_original["status"]:
                 if data["status"] == "Not reservable":
@@ -211,56 +498,25 @@ def update_item(token: str, i_id: int, data: dict):
                         if not ok:
                             db.session.rollback()
                             return False, "Cannot change contribution"
-                    db.session.execute(
-                        text("""
-                            UPDATE item
-                            SET status = :status
-                            WHERE i_id = :i_id and m_id = :user_id
-                        """),
-                        {"i_id": i_id, "user_id": user_id, "status": "Not reservable"})
+                    UPDATE_ITEM_STATUS.execute(
+                        db.session, {"i_id": i_id, "user_id": user_id, "status": "Not reservable"})
 
                 elif data["status"] == "Reservable":  # 他要重新上架的話需要重新認證
-                    db.session.execute(
-                        text("""
-                            UPDATE contribution
-                            SET is_active = False
-                            WHERE i_id = :i_id
-                        """),
-                        {"i_id": i_id})
-                    db.session.execute(
-                        text("""
-                            UPDATE item
-                            SET status = :status
-                            WHERE i_id = :i_id and m_id = :user_id
-                        """),
-                        {"i_id": i_id, "user_id": user_id, "status": "Not verified"})
-                    check_ban = db.session.execute(
-                        text("""
-                            SELECT is_banned FROM member
-                            WHERE m_id = :user_id
-                        """),
-                        {"user_id": user_id}).mappings().first()
+                    set_contributions_active(db.session, [i_id], False)
+                    UPDATE_ITEM_STATUS.execute(
+                        db.session, {"i_id": i_id, "user_id": user_id, "status": "Not verified"})
+                    check_ban = MEMBER_IS_BANNED.execute(db.session, {"user_id": user_id}).mappings().first()
                     if check_ban["is_banned"]:
                         db.session.rollback()
                         return False, "Member is banned"
             if data.get("description"):  # update description
                 has_updates = True
-                db.session.execute(
-                    text("""
-                        UPDATE item
-                        SET description = :description
-                        WHERE i_id = :i_id and m_id = :user_id
-                    """),
-                    {"i_id": i_id, "user_id": user_id, "description": data["description"]})
+                UPDATE_ITEM_DESCRIPTION.execute(
+                    db.session, {"i_id": i_id, "user_id": user_id, "description": data["description"]})
             if data.get("out_duration"):  # update out_duration
                 has_updates = True
-                db.session.execute(
-                    text("""
-                        UPDATE item
-                        SET out_duration = :out_duration
-                        WHERE i_id = :i_id and m_id = :user_id
-                    """),
-                    {"i_id": i_id, "user_id": user_id, "out_duration": data["out_duration"]})
+                UPDATE_ITEM_OUT_DURATION.execute(
+                    db.session, {"i_id": i_id, "user_id": user_id, "out_duration": data["out_duration"]})
             if data.get("c_id"):  # update c_id
                 has_updates = True
                 if item_original['status'] =="reservable":
@@ -268,22 +524,14 @@ def update_item(token: str, i_id: int, data: dict):
                     if not ok:
                         db.session.rollback()
                         return False, "Cannot change contribution"
-                db.session.execute(
-                    text("""
-                        UPDATE item
-                        SET c_id = :c_id
-                        WHERE i_id = :i_id and m_id = :user_id
-                    """),
-                    {"i_id": i_id, "user_id": user_id, "c_id": data["c_id"]})
+                UPDATE_ITEM_CATEGORY.execute(
+                    db.session, {"i_id": i_id, "user_id": user_id, "c_id": data["c_id"]})
+                # contribution 與額度移到新類別的 root category
+                move_contribution(db.session, i_id, data["c_id"])
             if data.get("p_id_list"):
                 has_updates = True
                 # 取得目前資料庫中該 item 的所有 pick records
-                existing_picks = db.session.execute(
-                    text("""
-                        SELECT p_id, is_deleted FROM item_pick
-                        WHERE i_id = :i_id
-                    """),
-                    {"i_id": i_id}).mappings().all()
+                existing_picks = ITEM_PICKS.execute(db.session, {"i_id": i_id}).mappings().all()
                 existing_p_ids = {
                     pick["p_id"]: pick for pick in existing_picks}
                 new_p_id_list = data["p_id_list"]
@@ -293,13 +541,8 @@ def update_item(token: str, i_id: int, data: dict):
                     if p_id in existing_p_ids:
                         # 如果本來就有，且目前是不活躍 (is_active=False)，則設為 True
                         if not existing_p_ids[p_id]["is_deleted"]:
-                            db.session.execute(
-                                text("""
-                                    UPDATE item_pick
-                                    SET is_deleted = False
-                                    WHERE i_id = :i_id and p_id = :p_id
-                                """),
-                                {"i_id": i_id, "p_id": p_id})
+                            SET_ITEM_PICK_DELETED.execute(
+                                db.session, {"i_id": i_id, "p_id": p_id, "is_deleted": False})
                     else:
                         # 如果本來沒有，則新增
                         new_pick = ItemPick(
@@ -309,40 +552,18 @@ def update_item(token: str, i_id: int, data: dict):
                 # 檢查是否有被移除的 p_id (在資料庫中有，但在新清單中沒有)
                 for p_id, pick in existing_p_ids.items():
                     if p_id not in new_p_id_list:
-                        db.session.execute(
-                            text("""
-                                UPDATE item_pick
-                                SET is_deleted = True
-                                WHERE i_id = :i_id and p_id = :p_id
-                            """),
-                            {"i_id": i_id, "p_id": p_id})
+                        SET_ITEM_PICK_DELETED.execute(
+                            db.session, {"i_id": i_id, "p_id": p_id, "is_deleted": True})
 
             # 如果物品狀態是 "Not reservable" 且用戶進行了任何更新，則改回 "Not verified" 並重置審核狀態
             if item_original["status"] == "Not reservable" and has_updates:
                 # 將 contribution 的 is_active 設為 False（需要重新審核）
-                db.session.execute(
-                    text("""
-                        UPDATE contribution
-                        SET is_active = False
-                        WHERE i_id = :i_id
-                    """),
-                    {"i_id": i_id})
+                set_contributions_active(db.session, [i_id], False)
                 # 將狀態改回 "Not verified"
-                db.session.execute(
-                    text("""
-                        UPDATE item
-                        SET status = 'Not verified'
-                        WHERE i_id = :i_id and m_id = :user_id
-                    """),
-                    {"i_id": i_id, "user_id": user_id})
-
-            item_row = db.session.execute(
-                text("""
-                    SELECT i_id, i_name, status, description, out_duration, c_id
-                    FROM item
-                    WHERE i_id = :i_id and m_id = :user_id
-                """),
-                {"i_id": i_id, "user_id": user_id}).mappings().first()
+                UPDATE_ITEM_STATUS.execute(
+                    db.session, {"i_id": i_id, "user_id": user_id, "status": "Not verified"})
+
+            item_row = OWNED_ITEM.execute(db.session, {"i_id": i_id, "user_id": user_id}).mappings().first()
             db.session.commit()
             item_row = dict(item_row)
             return True, {"item": item_row}
@@ -371,10 +592,11 @@ def report_item(token: str, i_id: int, data: dict):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        staff_id = pick_a_staff()
-        if not staff_id:
-            return False, "No staff available"
         try:
+            staff_id = assign_staff(db.session, "report")
+            if not staff_id:
+                db.session.rollback()
+                return False, "No staff available"
             report_row = Report(m_id=user_id, i_id=i_id, r_conclusion="Pending",
                                 comment=data["comment"], create_at=datetime.now(), s_id=staff_id)
             db.session.add(report_row)
@@ -396,18 +618,14 @@ def verify_item(token: str, i_id: int):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        check_user = db.session.execute(
-            text("""
-                SELECT m_id FROM item
-                WHERE i_id = :i_id and m_id = :user_id
-            """),
-            {"i_id": i_id, "user_id": user_id}).mappings().first()
+        check_user = ITEM_OWNER.execute(db.session, {"i_id": i_id, "user_id": user_id}).mappings().first()
         if not check_user:
             return False, "Item not found"
-        staff_id = pick_a_staff()
-        if not staff_id:
-            return False, "No staff available"
         try:
+            staff_id = assign_staff(db.session, "verification")
+            if not staff_id:
+                db.session.rollback()
+                return False, "No staff available"
             item_verification_row = ItemVerification(
                 i_id=i_id, s_id=staff_id, create_at=datetime.now(), v_conclusion="Pending")
             db.session.add(item_verification_row)
@@ -418,27 +636,29 @@ def verify_item(token: str, i_id: int):
             return False, str(e)
 
 
+ROOT_CATEGORIES = prepared("root_categories", """
+    SELECT c_id, c_name
+    FROM category
+    WHERE parent_c_id is NULL
+""")
+
+SUBCATEGORIES = prepared("subcategories", """
+    SELECT c_id, c_name
+    FROM category
+    WHERE parent_c_id = :c_id
+""")
+
+
+@read_only
 def get_subcategory(c_id: int):
     """
     處理取得特定子類別物品請求。
     """
     if c_id == 0:
-        items_row = db.session.execute(
-            text("""
-                SELECT c_id, c_name
-                FROM category
-                WHERE parent_c_id is NULL
-            """),
-            {"c_id": c_id}).mappings().all()
+        items_row = ROOT_CATEGORIES.execute(db.session).mappings().all()
         # 轉換為字典列表
         return [dict(row) for row in items_row]
     else:
-        items_row = db.session.execute(
-            text("""
-                SELECT c_id, c_name
-                FROM category
-                WHERE parent_c_id = :c_id
-            """),
-            {"c_id": c_id}).mappings().all()
+        items_row = SUBCATEGORIES.execute(db.session, {"c_id": c_id}).mappings().all()
         # 轉換為字典列表
         return [dict(row) for row in items_row]
@@ -0,0 +1,112 @@
+"""
+loan_event 紀錄
+- loan_event 的主鍵是 (timestamp, l_id)；timestamp 由每筆 loan 的 hybrid logical clock 產生：
+  GREATEST(現在毫秒, loan.last_event_ts + 1)，在 loan 的 row lock 下遞增，
+  同一筆 loan 在同一毫秒內的多個事件也不會撞號，且仍接近實際時間
+- 狀態轉換（Handover: Scheduled -> Out，Return: Out / Overdue -> Returned）、物主檢查、
+  loan 更新與事件寫入在同一個集合式語句內完成，不符合的項目不會有任何寫入
+- 成功的事件在同一個 transaction 內寫入 outbox
+"""
+from datetime import datetime
+
+from app.services import outbox
+from app.services.owner_read_model import remove_upcoming_loans
+from app.utils.prepared import prepared
+
+# event_type -> (允許的目前狀態, 轉換後狀態)
+TRANSITIONS = {
+    "Handover": (("Scheduled",), "Out"),
+    "Return": (("Out", "Overdue"), "Returned"),
+}
+
+_ALLOWED_VALUES = ", ".join(
+    f"('{event_type}', '{from_status}', '{to_status}')"
+    for event_type, (from_statuses, to_status) in TRANSITIONS.items()
+    for from_status in from_statuses)
+
+
+RECORD_LOAN_EVENTS = prepared("record_loan_events", f"""
+    WITH req AS (
+        SELECT *
+        FROM unnest(CAST(:l_ids AS BIGINT[]), CAST(:event_types AS VARCHAR[])) AS req(l_id, event_type)
+    ),
+    allowed AS (
+        SELECT * FROM (VALUES {_ALLOWED_VALUES}) AS allowed(event_type, from_status, to_status)
+    ),
+    applied AS (
+        UPDATE loan l
+        SET status = a.to_status,
+            last_event_ts = GREATEST(:now_ms, l.last_event_ts + 1),
+            actual_start_at = CASE WHEN req.event_type = 'Handover' THEN :now ELSE l.actual_start_at END,
+            actual_return_at = CASE WHEN req.event_type = 'Return' THEN :now ELSE l.actual_return_at END
+        FROM req, allowed a, reservation_detail rd, item i
+        WHERE l.l_id = req.l_id
+        AND a.event_type = req.event_type
+        AND a.from_status = l.status
+        AND rd.rd_id = l.rd_id AND rd.est_start_at = l.est_start_at
+        AND i.i_id = rd.i_id
+        AND i.m_id = :owner_m_id
+        RETURNING l.l_id, req.event_type, l.last_event_ts
+    ),
+    inserted AS (
+        INSERT INTO loan_event (timestamp, event_type, l_id)
+        SELECT last_event_ts, event_type, l_id FROM applied
+        RETURNING l_id, timestamp
+    )
+    -- loan 讀到的是語句開始前的狀態，用來說明失敗原因
+    SELECT req.l_id, req.event_type, ins.timestamp, l.status AS previous_status, i.m_id AS item_owner
+    FROM req
+    LEFT JOIN inserted ins ON ins.l_id = req.l_id
+    LEFT JOIN loan l ON l.l_id = req.l_id
+    LEFT JOIN reservation_detail rd ON rd.rd_id = l.rd_id AND rd.est_start_at = l.est_start_at
+    LEFT JOIN item i ON i.i_id = rd.i_id
+""")
+
+
+def now_ms() -> int:
+    return int(datetime.now().timestamp() * 1000)
+
+
+def record_loan_events(session, owner_m_id: int, events: list):
+    """
+    為 owner_m_id 擁有的物品記錄一批 (l_id, event_type)，不 commit。
+    同一個 l_id 只能出現一次。回傳 [{"l_id", "event_type", "ok", "message", "timestamp"}]，順序與輸入相同。
+    """
+    if not events:
+        return []
+    now = datetime.now()
+    rows = RECORD_LOAN_EVENTS.execute(session, {
+        "l_ids": [l_id for l_id, _ in events],
+        "event_types": [event_type for _, event_type in events],
+        "owner_m_id": owner_m_id,
+        "now_ms": now_ms(),
+        "now": now,
+    }).mappings().all()
+    by_id = {row["l_id"]: row for row in rows}
+
+    results = []
+    returned = []
+    for l_id, event_type in events:
+        row = by_id[l_id]
+        if row["timestamp"] is not None:
+            results.append({"l_id": l_id, "event_type": event_type, "ok": True,
+                            "message": "OK", "timestamp": row["timestamp"]})
+            if event_type == "Return":
+                returned.append(l_id)
+            continue
+        if row["previous_status"] is None:
+            message = "Loan not found"
+        elif row["item_owner"] != owner_m_id:
+            message = "Unauthorized"
+        else:
+            message = f"Cannot {event_type} a loan in status {row['previous_status']}"
+        results.append({"l_id": l_id, "event_type": event_type, "ok": False,
+                        "message": message, "timestamp": None})
+    remove_upcoming_loans(session, returned)
+    # loan_event 的主鍵 (timestamp, l_id) 就是事件的唯一識別
+    outbox.enqueue_many(session, [
+        outbox.event("loan", result["l_id"], result["event_type"],
+                     {"l_id": result["l_id"], "timestamp": result["timestamp"], "owner_m_id": owner_m_id},
+                     dedup_key=f"loan_event:{result['l_id']}:{result['timestamp']}")
+        for result in results if result["ok"]])
+    return results
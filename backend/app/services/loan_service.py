@@ -2,6 +2,31 @@ from app.extensions import db
 from sqlalchemy import text
 from app.models.reservation_detail import ReservationDetail
 from datetime import datetime, timedelta
+import time
+from app.services import outbox
+from app.services.owner_read_model import add_upcoming_loans_for_details
+from app.services.loan_events import now_ms
+from app.services.reservation_service import MAX_RESERVATION_SPAN
+from app.utils.prepared import prepared
+
+
+PENDING_DETAILS = prepared("pending_loan_details", """
+    SELECT rd.rd_id, rd.est_start_at, rd.est_due_at
+    FROM reservation_detail rd
+    JOIN reservation r ON rd.r_id = r.r_id
+    LEFT JOIN loan l ON rd.rd_id = l.rd_id AND l.est_start_at = rd.est_start_at
+    WHERE r.is_deleted = false
+    AND l.l_id IS NULL
+    AND rd.est_start_at <= :target_time
+    AND rd.est_start_at > :earliest_start
+""")
+
+# actual_start_at / actual_return_at 在實際交付、歸還時才寫入
+INSERT_SCHEDULED_LOANS = prepared("insert_scheduled_loans", """
+    INSERT INTO loan (rd_id, est_start_at, actual_start_at, actual_return_at, is_deleted, status)
+    SELECT d.rd_id, d.est_start_at, NULL, NULL, false, 'Scheduled'
+    FROM unnest(CAST(:rd_ids AS BIGINT[]), CAST(:est_start_ats AS TIMESTAMP[])) AS d(rd_id, est_start_at)
+""")
 
 
 def create_loan_for_upcoming_reservations(hours_ahead: int = 24):
@@ -20,45 +45,110 @@ def create_loan_for_upcoming_reservations(hours_ahead: int = 24):
 
         # 先鎖定 loan 表以計算 ID
         # 找出需要建立 loan 的 rd_id
-        pending_details = db.session.execute(text("""
-            SELECT rd.rd_id, rd.est_start_at, rd.est_due_at
-            FROM reservation_detail rd
-            JOIN reservation r ON rd.r_id = r.r_id
-            LEFT JOIN loan l ON rd.rd_id = l.rd_id
-            WHERE r.is_deleted = false
-            AND l.l_id IS NULL
-            AND rd.est_start_at <= :target_time
-        """), {"target_time": target_time}).mappings().all()
+        pending_details = PENDING_DETAILS.execute(db.session, {
+            "target_time": target_time,
+            "earliest_start": datetime.now() - MAX_RESERVATION_SPAN}).mappings().all()
 
         if not pending_details:
             return 0
 
-        # 批量插入 Loan
-        values = []
-        for idx, detail in enumerate(pending_details):
-            # 注意：actual_start_at 和 actual_due_at 初始值設為 est 值，或者設為 null (視 schema 限制)
-            # Schema 定義 loan 的 actual_start_at/due_at 是 NOT NULL
-            # 所以這裡我們暫時填入 est 的時間作為預設，等到實際 Handover 時再更新 (或是 schema 設計上這兩個欄位應該要是 nullable?)
-            # 假設這兩個欄位代表「實際發生」的時間，那在建立揀貨單時填入 est 時間當作「預計」是合理的，或者應該修 schema 改成 nullable
-            # 根據現有 schema NOT NULL constraint，我們先填入 est 時間
-
-            values.append({
-                "rd_id": detail["rd_id"],
-                "actual_start_at": None,  # 暫填
-                "actual_return_at": None,     # 暫填
-                "is_deleted": False
-            })
-
-        if values:
-            db.session.execute(text("""
-                INSERT INTO loan (rd_id, actual_start_at, actual_return_at, is_deleted)
-                VALUES (:rd_id, :actual_start_at, :actual_return_at, :is_deleted)
-            """), values)
+        # 以一個語句批量插入 Loan
+        rd_ids = [detail["rd_id"] for detail in pending_details]
+        INSERT_SCHEDULED_LOANS.execute(db.session, {
+            "rd_ids": rd_ids,
+            "est_start_ats": [detail["est_start_at"] for detail in pending_details]})
+        add_upcoming_loans_for_details(db.session, rd_ids)
 
         db.session.commit()
-        return len(values)
+        return len(rd_ids)
 
     except Exception as e:
         db.session.rollback()
         print(f"Error creating loans: {e}")
         return 0
+
+
+# 逾期標記排程的 advisory lock，避免多個排程同時執行
+OVERDUE_JOB_LOCK_ID = 743_000_101
+
+TRY_OVERDUE_JOB_LOCK = prepared("try_overdue_job_lock", """
+    SELECT pg_try_advisory_xact_lock(:lock_id)
+""")
+
+MARK_OVERDUE = prepared("mark_overdue_loans", """
+    WITH overdue AS (
+        UPDATE loan
+        SET status = 'Overdue', last_event_ts = GREATEST(:timestamp, last_event_ts + 1)
+        WHERE l_id IN (
+            SELECT l.l_id
+            FROM loan l
+            JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+            WHERE l.status = 'Out'
+            AND rd.est_due_at < :now
+            ORDER BY rd.est_due_at
+            LIMIT :batch_size
+            FOR UPDATE OF l SKIP LOCKED
+        )
+        RETURNING l_id, last_event_ts
+    ),
+    events AS (
+        INSERT INTO loan_event (timestamp, event_type, l_id)
+        SELECT last_event_ts, 'Mark_overdue', l_id
+        FROM overdue
+        RETURNING timestamp, l_id
+    )
+    SELECT e.l_id, e.timestamp, i.m_id AS owner_m_id
+    FROM events e
+    JOIN loan l ON l.l_id = e.l_id
+    JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    JOIN item i ON rd.i_id = i.i_id
+""")
+
+RECORD_OVERDUE_JOB_RUN = prepared("record_overdue_job_run", """
+    INSERT INTO overdue_job_runs (started_at, finished_at, marked_count, batch_count, duration_ms)
+    VALUES (:started_at, :finished_at, :marked_count, :batch_count, :duration_ms)
+""")
+
+
+def mark_overdue_loans(batch_size: int = 1000):
+    """
+    批次標記逾期借用（排程工作，見 flask mark-overdue）。
+
+    候選只來自 status = 'Out' 的 loan（idx_loan_out partial index），
+    每批以一個語句把已過 est_due_at 的 loan 改為 Overdue 並寫入 Mark_overdue 事件；
+    已標記的 loan 離開 Out，下次不會再被掃描，因此成本隨進行中的借用數量成長，而不是整個 loan 歷史。
+    回傳本次執行的統計，並寫入 overdue_job_runs。
+    """
+    started_at = datetime.now()
+    started = time.perf_counter()
+    marked = 0
+    batches = 0
+    while True:
+        locked = TRY_OVERDUE_JOB_LOCK.execute(db.session, {"lock_id": OVERDUE_JOB_LOCK_ID}).scalar()
+        if not locked:
+            db.session.rollback()
+            return {"skipped": True, "message": "Another overdue job is running"}
+        rows = MARK_OVERDUE.execute(db.session, {"timestamp": now_ms(), "now": datetime.now(),
+                                                 "batch_size": batch_size}).mappings().all()
+        # 與 record_loan_events 相同的事件格式，在同一個 transaction 內寫入 outbox
+        outbox.enqueue_many(db.session, [
+            outbox.event("loan", row["l_id"], "Mark_overdue",
+                         {"l_id": row["l_id"], "timestamp": row["timestamp"], "owner_m_id": row["owner_m_id"]},
+                         dedup_key=f"loan_event:{row['l_id']}:{row['timestamp']}")
+            for row in rows])
+        db.session.commit()
+        batches += 1
+        marked += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    stats = {
+        "started_at": started_at,
+        "finished_at": datetime.now(),
+        "marked_count": marked,
+        "batch_count": batches,
+        "duration_ms": int((time.perf_counter() - started) * 1000),
+    }
+    RECORD_OVERDUE_JOB_RUN.execute(db.session, stats)
+    db.session.commit()
+    return stats
@@ -1,10 +1,50 @@
-from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from app.extensions import db
 from app.utils.jwt_utils import get_user
 from app.models.review import Review
-
-
+from app.services.archive_service import source
+from app.services.eligibility import get_eligibility
+from app.utils.replica import read_only
+from app.utils.prepared import prepared
+
+
+# 評分包含已封存的借用與評論（*_all view）
+MEMBER_PROFILE = prepared("member_profile", """
+    with owner_rate as(
+        SELECT i.m_id, AVG(rv.score) as owner_rate
+        FROM review_all rv
+        join loan_all l on rv.l_id = l.l_id
+        join reservation_detail_all rd on l.rd_id = rd.rd_id and l.est_start_at = rd.est_start_at
+        join item i on rd.i_id = i.i_id
+        WHERE rv.reviewee_id = :m_id AND i.m_id = :m_id AND rv.is_deleted = false
+        group by i.m_id
+    ),
+    borrower_rate as(
+        SELECT r.m_id, AVG(rv.score) as borrower_rate
+        FROM review_all rv
+        join loan_all l on rv.l_id = l.l_id
+        join reservation_detail_all rd on l.rd_id = rd.rd_id and l.est_start_at = rd.est_start_at
+        join reservation_all r on rd.r_id = r.r_id
+        WHERE rv.reviewee_id = :m_id AND r.m_id = :m_id AND rv.is_deleted = false
+        group by r.m_id
+    )
+    SELECT m.m_name, m.m_mail,
+           owner_rate.owner_rate,
+           borrower_rate.borrower_rate
+    FROM member m
+    LEFT JOIN owner_rate on m.m_id = owner_rate.m_id
+    LEFT JOIN borrower_rate on m.m_id = borrower_rate.m_id
+    WHERE m.m_id = :m_id
+""")
+
+STAFF_PROFILE = prepared("staff_profile", """
+    SELECT s_name, s_mail
+    FROM staff
+    WHERE s_id = :s_id
+""")
+
+
+@read_only
 def get_profile_service(token: str):
     """
     處理取得使用者 profile 請求。
@@ -17,35 +57,7 @@ def get_profile_service(token: str):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        member_row = db.session.execute(
-            text("""
-                with owner_rate as(
-                    SELECT i.m_id, AVG(rv.score) as owner_rate
-                    FROM review rv
-                    join loan l on rv.l_id = l.l_id
-                    join reservation_detail rd on l.rd_id = rd.rd_id
-                    join item i on rd.i_id = i.i_id
-                    WHERE rv.reviewee_id = :m_id AND i.m_id = :m_id AND rv.is_deleted = false
-                    group by i.m_id
-                ),
-                borrower_rate as(
-                    SELECT r.m_id, AVG(rv.score) as borrower_rate
-                    FROM review rv
-                    join loan l on rv.l_id = l.l_id
-                    join reservation_detail rd on l.rd_id = rd.rd_id
-                    join reservation r on rd.r_id = r.r_id
-                    WHERE rv.reviewee_id = :m_id AND r.m_id = :m_id AND rv.is_deleted = false
-                    group by r.m_id
-                )
-                SELECT m.m_name, m.m_mail, 
-                       owner_rate.owner_rate, 
-                       borrower_rate.borrower_rate
-                FROM member m
-                LEFT JOIN owner_rate on m.m_id = owner_rate.m_id
-                LEFT JOIN borrower_rate on m.m_id = borrower_rate.m_id
-                WHERE m.m_id = :m_id
-            """),
-            {"m_id": user_id}).mappings().first()
+        member_row = MEMBER_PROFILE.execute(db.session, {"m_id": user_id}).mappings().first()
 
         if not member_row:
             return False, "Member not found"
@@ -64,17 +76,18 @@ def get_profile_service(token: str):
             "borrower_rate": borrower_rate
         }
     elif active_role == "staff":
-        staff_row = db.session.execute(
-            text("""
-                SELECT s_name, s_mail
-                FROM staff
-                WHERE s_id = :s_id
-            """),
-            {"s_id": user_id}).mappings().first()
+        staff_row = STAFF_PROFILE.execute(db.session, {"s_id": user_id}).mappings().first()
         staff_dict = dict(staff_row)
         return True, {"name": staff_dict["s_name"], "email": staff_dict["s_mail"]}
 
 
+MY_ITEMS = prepared("my_items", """
+    SELECT i_id, i_name, status, description, out_duration, c_id
+    FROM item
+    WHERE m_id = :m_id
+""")
+
+
 def get_my_items(token: str):
     """
     處理取得使用者物品請求。
@@ -87,13 +100,7 @@ def get_my_items(token: str):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        items_row = db.session.execute(
-            text("""
-                SELECT i_id, i_name, status, description, out_duration, c_id
-                FROM item
-                WHERE m_id = :m_id
-            """),
-            {"m_id": user_id}).mappings().all()
+        items_row = MY_ITEMS.execute(db.session, {"m_id": user_id}).mappings().all()
         # 轉換為字典列表
         items_list = [dict(row) for row in items_row]
         return True, {"items": items_list}
@@ -101,6 +108,14 @@ def get_my_items(token: str):
         return False, "Only members can get items"
 
 
+RESERVATION_ITEM_NAMES = prepared("reservation_item_names", """
+    SELECT i_name
+    FROM reservation_detail
+    join item on reservation_detail.i_id = item.i_id
+    WHERE reservation_detail.r_id = :r_id
+""")
+
+
 def find_items(r_id: int):
     """
     處理取得預約物品請求。
@@ -108,20 +123,24 @@ def find_items(r_id: int):
     接收預約 ID，
     取得預約物品後回傳。
     """
-    items_row = db.session.execute(
-        text("""
-            SELECT i_name
-            FROM reservation_detail
-            join item on reservation_detail.i_id = item.i_id
-            WHERE reservation_detail.r_id = :r_id
-        """),
-        {"r_id": r_id}).mappings().all()
+    items_row = RESERVATION_ITEM_NAMES.execute(db.session, {"r_id": r_id}).mappings().all()
     item_list = []
     for item in items_row:
         item_list.append(item["i_name"])
     return item_list
 
 
+MY_RESERVATIONS = prepared("my_reservations", """
+    SELECT r.r_id, r.create_at
+    FROM reservation r
+    join reservation_detail rd on r.r_id = rd.r_id
+    left join loan l on rd.rd_id = l.rd_id and l.est_start_at = rd.est_start_at
+    WHERE r.m_id = :m_id and (l.l_id is null or l.status <> 'Returned')
+    and r.is_deleted = false
+    order by r.create_at desc
+""")
+
+
 def get_my_reservations(token: str):
     """
     處理取得使用者預約請求。
@@ -134,17 +153,7 @@ def get_my_reservations(token: str):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        reservations_row = db.session.execute(
-            text("""
-                SELECT r.r_id, r.create_at
-                FROM reservation r
-                join reservation_detail rd on r.r_id = rd.r_id
-                left join loan l on rd.rd_id = l.rd_id
-                WHERE r.m_id = :m_id and l.actual_return_at is null
-                and r.is_deleted = false
-                order by r.create_at desc
-            """),
-            {"m_id": user_id}).mappings().all()
+        reservations_row = MY_RESERVATIONS.execute(db.session, {"m_id": user_id}).mappings().all()
         # 轉換為字典列表
         reservations_list = [dict(row) for row in reservations_row]
         for reservation in reservations_list:
@@ -154,30 +163,36 @@ def get_my_reservations(token: str):
         return False, "Only members can get reservations"
 
 
-def get_reservation_detail(token: str, r_id: int):
+# include_archived -> 預約明細查詢（是否包含封存資料的兩種版本各登記一次）
+RESERVATION_DETAILS = {
+    include_archived: prepared(f"reservation_details{'_all' if include_archived else ''}", f"""
+        SELECT rd.est_start_at, rd.est_due_at, i.i_name, p.p_name
+        FROM {source("reservation_detail", include_archived)} rd
+        join item i on rd.i_id = i.i_id
+        join {source("reservation", include_archived)} r on rd.r_id = r.r_id
+        join {source("pick_up_place", include_archived)} p on rd.p_id = p.p_id
+        WHERE rd.r_id = :r_id and r.m_id = :m_id
+        and r.is_deleted = false
+        order by est_start_at asc
+    """)
+    for include_archived in (False, True)
+}
+
+
+def get_reservation_detail(token: str, r_id: int, include_archived: bool = False):
     """
     處理取得使用者預約詳細資訊請求。
 
     接收 JWT Token 和預約 ID，
-    取得使用者預約詳細資訊後回傳。
+    取得使用者預約詳細資訊後回傳；include_archived 時也查詢已封存的預約。
     """
 
     member_id, active_role = get_user(token)
     if not member_id:
         return False, "Unauthorized"
     if active_role == "member":
-        reservation_detail_row = db.session.execute(
-            text("""
-                SELECT rd.est_start_at, rd.est_due_at, i.i_name, p.p_name
-                FROM reservation_detail rd
-                join item i on rd.i_id = i.i_id
-                join reservation r on rd.r_id = r.r_id
-                join pick_up_place p on rd.p_id = p.p_id
-                WHERE rd.r_id = :r_id and r.m_id = :m_id
-                and r.is_deleted = false
-                order by est_start_at asc
-            """),
-            {"r_id": r_id, "m_id": member_id}).mappings().all()
+        reservation_detail_row = RESERVATION_DETAILS[bool(include_archived)].execute(
+            db.session, {"r_id": r_id, "m_id": member_id}).mappings().all()
         # 轉換為字典列表
         details_list = [dict(row) for row in reservation_detail_row]
         return True, {"reservation_details": details_list}
@@ -185,6 +200,38 @@ def get_reservation_detail(token: str, r_id: int):
         return False, "Only members can get reservation detail"
 
 
+REVIEWABLE_ITEMS = prepared("reviewable_items", """
+    SELECT
+        CASE
+            WHEN r.m_id = :m_id THEN 'owner'
+            ELSE 'borrower'
+        END AS review_target,
+        l.l_id,
+        i.i_id,
+        i.i_name,
+        CASE
+            WHEN r.m_id = :m_id THEN owner.m_name
+            ELSE borrower.m_name
+        END AS object_name,
+        l.actual_return_at
+    FROM loan l
+    JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    JOIN reservation r ON rd.r_id = r.r_id
+    JOIN item i ON rd.i_id = i.i_id
+    JOIN member borrower ON r.m_id = borrower.m_id
+    JOIN member owner ON i.m_id = owner.m_id
+    WHERE
+        l.status = 'Returned'
+        AND (r.m_id = :m_id OR i.m_id = :m_id)
+        AND NOT EXISTS (
+            SELECT 1
+            FROM review rv
+            WHERE rv.l_id = l.l_id
+            AND rv.reviewer_id = :m_id
+        )
+""")
+
+
 def get_reviewable_items(token: str):
     """
     處理取得使用者可評論的物品請求。
@@ -197,45 +244,32 @@ def get_reviewable_items(token: str):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        reviewable_items_row = db.session.execute(
-            text("""
-                SELECT 
-                CASE 
-                        WHEN r.m_id = :m_id THEN "owner" 
-                        ELSE "borrower" 
-                    END AS review_target,
-                    l.l_id,
-                    i.i_id,
-                    i.i_name,
-                    CASE 
-                        WHEN r.m_id = :m_id THEN owner.m_name 
-                        ELSE borrower.m_name 
-                    END AS object_name,
-                    l.actual_return_at
-                FROM loan l
-                JOIN reservation_detail rd ON l.rd_id = rd.rd_id
-                JOIN reservation r ON rd.r_id = r.r_id
-                JOIN item i ON rd.i_id = i.i_id
-                JOIN member borrower ON r.m_id = borrower.m_id
-                JOIN member owner ON i.m_id = owner.m_id
-                WHERE 
-                    l.actual_return_at IS NOT NULL
-                    AND (r.m_id = :m_id OR i.m_id = :m_id)
-                    AND NOT EXISTS (
-                        SELECT 1 
-                        FROM review rv 
-                        WHERE rv.l_id = l.l_id 
-                        AND rv.reviewer_id = :m_id
-                    )
-            """),
-            {"m_id": user_id}).mappings().all()
-        # 轉換為字典列表
-        reviewable_items_list = [dict(row) for row in reviewable_items_row]
-        return True, {"reviewable_items": reviewable_items_list}
+        reviewable_items_row = REVIEWABLE_ITEMS.execute(db.session, {"m_id": user_id}).mappings().all()
+        # RowMapping 直接交給 JSON provider 序列化
+        return True, {"reviewable_items": reviewable_items_row}
     else:
         return False, "Only members can get reviewable items"
 
 
+LOAN_REVIEW_INFO = prepared("loan_review_info", """
+    SELECT
+        r.m_id AS borrower_id,
+        i.m_id AS owner_id,
+        l.actual_return_at,
+        l.status
+    FROM loan l
+    JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    JOIN reservation r ON rd.r_id = r.r_id
+    JOIN item i ON rd.i_id = i.i_id
+    WHERE l.l_id = :l_id
+""")
+
+EXISTING_REVIEW = prepared("existing_review", """
+    SELECT 1 FROM review r
+    WHERE l_id = :l_id AND reviewer_id = :reviewer_id
+""")
+
+
 def review_item(token: str, l_id: int, data: dict):
     """
     處理評論物品請求。
@@ -252,24 +286,11 @@ def review_item(token: str, l_id: int, data: dict):
         return False, "Only members can review items"
     try:
         # 1. 查詢 Loan 資訊，確認使用者是否有權評論，並找出 reviewee_id
-        loan_info = db.session.execute(
-            text("""
-            SELECT 
-                r.m_id AS borrower_id,
-                i.m_id AS owner_id,
-                l.actual_return_at
-            FROM loan l
-            JOIN reservation_detail rd ON l.rd_id = rd.rd_id
-            JOIN reservation r ON rd.r_id = r.r_id
-            JOIN item i ON rd.i_id = i.i_id
-            WHERE l.l_id = :l_id
-        """),
-            {"l_id": l_id}
-        ).mappings().first()
+        loan_info = LOAN_REVIEW_INFO.execute(db.session, {"l_id": l_id}).mappings().first()
         if not loan_info:
             return False, "Loan not found"
 
-        if not loan_info["actual_return_at"]:
+        if loan_info["status"] != "Returned":
             return False, "Item has not been returned yet"
 
         borrower_id = loan_info["borrower_id"]
@@ -284,13 +305,7 @@ def review_item(token: str, l_id: int, data: dict):
             return False, "You are not related to this loan"
 
         # 3. 檢查是否已經評論過 (防止重複評論)
-        existing_review = db.session.execute(
-            text("""
-                SELECT 1 FROM review r
-                WHERE l_id = :l_id AND reviewer_id = :reviewer_id
-            """),
-            {"l_id": l_id, "reviewer_id": user_id}
-        ).first()
+        existing_review = EXISTING_REVIEW.execute(db.session, {"l_id": l_id, "reviewer_id": user_id}).first()
 
         if existing_review:
             return False, "You have already reviewed this loan"
@@ -314,6 +329,22 @@ def review_item(token: str, l_id: int, data: dict):
         return False, str(e)
 
 
+MY_CONTRIBUTIONS = prepared("my_contributions", """
+    SELECT item.i_id, item.i_name, contribution.is_active, category.c_id, category.c_name
+    FROM contribution
+    join item on contribution.i_id = item.i_id
+    join category on item.c_id = category.c_id
+    WHERE contribution.m_id = :m_id
+""")
+
+MY_BANS = prepared("my_bans", """
+    SELECT category_ban.c_id, category.c_name
+    FROM category_ban
+    join category on category_ban.c_id = category.c_id
+    WHERE m_id = :m_id and category_ban.is_deleted = false
+""")
+
+
 def get_contributions_and_bans(token: str):
     """
     處理取得使用者貢獻請求。
@@ -325,26 +356,25 @@ def get_contributions_and_bans(token: str):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "member":
-        contributions_row = db.session.execute(
-            text("""
-                SELECT item.i_id, item.i_name, contribution.is_active, category.c_id, category.c_name
-                FROM contribution
-                join item on contribution.i_id = item.i_id
-                join category on item.c_id = category.c_id
-                WHERE contribution.m_id = :m_id
-            """),
-            {"m_id": user_id}).mappings().all()
-        bans_row = db.session.execute(
-            text("""
-                SELECT category_ban.c_id, category.c_name
-                FROM category_ban
-                join category on category_ban.c_id = category.c_id
-                WHERE m_id = :m_id
-            """),
-            {"m_id": user_id}).mappings().all()
+        contributions_row = MY_CONTRIBUTIONS.execute(db.session, {"m_id": user_id}).mappings().all()
+        bans_row = MY_BANS.execute(db.session, {"m_id": user_id}).mappings().all()
         # 轉換為字典列表
         contributions_list = [dict(row) for row in contributions_row]
         bans_list = [dict(row) for row in bans_row]
         return True, {"contributions": contributions_list, "bans": bans_list}
     else:
         return False, "Only members can get contributions and bans"
+
+
+def get_my_eligibility(token: str):
+    """
+    處理取得使用者借用資格請求。
+
+    接收 JWT Token，回傳被禁止的類別（含展開後的子類別）與有 active contribution 的 root category。
+    """
+    user_id, active_role = get_user(token)
+    if not user_id:
+        return False, "Unauthorized"
+    if active_role == "member":
+        return True, get_eligibility(db.session, user_id).to_dict()
+    return False, "Only members can get eligibility"
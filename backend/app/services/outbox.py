@@ -0,0 +1,227 @@
+"""
+Transactional outbox
+- enqueue(session, ...)：在預約 / 借用 / 檢舉資料的 transaction 內寫入 outbox，不 commit；
+  transaction rollback（或 serialization failure 重試）時事件一起消失，不會送出沒有發生的事
+- record(...)：沒有資料變更可以一起寫入時（例如預約失敗，業務 transaction 已 rollback），以獨立的 transaction 寫入
+- 每個事件有 dedup_key（同一個領域事件重複寫入時 ON CONFLICT DO NOTHING），接收端以此去重
+- relay_outbox(sink)：以 FOR UPDATE SKIP LOCKED 分批取出尚未送出的事件，sink 成功後才標記 published_at（at-least-once）；
+  多個 relay 可同時執行，各自取得不同批次；整批失敗時逐筆重送，只有失敗的事件計入 attempts；
+  失敗 max_attempts 次的事件不再重送，留待人工處理
+- 帶 funnel 的事件會附上 request 的 X-Session-ID、endpoint、m_id，sink 依此寫回漏斗追蹤的 user_sessions
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, g, has_request_context, request
+
+from app.extensions import db
+from app.utils.json_provider import dumps_bytes
+from app.utils.prepared import prepared
+
+
+ENQUEUE_EVENTS = prepared("enqueue_outbox_events", """
+    INSERT INTO outbox (dedup_key, aggregate_type, aggregate_id, event_type, payload)
+    SELECT dedup_key, aggregate_type, aggregate_id, event_type, CAST(payload AS JSONB)
+    FROM unnest(CAST(:dedup_keys AS VARCHAR[]), CAST(:aggregate_types AS VARCHAR[]),
+                CAST(:aggregate_ids AS BIGINT[]), CAST(:event_types AS VARCHAR[]), CAST(:payloads AS TEXT[]))
+         AS e(dedup_key, aggregate_type, aggregate_id, event_type, payload)
+    ON CONFLICT (dedup_key) DO NOTHING
+""")
+
+PENDING_EVENTS = prepared("pending_outbox_events", """
+    SELECT event_id, dedup_key, aggregate_type, aggregate_id, event_type, payload, created_at
+    FROM outbox
+    WHERE published_at IS NULL AND attempts < :max_attempts
+    ORDER BY event_id
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+""")
+
+MARK_PUBLISHED = prepared("mark_outbox_published", """
+    UPDATE outbox SET published_at = :now, attempts = attempts + 1, last_error = NULL
+    WHERE event_id = ANY(:event_ids)
+""")
+
+MARK_FAILED = prepared("mark_outbox_failed", """
+    UPDATE outbox SET attempts = attempts + 1, last_error = :error
+    WHERE event_id = ANY(:event_ids)
+""")
+
+PRUNE_EVENTS = prepared("prune_outbox_events", """
+    DELETE FROM outbox
+    WHERE event_id IN (
+        SELECT event_id FROM outbox
+        WHERE published_at IS NOT NULL AND published_at < :cutoff
+        LIMIT :batch_size
+    )
+""")
+
+OUTBOX_STATUS = prepared("outbox_status", """
+    SELECT COUNT(*) FILTER (WHERE attempts < :max_attempts) AS pending,
+           COUNT(*) FILTER (WHERE attempts >= :max_attempts) AS dead,
+           MIN(created_at) FILTER (WHERE attempts < :max_attempts) AS oldest_pending_at
+    FROM outbox
+    WHERE published_at IS NULL
+""")
+
+
+def _funnel_context(funnel: dict):
+    context = {"event": funnel, "session_id": None, "endpoint": None, "m_id": None}
+    if has_request_context():
+        # 與 log_event 相同：沒有 X-Session-ID 時視為新的 session
+        context.update(session_id=request.headers.get("X-Session-ID") or str(uuid.uuid4()),
+                       endpoint=request.path, m_id=g.get("user_id"))
+    else:
+        context["session_id"] = str(uuid.uuid4())
+    return context
+
+
+def event(aggregate_type: str, aggregate_id, event_type: str, data: dict,
+          dedup_key: str = None, funnel: dict = None) -> dict:
+    """
+    建立一個待寫入的事件。
+    dedup_key：同一個領域事件的唯一識別（例如 "reservation_created:123"），未指定時每次呼叫都是新事件。
+    funnel：要寫回漏斗追蹤的事件欄位（event_type、success、error_reason 與其他資訊）。
+    """
+    payload = {"data": data, "occurred_at": datetime.now(timezone.utc)}
+    if funnel is not None:
+        payload["funnel"] = _funnel_context(funnel)
+    return {
+        "dedup_key": dedup_key or f"{event_type}:{uuid.uuid4()}",
+        "aggregate_type": aggregate_type,
+        "aggregate_id": aggregate_id,
+        "event_type": event_type,
+        "payload": dumps_bytes(payload).decode(),
+    }
+
+
+def enqueue_many(session, events: list):
+    """
+    以一個語句寫入多個 event()（不 commit）；dedup_key 已存在的事件略過。
+    """
+    if not events:
+        return
+    ENQUEUE_EVENTS.execute(session, {
+        "dedup_keys": [e["dedup_key"] for e in events],
+        "aggregate_types": [e["aggregate_type"] for e in events],
+        "aggregate_ids": [e["aggregate_id"] for e in events],
+        "event_types": [e["event_type"] for e in events],
+        "payloads": [e["payload"] for e in events],
+    })
+
+
+def enqueue(session, aggregate_type: str, aggregate_id, event_type: str, data: dict,
+            dedup_key: str = None, funnel: dict = None):
+    """
+    在目前的 transaction 內寫入一個事件（不 commit），參數同 event()。
+    """
+    enqueue_many(session, [event(aggregate_type, aggregate_id, event_type, data, dedup_key, funnel)])
+
+
+def record(aggregate_type: str, aggregate_id, event_type: str, data: dict,
+           dedup_key: str = None, funnel: dict = None):
+    """
+    以獨立的 transaction 寫入事件；失敗時只記錄 log，不影響主要業務邏輯。
+    """
+    try:
+        enqueue(db.session, aggregate_type, aggregate_id, event_type, data, dedup_key, funnel)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"寫入 outbox 失敗: {e}")
+
+
+def _mark_published(event_ids: list):
+    MARK_PUBLISHED.execute(db.session, {"event_ids": event_ids, "now": datetime.now()})
+
+
+def _mark_failed(event_ids: list, error: Exception):
+    MARK_FAILED.execute(db.session, {"event_ids": event_ids, "error": str(error)[:1000]})
+
+
+def _error_summary(error: Exception) -> str:
+    return str(error).splitlines()[0] if str(error) else type(error).__name__
+
+
+def relay_outbox(sink, batch_size: int = 500, max_attempts: int = 10, max_batches: int = None):
+    """
+    把尚未送出的事件依 event_id 順序分批送到 sink（sink.publish(events)，失敗時 raise）。
+    某一批失敗時改為逐筆重送，只有失敗的事件 attempts + 1，其餘照常送出；
+    整批都失敗（例如 sink 無法連線）時停止本次執行，下次再重送。回傳統計。
+    """
+    started = time.perf_counter()
+    stats = {"published": 0, "failed": 0, "batches": 0}
+    while max_batches is None or stats["batches"] < max_batches:
+        rows = PENDING_EVENTS.execute(db.session, {"batch_size": batch_size, "max_attempts": max_attempts}).mappings().all()
+        if not rows:
+            db.session.rollback()
+            break
+        stats["batches"] += 1
+        events = [dict(row) for row in rows]
+        try:
+            sink.publish(events)
+        except Exception as e:
+            stats["error"] = _error_summary(e)
+            # 逐筆重送，避免一筆格式錯誤的事件拖住同一批的其他事件
+            published = []
+            for row in events:
+                try:
+                    sink.publish([row])
+                except Exception as event_error:
+                    _mark_failed([row["event_id"]], event_error)
+                    stats["failed"] += 1
+                    stats["error"] = _error_summary(event_error)
+                else:
+                    published.append(row["event_id"])
+            if published:
+                _mark_published(published)
+            db.session.commit()
+            stats["published"] += len(published)
+            if not published:
+                break
+        else:
+            _mark_published([row["event_id"] for row in rows])
+            db.session.commit()
+            stats["published"] += len(rows)
+        if len(rows) < batch_size:
+            break
+    stats["duration_ms"] = int((time.perf_counter() - started) * 1000)
+    return stats
+
+
+def prune_outbox(retention_days: int, batch_size: int = 5000):
+    """
+    分批刪除送出超過 retention_days 天的事件，回傳刪除筆數。
+    """
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        count = PRUNE_EVENTS.execute(db.session, {"cutoff": cutoff, "batch_size": batch_size}).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def outbox_status(max_attempts: int = 10):
+    row = OUTBOX_STATUS.execute(db.session, {"max_attempts": max_attempts}).mappings().first()
+    db.session.rollback()
+    return dict(row)
+
+
+class JsonlSink:
+    """
+    把事件逐行附加到 JSON Lines 檔案（交給其他系統讀取，或在沒有 MongoDB 時使用）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, "ab") as f:
+            for row in events:
+                f.write(dumps_bytes(row) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
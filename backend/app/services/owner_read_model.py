@@ -0,0 +1,57 @@
+from app.utils.prepared import prepared
+
+# owner_upcoming_loans 的來源查詢：尚未歸還的 loan 與其 owner / 借用者資訊
+# （完整重建由 setreadmodel.sql 負責）
+_SOURCE_SELECT = """
+    SELECT l.l_id, i.m_id, i.i_id, r.r_id, m.m_name, rd.est_start_at, rd.est_due_at
+    FROM loan l
+    JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    JOIN reservation r ON rd.r_id = r.r_id
+    JOIN item i ON rd.i_id = i.i_id
+    JOIN member m ON r.m_id = m.m_id
+    WHERE r.is_deleted = false AND l.status <> 'Returned'
+"""
+
+ADD_UPCOMING_LOANS = prepared("add_upcoming_loans", f"""
+    INSERT INTO owner_upcoming_loans
+        (l_id, owner_m_id, i_id, r_id, borrower_name, est_start_at, est_due_at)
+    {_SOURCE_SELECT}
+    AND l.rd_id = ANY(:rd_ids)
+    ON CONFLICT (l_id) DO NOTHING
+""")
+
+REMOVE_UPCOMING_LOANS = prepared("remove_upcoming_loans", """
+    DELETE FROM owner_upcoming_loans WHERE l_id = ANY(:l_ids)
+""")
+
+REMOVE_UPCOMING_LOANS_FOR_RESERVATIONS = prepared("remove_upcoming_loans_for_reservations", """
+    DELETE FROM owner_upcoming_loans WHERE r_id = ANY(:r_ids)
+""")
+
+
+def add_upcoming_loans_for_details(session, rd_ids: list):
+    """
+    新建 loan 後呼叫：將這些 reservation_detail 對應的 loan 寫入 read model。
+    """
+    if not rd_ids:
+        return
+    ADD_UPCOMING_LOANS.execute(session, {"rd_ids": list(rd_ids)})
+
+
+def remove_upcoming_loans(session, l_ids: list):
+    """
+    批次歸還後呼叫：從 read model 移除多筆 loan。
+    """
+    if not l_ids:
+        return
+    REMOVE_UPCOMING_LOANS.execute(session, {"l_ids": list(l_ids)})
+
+
+def remove_upcoming_loans_for_reservations(session, r_ids: list):
+    """
+    預約被取消（is_deleted = true）後呼叫：移除該預約底下所有 loan。
+    """
+    if not r_ids:
+        return
+    REMOVE_UPCOMING_LOANS_FOR_RESERVATIONS.execute(session, {"r_ids": list(r_ids)})
+
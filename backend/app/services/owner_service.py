@@ -1,9 +1,17 @@
 from app.extensions import db
-from sqlalchemy import text
 from app.utils.jwt_utils import get_user
-from app.models.loan_event import LoanEvent
 from datetime import datetime
 from app.services.loan_service import create_loan_for_upcoming_reservations
+from app.services.loan_events import TRANSITIONS, record_loan_events
+from app.utils.prepared import prepared
+
+
+OWNER_UPCOMING_LOANS = prepared("owner_future_reservation_details", """
+    SELECT l_id, i_id, borrower_name AS m_name, est_start_at, est_due_at
+    FROM owner_upcoming_loans
+    WHERE owner_m_id = :m_id
+    order by est_start_at asc, l_id asc
+""")
 
 
 def get_future_reservation_details(token: str):
@@ -18,21 +26,98 @@ def get_future_reservation_details(token: str):
         # Lazy Trigger: 在查詢前先嘗試建立即將到期的 Loan
         create_loan_for_upcoming_reservations(hours_ahead=24)
 
-        result = db.session.execute(text("""
-            SELECT l.l_id, i.i_id, m.m_name, rd.est_start_at, rd.est_due_at
-            FROM reservation_detail rd
-            join reservation r on rd.r_id = r.r_id
-            join loan l on rd.rd_id = l.rd_id
-            join item i on rd.i_id = i.i_id
-            join member m on r.m_id = m.m_id
-            WHERE i.m_id = :m_id and r.is_deleted = false and l.actual_return_at is null
-            order by rd.est_start_at asc
-        """), {"m_id": m_id}).mappings().all()
+        # 讀 owner_upcoming_loans read model，(owner_m_id, est_start_at) 一次 index range scan
+        result = OWNER_UPCOMING_LOANS.execute(db.session, {"m_id": m_id}).mappings().all()
         result_list = [dict(row) for row in result]
         return True, {"result": result_list}
     return False, "Unauthorized"
 
 
+UPCOMING_LOANS_AFTER = prepared("upcoming_loans_after", """
+    SELECT l_id, i_id, borrower_name AS m_name, est_start_at, est_due_at
+    FROM owner_upcoming_loans
+    WHERE owner_m_id = :m_id
+    AND (est_start_at, l_id) > (:after_start_at, :after_l_id)
+    ORDER BY est_start_at ASC, l_id ASC
+    LIMIT :limit
+""")
+
+UPCOMING_LOANS_FIRST_PAGE = prepared("upcoming_loans_first_page", """
+    SELECT l_id, i_id, borrower_name AS m_name, est_start_at, est_due_at
+    FROM owner_upcoming_loans
+    WHERE owner_m_id = :m_id
+    ORDER BY est_start_at ASC, l_id ASC
+    LIMIT :limit
+""")
+
+
+def get_upcoming_loans(token: str, limit: int = 20, after_start_at: datetime = None, after_l_id: int = None):
+    """
+    處理取得未歸還借用（分頁）請求。
+    使用 keyset pagination：以上一頁最後一筆的 (est_start_at, l_id) 作為游標。
+    """
+    m_id, active_role = get_user(token)
+    if not m_id:
+        return False, "Unauthorized"
+    if active_role != "member":
+        return False, "Unauthorized"
+
+    limit = max(1, min(limit, 100))
+    if after_start_at is not None and after_l_id is not None:
+        rows = UPCOMING_LOANS_AFTER.execute(db.session, {"m_id": m_id, "after_start_at": after_start_at,
+                                                         "after_l_id": after_l_id, "limit": limit + 1}).mappings().all()
+    else:
+        create_loan_for_upcoming_reservations(hours_ahead=24)
+        rows = UPCOMING_LOANS_FIRST_PAGE.execute(db.session, {"m_id": m_id, "limit": limit + 1}).mappings().all()
+
+    loans = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = loans[-1]
+        next_cursor = {"after_start_at": last["est_start_at"].isoformat(), "after_l_id": last["l_id"]}
+    return True, {"loans": loans, "next_cursor": next_cursor}
+
+
+OVERDUE_LOANS = prepared("owner_overdue_loans", """
+    SELECT u.l_id, u.i_id, u.borrower_name AS m_name, u.est_start_at, u.est_due_at,
+           to_timestamp(le.timestamp / 1000.0)::timestamp AS marked_overdue_at
+    FROM owner_upcoming_loans u
+    JOIN loan l ON l.l_id = u.l_id AND l.status = 'Overdue'
+    JOIN loan_event le ON le.l_id = u.l_id AND le.event_type = 'Mark_overdue'
+    WHERE u.owner_m_id = :m_id
+    AND (CAST(:after_due_at AS TIMESTAMP) IS NULL OR (u.est_due_at, u.l_id) > (:after_due_at, :after_l_id))
+    ORDER BY u.est_due_at ASC, u.l_id ASC
+    LIMIT :limit
+""")
+
+
+def get_overdue_loans(token: str, limit: int = 20, after_due_at: datetime = None, after_l_id: int = None):
+    """
+    處理取得逾期借用（分頁）請求。
+    列出已被排程標記 Mark_overdue 且尚未歸還的 loan，依 est_due_at 排序，
+    使用 keyset pagination：以上一頁最後一筆的 (est_due_at, l_id) 作為游標。
+    """
+    m_id, active_role = get_user(token)
+    if not m_id:
+        return False, "Unauthorized"
+    if active_role != "member":
+        return False, "Unauthorized"
+
+    limit = max(1, min(limit, 100))
+    rows = OVERDUE_LOANS.execute(db.session, {"m_id": m_id, "after_due_at": after_due_at, "after_l_id": after_l_id,
+                                              "limit": limit + 1}).mappings().all()
+
+    loans = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = loans[-1]
+        next_cursor = {"after_due_at": last["est_due_at"].isoformat(), "after_l_id": last["l_id"]}
+    return True, {"loans": loans, "next_cursor": next_cursor}
+
+
+MAX_PUNCH_BATCH_SIZE = 500
+
+
 def punch_in_loan(token: str, l_id: int, data: dict):
     """
     處理打卡請求。
@@ -41,35 +126,58 @@ def punch_in_loan(token: str, l_id: int, data: dict):
     if not m_id:
         return False, "Unauthorized"
     if active_role == "member":
+        if data.get("event_type") not in TRANSITIONS:
+            return False, "Invalid event type"
         try:
-            db.session.execute(
-                text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
-
-            # 使用更高精度的 timestamp (毫秒級) 避免衝突
-            timestamp_ms = int(datetime.now().timestamp() * 1000)
-
-            loan_event = LoanEvent(
-                timestamp=timestamp_ms,
-                event_type=data["event_type"],
-                l_id=l_id
-            )
-            db.session.add(loan_event)
-            if data["event_type"] == "Handover":
-                db.session.execute(text("""
-                        UPDATE loan
-                        SET actual_start_at = :actual_start_at
-                        WHERE l_id = :l_id
-                    """), {"actual_start_at": datetime.now(), "l_id": l_id})
-            elif data["event_type"] == "Return":
-                db.session.execute(text("""
-                        UPDATE loan
-                        SET actual_return_at = :actual_return_at
-                        WHERE l_id = :l_id
-                    """), {"actual_return_at": datetime.now(), "l_id": l_id})
-
+            result = record_loan_events(db.session, m_id, [(l_id, data["event_type"])])[0]
+            if not result["ok"]:
+                db.session.rollback()
+                return False, result["message"]
             db.session.commit()
             return True, "OK"
         except Exception as e:
             db.session.rollback()
             return False, str(e)
     return False, "Unauthorized"
+
+
+def punch_in_loans(token: str, data: dict):
+    """
+    處理批次打卡請求（例如取貨櫃檯一次交貨 / 歸還多筆）。
+
+    接收 [{"l_id", "event_type"}, ...]，以一個集合式語句檢查狀態轉換並寫入所有事件，
+    不符合的項目不會寫入，回傳每個 l_id 的結果。
+    """
+    m_id, active_role = get_user(token)
+    if not m_id:
+        return False, "Unauthorized"
+    if active_role != "member":
+        return False, "Unauthorized"
+    entries = data.get("events")
+    if not isinstance(entries, list) or not entries:
+        return False, "events must be a non-empty list"
+    if len(entries) > MAX_PUNCH_BATCH_SIZE:
+        return False, f"At most {MAX_PUNCH_BATCH_SIZE} events per request"
+
+    events, results, seen = [], [], set()
+    for entry in entries:
+        l_id = entry.get("l_id") if isinstance(entry, dict) else None
+        event_type = entry.get("event_type") if isinstance(entry, dict) else None
+        if not isinstance(l_id, int):
+            results.append({"l_id": l_id, "event_type": event_type, "ok": False, "message": "Invalid l_id"})
+        elif event_type not in TRANSITIONS:
+            results.append({"l_id": l_id, "event_type": event_type, "ok": False, "message": "Invalid event type"})
+        elif l_id in seen:
+            results.append({"l_id": l_id, "event_type": event_type, "ok": False, "message": "Duplicate entry"})
+        else:
+            seen.add(l_id)
+            events.append((l_id, event_type))
+
+    try:
+        results.extend(record_loan_events(db.session, m_id, events))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return False, str(e)
+    succeeded = sum(1 for result in results if result["ok"])
+    return True, {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
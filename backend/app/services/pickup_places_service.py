@@ -1,15 +1,20 @@
 from app.extensions import db
-from sqlalchemy import text
+from app.utils.replica import read_only
+from app.utils.prepared import prepared
 
 
+ALL_PICKUP_PLACES = prepared("all_pickup_places", """
+    SELECT p_id, p_name
+    FROM pick_up_place
+    WHERE is_deleted = false
+""")
+
+
+@read_only
 def get_all_pickup_places():
     """
     處理取得所有取貨地點請求。
     """
-    pickup_places = db.session.execute(text("""
-        SELECT p_id, p_name
-        FROM pick_up_place
-        WHERE is_deleted = false
-    """)).mappings().all()
+    pickup_places = ALL_PICKUP_PLACES.execute(db.session).mappings().all()
     # 轉換為字典列表
     return [dict(row) for row in pickup_places]
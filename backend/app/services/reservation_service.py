@@ -4,7 +4,43 @@ from app.models.reservation_detail import ReservationDetail
 from datetime import datetime, timedelta
 from app.utils.jwt_utils import get_user
 from sqlalchemy import text
-from app.services.contribution import get_root_category
+from app.services.contribution import has_credit, restore_credit
+from app.services.eligibility import category_tree, get_eligibility
+from app.services import outbox
+from app.services.owner_read_model import remove_upcoming_loans_for_reservations
+from app.utils.replica import read_only
+from app.utils.prepared import prepared
+
+
+# 單筆預約的最長時段。reservation_detail 依 est_start_at 分區，
+# 與某時段重疊的預約一定在「時段開始 - MAX_RESERVATION_SPAN」之後開始，查詢以此條件只掃描近期分區
+MAX_RESERVATION_SPAN = timedelta(days=366)
+
+
+CONFLICTING_DETAIL = prepared("conflicting_detail", """
+    SELECT rd.rd_id
+    FROM reservation_detail rd
+    JOIN reservation r ON rd.r_id = r.r_id
+    WHERE rd.i_id = :i_id
+    AND rd.est_start_at > :earliest_start
+    AND r.is_deleted = false
+    AND ((rd.est_start_at, rd.est_due_at)
+         OVERLAPS (CAST(:est_start_at AS TIMESTAMP), CAST(:est_due_at AS TIMESTAMP)))
+""")
+
+ITEM_PICKUP_PLACE_COUNT = prepared("item_pickup_place_count", """
+    SELECT COUNT(*)
+    FROM item i
+    join item_pick ip on i.i_id = ip.i_id
+    WHERE ip.p_id = :p_id and ip.is_deleted = false
+    AND i.i_id = :i_id
+""")
+
+ITEM_OUT_DURATION = prepared("item_out_duration", """
+    SELECT out_duration
+    FROM item
+    WHERE i_id = :i_id
+""")
 
 
 def check_item_available(session, i_id: int, p_id: int, est_start_at: datetime, est_due_at: datetime):
@@ -12,17 +48,14 @@ def check_item_available(session, i_id: int, p_id: int, est_start_at: datetime,
     檢查物品是否可用。
     使用 SQL OVERLAPS operator 檢查時間是否重疊。
     需排除被刪除的預約。
+    時段長度需由呼叫端先檢查不超過 MAX_RESERVATION_SPAN（重疊查詢只掃描近期分區）。
     """
+    if est_due_at - est_start_at > MAX_RESERVATION_SPAN:
+        return False
 
-    conflict_count = session.execute(text("""
-        SELECT rd.rd_id
-        FROM reservation_detail rd
-        JOIN reservation r ON rd.r_id = r.r_id
-        WHERE rd.i_id = :i_id
-        AND r.is_deleted = false
-        AND ((rd.est_start_at, rd.est_due_at) OVERLAPS (:est_start_at, :est_due_at))
-    """), {
+    conflict_count = CONFLICTING_DETAIL.execute(session, {
         "i_id": i_id,
+        "earliest_start": est_start_at - MAX_RESERVATION_SPAN,
         "est_start_at": est_start_at,
         "est_due_at": est_due_at
     }).scalar()
@@ -30,13 +63,7 @@ def check_item_available(session, i_id: int, p_id: int, est_start_at: datetime,
     if conflict_count:
         print('conflict_count')
         return False
-    pid_check = session.execute(text("""
-        SELECT COUNT(*)
-        FROM item i
-        join item_pick ip on i.i_id = ip.i_id
-        WHERE ip.p_id = :p_id and ip.is_deleted = false
-        AND i.i_id = :i_id
-    """), {
+    pid_check = ITEM_PICKUP_PLACE_COUNT.execute(session, {
         "p_id": p_id,
         "i_id": i_id,
     }).scalar()
@@ -44,11 +71,7 @@ def check_item_available(session, i_id: int, p_id: int, est_start_at: datetime,
     if not pid_check:
         print('pid_check')
         return False
-    duration = session.execute(text("""
-        SELECT out_duration
-        FROM item
-        WHERE i_id = :i_id
-    """), {
+    duration = ITEM_OUT_DURATION.execute(session, {
         "i_id": i_id,
     }).scalar()
     if duration < (est_due_at - est_start_at).total_seconds():
@@ -57,31 +80,35 @@ def check_item_available(session, i_id: int, p_id: int, est_start_at: datetime,
     return True
 
 
+ITEM_PICKUP_PLACES = prepared("item_pickup_places", """
+    SELECT pick_up_place.p_id, pick_up_place.p_name
+    FROM item_pick
+    join pick_up_place on item_pick.p_id = pick_up_place.p_id
+    WHERE item_pick.i_id = :i_id and item_pick.is_deleted = false and pick_up_place.is_deleted = false
+""")
+
+
+@read_only
 def get_pickup_places(i_id: int):
     """
     處理取得物品可取貨地點請求。
     """
-    pickup_places = db.session.execute(text("""
-        SELECT pick_up_place.p_id, pick_up_place.p_name
-        FROM item_pick
-        join pick_up_place on item_pick.p_id = pick_up_place.p_id
-        WHERE item_pick.i_id = :i_id and item_pick.is_deleted = false and pick_up_place.is_deleted = false
-    """), {
-        "i_id": i_id,
-    }).mappings().all()
+    pickup_places = ITEM_PICKUP_PLACES.execute(db.session, {"i_id": i_id}).mappings().all()
     return [dict(row) for row in pickup_places]
 
 
+ITEM_CATEGORY = prepared("item_category", """
+    SELECT c_id FROM item WHERE i_id = :i_id
+""")
+
+
 def create_reservation(token: str, data: dict):
     """
     處理建立預約請求。
     """
-    user_result = get_user(token)
-    if user_result is None:
-        return False, "未授權：Token 無效或已過期，請重新登入"
-    m_id, active_role = user_result
+    m_id, active_role = get_user(token)
     if not m_id:
-        return False, "未授權：無法取得用戶資訊"
+        return False, "未授權：Token 無效或已過期，請重新登入"
     if active_role == "member":
 
         try:
@@ -94,6 +121,8 @@ def create_reservation(token: str, data: dict):
             )
             db.session.add(new_reservation)
             db.session.flush()
+            # 禁止類別與有額度的 root category（快取的快照，版本相同時不需重新查詢）
+            eligibility = get_eligibility(db.session, m_id)
             for rd in data["rd_list"]:
                 # 將字串轉為 datetime 物件 (如果傳入是字串)
                 # 假設 data["rd_list"] 裡的日期是 ISO 格式字串，需要先 parse
@@ -108,91 +137,28 @@ def create_reservation(token: str, data: dict):
                         due_at = due_at[:-1] + '+00:00'
                     due_at = datetime.fromisoformat(due_at)
 
+                if due_at - start_at > MAX_RESERVATION_SPAN:
+                    db.session.rollback()
+                    return False, f"物品 ID {rd['i_id']} 的預約時段不可超過 {MAX_RESERVATION_SPAN.days} 天"
                 if not check_item_available(db.session, rd["i_id"], rd["p_id"], start_at, due_at):
                     db.session.rollback()  # 確保 rollback
                     return False, f"物品 ID {rd['i_id']} 在選擇的時間段內不可用，請選擇其他時間"
-                cat = db.session.execute(text("""
-                    SELECT item.c_id, category.c_name
-                    FROM item
-                    join category on item.c_id = category.c_id
-                    WHERE i_id = :i_id
-                """), {
+                c_id = ITEM_CATEGORY.execute(db.session, {
                     "i_id": rd["i_id"]
-                }).mappings().first()
-                cat_dict = dict(cat)
-                root_c_id = get_root_category(db.session, cat_dict["c_id"])
+                }).scalar()
+                root_c_id = eligibility.tree.root_of(c_id)
 
-                # 優先檢查用戶是否被禁止（檢查物品類別和 root category）
+                # 優先檢查用戶是否被禁止（物品類別或其任一上層類別，root category 優先）
                 # 如果用戶同時被禁止且沒有貢獻，優先顯示被禁止的訊息
-                check_ban = db.session.execute(text("""
-                    SELECT category_ban.c_id, category.c_name
-                    FROM category_ban
-                    JOIN category ON category_ban.c_id = category.c_id
-                    WHERE category_ban.m_id = :m_id 
-                    AND category_ban.is_deleted = false
-                    AND category_ban.c_id IN (:c_id, :root_c_id)
-                    ORDER BY CASE WHEN category_ban.c_id = :root_c_id THEN 0 ELSE 1 END
-                    LIMIT 1
-                """), {
-                    "c_id": cat_dict["c_id"],
-                    "root_c_id": root_c_id,
-                    "m_id": m_id,
-                }).mappings().first()
-
-                if check_ban:
+                banned_c_id = eligibility.ban_for(c_id)
+                if banned_c_id is not None:
                     db.session.rollback()
-                    banned_cat_dict = dict(check_ban)
-                    return False, f"您已被禁止借用「{banned_cat_dict['c_name']}」類別的物品"
-
-                # 檢查用戶在該 root category 及其所有子類別下是否有 active contribution
-                check_contribution = db.session.execute(text("""
-                    SELECT contribution.i_id
-                    FROM contribution
-                    JOIN item ON contribution.i_id = item.i_id
-                    WHERE contribution.m_id = :m_id 
-                    AND contribution.is_active = true
-                    AND item.c_id IN (
-                        -- 找到 root category 下的所有子類別（包括 root 自己）
-                        WITH RECURSIVE category_tree AS (
-                            -- 起始點：root category
-                            SELECT c_id FROM category WHERE c_id = :root_c_id
-                            
-                            UNION ALL
-                            
-                            -- 遞迴向下查找所有子類別
-                            SELECT c.c_id 
-                            FROM category c
-                            JOIN category_tree ct ON c.parent_c_id = ct.c_id
-                        )
-                        SELECT c_id FROM category_tree
-                    )
-                    LIMIT 1
-                    FOR UPDATE OF contribution
-                """), {
-                    "root_c_id": root_c_id,
-                    "m_id": m_id,
-                }).mappings().all()
-                check_contribution = [dict(row) for row in check_contribution]
+                    return False, f"您已被禁止借用「{eligibility.tree.names.get(banned_c_id)}」類別的物品"
 
-                if len(check_contribution) > 0:
-                    # 如果找到 contribution，確保它是 active 的
-                    db.session.execute(text("""
-                        UPDATE contribution
-                        SET is_active = true
-                        WHERE i_id = :i_id AND m_id = :m_id
-                    """), {
-                        "i_id": check_contribution[0]["i_id"],
-                        "m_id": m_id,
-                    })
-                else:
+                # 快照中沒有額度時直接拒絕；有額度時以主鍵鎖定該 root category 的額度列再確認
+                if root_c_id not in eligibility.credit_roots or not has_credit(db.session, m_id, root_c_id):
                     db.session.rollback()
-                    root_c_name = db.session.execute(text("""
-                        SELECT category.c_name
-                        FROM category
-                        WHERE c_id = :c_id
-                    """), {
-                        "c_id": root_c_id,
-                    }).scalar()
+                    root_c_name = eligibility.tree.names.get(root_c_id)
                     return False, f"您在「{root_c_name}」類別下的貢獻尚未啟用，請先上傳物品並通過審核"
                 new_reservation_detail = ReservationDetail(
                     r_id=new_reservation.r_id,
@@ -203,6 +169,13 @@ def create_reservation(token: str, data: dict):
                 )
 
                 db.session.add(new_reservation_detail)
+            # 與預約同一個 transaction 寫入 outbox，rollback 或重試時不會留下事件
+            item_ids = [rd["i_id"] for rd in data["rd_list"]]
+            outbox.enqueue(db.session, "reservation", new_reservation.r_id, "reservation_created",
+                           {"r_id": new_reservation.r_id, "m_id": m_id, "item_ids": item_ids},
+                           dedup_key=f"reservation_created:{new_reservation.r_id}",
+                           funnel={"event_type": "create_reservation", "success": True,
+                                   "reservation_id": new_reservation.r_id})
             db.session.commit()
             return True, {"r_id": new_reservation.r_id}
         except Exception as e:
@@ -221,6 +194,26 @@ def create_reservation(token: str, data: dict):
     return False, "未授權：只有會員可以建立預約"
 
 
+RESERVATION_TIMES = prepared("reservation_times", """
+    SELECT est_start_at, est_due_at
+    FROM reservation_detail
+    WHERE r_id = :r_id
+""")
+
+RESERVATION_ITEMS = prepared("reservation_items", """
+    SELECT rd_id, i.i_id, i.c_id
+    FROM reservation_detail
+    join item i on reservation_detail.i_id = i.i_id
+    WHERE r_id = :r_id
+""")
+
+CANCEL_RESERVATION = prepared("cancel_reservation", """
+    UPDATE reservation
+    SET is_deleted = true
+    WHERE r_id = :r_id
+""")
+
+
 def delete_reservation(token: str, r_id: int):
     """
     處理刪除預約請求。
@@ -232,11 +225,7 @@ def delete_reservation(token: str, r_id: int):
         try:
             db.session.execute(
                 text("SET TRANSACTION ISOLATION LEVEL SERIALIZABLE"))
-            check_time = db.session.execute(text("""
-                SELECT est_start_at, est_due_at
-                FROM reservation_detail
-                WHERE r_id = :r_id
-            """), {
+            check_time = RESERVATION_TIMES.execute(db.session, {
                 "r_id": r_id,
             }).mappings().all()
             check_time = [dict(row) for row in check_time]
@@ -244,63 +233,23 @@ def delete_reservation(token: str, r_id: int):
                 if rd["est_start_at"] < datetime.now() + timedelta(hours=24):
                     db.session.rollback()
                     return False, "You can only cancel the reservation within 24 hours before the start time"
-            rds = db.session.execute(text("""
-                SELECT rd_id, i.i_id, i.c_id
-                FROM reservation_detail
-                join item i on reservation_detail.i_id = i.i_id
-                WHERE r_id = :r_id
-            """), {
+            rds = RESERVATION_ITEMS.execute(db.session, {
                 "r_id": r_id,
             }).mappings().all()
             rds = [dict(row) for row in rds]
+            tree = category_tree(db.session)
             for rd in rds:
                 # 取得該物品的 root category
-                root_c_id = get_root_category(db.session, rd["c_id"])
-
-                # 在該 root category 及其所有子類別下找一個 inactive 的 contribution
-                inactive_contribution = db.session.execute(text("""
-                    SELECT contribution.i_id
-                    FROM contribution
-                    JOIN item ON contribution.i_id = item.i_id
-                    WHERE contribution.m_id = :m_id
-                    AND contribution.is_active = false
-                    AND item.c_id IN (
-                        WITH RECURSIVE category_tree AS (
-                            SELECT c_id 
-                            FROM category 
-                            WHERE c_id = :root_c_id
-                            UNION ALL
-                            SELECT c.c_id 
-                            FROM category c
-                            JOIN category_tree ct ON c.parent_c_id = ct.c_id
-                        )
-                        SELECT c_id FROM category_tree
-                    )
-                    LIMIT 1
-                """), {
-                    "root_c_id": root_c_id,
-                    "m_id": m_id,
-                }).mappings().first()
-                if inactive_contribution:
-                    inactive_contribution = dict(inactive_contribution)
+                root_c_id = tree.root_of(rd["c_id"])
 
-                # 如果找到 inactive 的 contribution，將它設為 active
-                if inactive_contribution:
-                    db.session.execute(text("""
-                        UPDATE contribution
-                        SET is_active = true
-                        WHERE i_id = :i_id AND m_id = :m_id
-                    """), {
-                        "i_id": inactive_contribution["i_id"],
-                        "m_id": m_id,
-                    })
-            db.session.execute(text("""
-                UPDATE reservation
-                SET is_deleted = true
-                WHERE r_id = :r_id
-            """), {
+                # 該 root category 下有 inactive 的 contribution 時，將其中一筆設為 active
+                restore_credit(db.session, m_id, root_c_id)
+            CANCEL_RESERVATION.execute(db.session, {
                 "r_id": r_id,
             })
+            remove_upcoming_loans_for_reservations(db.session, [r_id])
+            outbox.enqueue(db.session, "reservation", r_id, "reservation_deleted", {"r_id": r_id, "m_id": m_id},
+                           dedup_key=f"reservation_deleted:{r_id}")
             db.session.commit()
             return True, "OK"
         except Exception as e:
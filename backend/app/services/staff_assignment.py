@@ -0,0 +1,213 @@
+"""
+員工派工子系統
+- staff_workload 記錄每位員工尚未結案的檢舉 / 驗證數量，建立與結案時在同一個 transaction 內增減
+- 每個 process 保留一個依負載排序的 heap，每 STAFF_ASSIGNMENT_REFRESH_SECONDS 秒從 staff_workload 重新載入
+  （同步其他 process 的派工），派工時以 O(log n) 取出負載最低的員工，不必每次讀取整個 staff 表
+- heap 的負載在 staff_workload 寫入成功後才調整；呼叫端的 transaction rollback 時再扣回
+- 員工停用（is_deleted）後，寫入計數時就會發現並移出 heap；deactivate_staff（flask deactivate-staff）
+  會把手上的案件改派給其他員工。staff_workload 的完整重建由 setreadmodel.sql 負責
+"""
+import heapq
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.utils.prepared import prepared
+
+# 案件種類 -> staff_workload 欄位
+KINDS = {"report": "open_reports", "verification": "open_verifications"}
+# 案件種類 -> (案件表, 主鍵, 結案欄位)
+CASE_TABLES = {
+    "report": ("report", "re_id", "r_conclusion"),
+    "verification": ("item_verification", "iv_id", "v_conclusion"),
+}
+
+STAFF_LOADS = prepared("staff_loads", """
+    SELECT s.s_id, COALESCE(w.open_reports + w.open_verifications, 0) AS load
+    FROM staff s
+    LEFT JOIN staff_workload w ON w.s_id = s.s_id
+    WHERE s.role = 'Employee' AND s.is_deleted = false
+""")
+
+# 只在員工仍在職時寫入；停用的員工不會回傳資料列
+ASSIGN_STAFF = {kind: prepared(f"assign_staff_{kind}", f"""
+    INSERT INTO staff_workload (s_id, {column})
+    SELECT s_id, 1 FROM staff
+    WHERE s_id = :s_id AND role = 'Employee' AND is_deleted = false
+    ON CONFLICT (s_id) DO UPDATE
+    SET {column} = staff_workload.{column} + 1
+    RETURNING s_id
+""") for kind, column in KINDS.items()}
+
+RELEASE_STAFF = {kind: prepared(f"release_staff_{kind}", f"""
+    UPDATE staff_workload
+    SET {column} = GREATEST({column} - :count, 0)
+    WHERE s_id = :s_id
+""") for kind, column in KINDS.items()}
+
+DEACTIVATE_STAFF = prepared("deactivate_staff", """
+    UPDATE staff SET is_deleted = true WHERE s_id = :s_id AND role = 'Employee'
+    RETURNING s_id
+""")
+
+PENDING_CASES = {kind: prepared(f"pending_{kind}_cases", f"""
+    SELECT {id_column} FROM {table}
+    WHERE s_id = :s_id AND {conclusion_column} = 'Pending'
+    FOR UPDATE
+""") for kind, (table, id_column, conclusion_column) in CASE_TABLES.items()}
+
+REASSIGN_CASE = {kind: prepared(f"reassign_{kind}_case", f"""
+    UPDATE {table} SET s_id = :new_s_id WHERE {id_column} = :pending_id
+""") for kind, (table, id_column, _) in CASE_TABLES.items()}
+
+_lock = threading.Lock()
+_heap = []      # [(負載, s_id)]，可能含過期項目，取用時與 _load 比對
+_load = {}      # {s_id: 目前負載}，只包含在職的 Employee
+_loaded_at = None
+_generation = 0  # 每次重新載入加一；rollback 時只扣回同一次載入後的調整
+
+# session.info 中記錄本 transaction 對 heap 的調整 [(generation, s_id, delta)]
+_PENDING_KEY = "staff_assignment_deltas"
+# session.info 中記錄本 transaction 停用的員工 {s_id}，commit 後才移出 heap
+_DEACTIVATED_KEY = "staff_assignment_deactivated"
+
+
+def _refresh(session):
+    global _heap, _load, _loaded_at, _generation
+    rows = STAFF_LOADS.execute(session).all()
+    _load = {s_id: load for s_id, load in rows}
+    _heap = [(load, s_id) for s_id, load in _load.items()]
+    heapq.heapify(_heap)
+    _loaded_at = time.monotonic()
+    _generation += 1
+
+
+def _set_load(s_id, load):
+    _load[s_id] = load
+    heapq.heappush(_heap, (load, s_id))
+    # 過期項目太多時重建，避免 heap 無限成長
+    if len(_heap) > 4 * len(_load) + 64:
+        _heap[:] = [(value, key) for key, value in _load.items()]
+        heapq.heapify(_heap)
+
+
+def _adjust_load(session, s_id, delta):
+    """
+    staff_workload 寫入成功後調整 heap，並記錄在 session 中，transaction rollback 時扣回。
+    """
+    with _lock:
+        if s_id not in _load:
+            return
+        _set_load(s_id, max(_load[s_id] + delta, 0))
+        session.info.setdefault(_PENDING_KEY, []).append((_generation, s_id, delta))
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_adjustments(session):
+    session.info.pop(_PENDING_KEY, None)
+    deactivated = session.info.pop(_DEACTIVATED_KEY, None)
+    if deactivated:
+        with _lock:
+            for s_id in deactivated:
+                _load.pop(s_id, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _revert_adjustments(session):
+    session.info.pop(_DEACTIVATED_KEY, None)
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if not deltas:
+        return
+    with _lock:
+        for generation, s_id, delta in deltas:
+            if generation == _generation and s_id in _load:
+                _set_load(s_id, max(_load[s_id] - delta, 0))
+
+
+def _least_loaded(exclude=()):
+    """
+    回傳負載最低的員工；exclude 中的員工略過但保留在 heap 中。
+    """
+    skipped = []
+    try:
+        while _heap:
+            load, s_id = _heap[0]
+            if _load.get(s_id) != load:
+                heapq.heappop(_heap)
+            elif s_id in exclude:
+                skipped.append(heapq.heappop(_heap))
+            else:
+                return s_id
+        return None
+    finally:
+        for entry in skipped:
+            heapq.heappush(_heap, entry)
+
+
+def _maybe_refresh(session):
+    refresh = current_app.config.get("STAFF_ASSIGNMENT_REFRESH_SECONDS", 30)
+    if _loaded_at is None or not _load or time.monotonic() - _loaded_at > refresh:
+        _refresh(session)
+
+
+def assign_staff(session, kind: str):
+    """
+    選出負載最低的在職員工並將其 staff_workload 計數加一（在呼叫端的 transaction 內）。
+    沒有可派工的員工時回傳 None。
+    """
+    # 本 transaction 停用、尚未 commit 的員工
+    exclude = session.info.get(_DEACTIVATED_KEY, ())
+    while True:
+        with _lock:
+            _maybe_refresh(session)
+            s_id = _least_loaded(exclude)
+            if s_id is None:
+                return None
+
+        assigned = ASSIGN_STAFF[kind].execute(session, {"s_id": s_id}).scalar()
+        if assigned:
+            _adjust_load(session, s_id, 1)
+            return s_id
+        with _lock:
+            _load.pop(s_id, None)
+
+
+def release_staff(session, s_id: int, kind: str, count: int = 1):
+    """
+    案件結案（離開 Pending）後呼叫：將員工的 staff_workload 計數減 count。
+    """
+    if count <= 0:
+        return
+    RELEASE_STAFF[kind].execute(session, {"s_id": s_id, "count": count})
+    _adjust_load(session, s_id, -count)
+
+
+def deactivate_staff(session, s_id: int):
+    """
+    停用員工：標記 is_deleted，並把尚未結案的檢舉與驗證改派給其他員工（不 commit）。
+    回傳 {"reports": 改派數量, "verifications": 改派數量}；s_id 不是 Employee 時回傳 None。
+    已停用的員工可以再次執行，改派先前沒有其他員工可接手的案件。
+    """
+    found = DEACTIVATE_STAFF.execute(session, {"s_id": s_id}).scalar()
+    if found is None:
+        return None
+    # 不再派工給此員工；heap 在 commit 後才移除，rollback 時維持原狀
+    session.info.setdefault(_DEACTIVATED_KEY, set()).add(s_id)
+
+    moved = {}
+    for kind in CASE_TABLES:
+        pending_ids = PENDING_CASES[kind].execute(session, {"s_id": s_id}).scalars().all()
+        count = 0
+        for pending_id in pending_ids:
+            new_s_id = assign_staff(session, kind)
+            if new_s_id is None:
+                break
+            REASSIGN_CASE[kind].execute(session, {"new_s_id": new_s_id, "pending_id": pending_id})
+            count += 1
+        release_staff(session, s_id, kind, count)
+        moved[kind + "s"] = count
+    return moved
+
@@ -4,7 +4,25 @@ from app.utils.jwt_utils import get_user
 from app.models.staff import Staff
 from datetime import datetime
 from app.models.contribution import Contribution
-from app.services.contribution import change_contribution
+from app.services.contribution import change_contribution, set_contributions_active
+from app.services import outbox
+from app.services.eligibility import bump_eligibility_version
+from app.services.staff_assignment import release_staff
+from app.services.owner_read_model import remove_upcoming_loans_for_reservations
+from app.utils.prepared import prepared
+
+REPORT_CONCLUSIONS = ["Withdraw", "Ban Category", "Delist"]
+VERIFICATION_CONCLUSIONS = ["Pass", "Fail"]
+# 批次結案：每個 transaction 最多處理的筆數，避免長時間持有大量 row lock
+BATCH_CHUNK_SIZE = 100
+MAX_BATCH_SIZE = 1000
+
+
+THIS_STAFF = prepared("this_staff", """
+    SELECT s_id, s_name, s_mail, role, is_deleted
+    FROM staff
+    WHERE s_id = :user_id
+""")
 
 
 def get_this_staff(token: str):
@@ -18,40 +36,175 @@ def get_this_staff(token: str):
     if not user_id:
         return False, "Unauthorized"
     if active_role == "staff":
-        staff_row = db.session.execute(
-            text("""
-                SELECT s_id, s_name, s_mail, role, is_deleted
-                FROM staff
-                WHERE s_id = :user_id
-            """),
-            {"user_id": user_id}
-        ).mappings().first()
+        staff_row = THIS_STAFF.execute(db.session, {"user_id": user_id}).mappings().first()
         if not staff_row:
             return False, "Staff not found"
         return True, {"staff": dict(staff_row)}
 
 
-def get_not_deal_reports(token: str):
+_QUEUE_ORDERS = {"asc": ("ASC", ">"), "desc": ("DESC", "<")}
+
+# 員工待處理佇列共用的類別子樹條件（c_id 為 NULL 時恆真）
+_CATEGORY_FILTER = """
+    (CAST(:c_id AS BIGINT) IS NULL OR i.c_id IN (
+        WITH RECURSIVE category_tree AS (
+            SELECT c_id FROM category WHERE c_id = :c_id
+            UNION ALL
+            SELECT c.c_id FROM category c
+            JOIN category_tree ct ON c.parent_c_id = ct.c_id
+        )
+        SELECT c_id FROM category_tree
+    ))
+"""
+
+
+# order -> 待處理的檢舉 / 驗證佇列（排序方向不同的兩種版本各登記一次）
+NOT_DEAL_REPORTS = {order: prepared(f"not_deal_reports_{order}", f"""
+    SELECT r.re_id, r.comment, r.create_at, r.conclude_at, r.m_id, r.i_id
+    FROM report r
+    JOIN item i ON r.i_id = i.i_id
+    WHERE r.s_id = :user_id and r.r_conclusion = 'Pending'
+    AND (CAST(:owner_m_id AS BIGINT) IS NULL OR i.m_id = :owner_m_id)
+    AND (CAST(:reporter_m_id AS BIGINT) IS NULL OR r.m_id = :reporter_m_id)
+    AND (CAST(:after_create_at AS TIMESTAMP) IS NULL
+         OR (r.create_at, r.re_id) {comparison} (:after_create_at, :after_id))
+    AND {_CATEGORY_FILTER}
+    ORDER BY r.create_at {direction}, r.re_id {direction}
+    LIMIT :limit
+""") for order, (direction, comparison) in _QUEUE_ORDERS.items()}
+
+NOT_DEAL_VERIFICATIONS = {order: prepared(f"not_deal_verifications_{order}", f"""
+    SELECT iv.iv_id, iv.i_id, iv.v_conclusion, iv.create_at
+    FROM item_verification iv
+    JOIN item i ON iv.i_id = i.i_id
+    WHERE iv.s_id = :s_id and iv.v_conclusion = 'Pending'
+    AND (CAST(:owner_m_id AS BIGINT) IS NULL OR i.m_id = :owner_m_id)
+    AND (CAST(:after_create_at AS TIMESTAMP) IS NULL
+         OR (iv.create_at, iv.iv_id) {comparison} (:after_create_at, :after_id))
+    AND {_CATEGORY_FILTER}
+    ORDER BY iv.create_at {direction}, iv.iv_id {direction}
+    LIMIT :limit
+""") for order, (direction, comparison) in _QUEUE_ORDERS.items()}
+
+QUEUE_COUNTS = prepared("queue_counts", """
+    SELECT open_reports, open_verifications
+    FROM staff_workload
+    WHERE s_id = :s_id
+""")
+
+
+def _queue_page(rows, limit, id_key):
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = {"after_create_at": items[-1]["create_at"].isoformat(), "after_id": items[-1][id_key]}
+    return items, next_cursor
+
+
+def get_not_deal_reports(token: str, limit: int = 50, order: str = "asc", c_id: int = None,
+                         owner_m_id: int = None, reporter_m_id: int = None,
+                         after_create_at: datetime = None, after_id: int = None):
     """
     處理取得未處理的檢舉資訊請求。
 
     接收 JWT Token，
-    取得未處理的檢舉資訊後回傳。
+    依 create_at 排序、分頁（keyset：上一頁最後一筆的 (create_at, re_id)）取得未處理的檢舉資訊後回傳。
+    可依類別（含子類別）、物品 owner 或檢舉者過濾。
     """
     s_id, active_role = get_user(token)
     if not s_id:
         return False, "Unauthorized"
     if active_role == "staff":
-        report_row = db.session.execute(
-            text("""
-                SELECT re_id, comment, create_at, conclude_at, m_id, i_id
-                FROM report
-                WHERE s_id = :user_id and r_conclusion = 'Pending'
-            """),
-            {"user_id": s_id}
+        if order not in _QUEUE_ORDERS:
+            return False, "Invalid order"
+        limit = max(1, min(limit, 200))
+        report_row = NOT_DEAL_REPORTS[order].execute(
+            db.session,
+            {"user_id": s_id, "c_id": c_id, "owner_m_id": owner_m_id, "reporter_m_id": reporter_m_id,
+             "after_create_at": after_create_at, "after_id": after_id, "limit": limit + 1}
         ).mappings().all()
-        reports_list = [dict(row) for row in report_row]
-        return True, {"reports": reports_list}
+        reports_list, next_cursor = _queue_page(report_row, limit, "re_id")
+        return True, {"reports": reports_list, "next_cursor": next_cursor}
+    return False, "Unauthorized"
+
+
+def get_queue_counts(token: str):
+    """
+    處理取得待處理佇列數量請求。
+
+    直接讀取 staff_workload 維護的計數，不需掃描 report / item_verification。
+    """
+    s_id, active_role = get_user(token)
+    if not s_id:
+        return False, "Unauthorized"
+    if active_role == "staff":
+        counts = QUEUE_COUNTS.execute(db.session, {"s_id": s_id}).mappings().first()
+        if not counts:
+            return True, {"reports": 0, "verifications": 0}
+        return True, {"reports": counts["open_reports"], "verifications": counts["open_verifications"]}
+    return False, "Unauthorized"
+
+
+REPORT_FOR_UPDATE = prepared("report_for_update", """
+    SELECT r.i_id, i.c_id, r.m_id, i.i_name, r.r_conclusion AS previous_conclusion, r.s_id AS assigned_s_id
+    FROM report r
+    JOIN item i ON r.i_id = i.i_id
+    JOIN contribution c ON c.i_id = i.i_id
+    WHERE re_id = :re_id
+    FOR UPDATE OF r, i, c
+""")
+
+CONCLUDE_REPORT = prepared("conclude_report", """
+    UPDATE report
+    SET r_conclusion = :r_conclusion, conclude_at = :conclude_at
+    WHERE re_id = :re_id
+""")
+
+ITEM_OWNER_ID = prepared("item_owner_id", """
+    SELECT m_id FROM item WHERE i_id = :i_id
+""")
+
+BAN_CATEGORY = prepared("ban_category", """
+    INSERT INTO category_ban (s_id, c_id, m_id, ban_at, is_deleted)
+    VALUES (:s_id, :c_id, :m_id, :ban_at, false)
+    ON CONFLICT (c_id, m_id) DO UPDATE
+    SET is_deleted = false, ban_at = EXCLUDED.ban_at, s_id = EXCLUDED.s_id
+""")
+
+DELIST_ITEM = prepared("delist_item", """
+    UPDATE item
+    SET status = 'Not reservable'
+    WHERE i_id = :i_id
+""")
+
+CANCEL_PENDING_RESERVATIONS = prepared("cancel_pending_reservations", """
+    UPDATE reservation
+    SET is_deleted = true
+    WHERE m_id = :m_id
+    AND r_id IN (
+        SELECT r.r_id
+        FROM reservation r
+        JOIN reservation_detail rd ON r.r_id = rd.r_id
+        JOIN item i ON rd.i_id = i.i_id
+        LEFT JOIN loan l ON rd.rd_id = l.rd_id AND l.est_start_at = rd.est_start_at
+        WHERE r.m_id = :m_id
+        AND i.c_id = :c_id
+        AND l.l_id IS NULL -- 沒有 Loan 代表還沒取貨
+        AND r.is_deleted = false
+    )
+    RETURNING r_id
+""")
+
+ACTIVE_LOANS = prepared("active_loans_in_category", """
+    SELECT l.l_id, i.i_name
+    FROM loan l
+    JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    JOIN reservation r ON rd.r_id = r.r_id
+    JOIN item i ON rd.i_id = i.i_id
+    WHERE r.m_id = :m_id
+    AND i.c_id = :c_id
+    AND l.status <> 'Returned' -- 尚未歸還
+""")
 
 
 def conclude_report(token: str, re_id: int, data: dict):
@@ -63,7 +216,7 @@ def conclude_report(token: str, re_id: int, data: dict):
         return False, {"message": "Unauthorized"}
 
     if active_role == "staff":
-        if data["r_conclusion"] not in ["Withdraw", "Ban Category", "Delist"]:
+        if data["r_conclusion"] not in REPORT_CONCLUSIONS:
             return False, {"message": "Invalid conclusion"}
 
         try:
@@ -72,14 +225,7 @@ def conclude_report(token: str, re_id: int, data: dict):
 
             # 1. 取得檢舉相關資訊 (增加抓取 m_id, c_id 以便後續檢查)
             # 使用 FOR UPDATE 鎖定 report、item 和 contribution，避免並發問題
-            report_row = db.session.execute(text("""
-                SELECT r.i_id, i.c_id, r.m_id, i.i_name
-                FROM report r
-                JOIN item i ON r.i_id = i.i_id
-                JOIN contribution c ON c.i_id = i.i_id
-                WHERE re_id = :re_id
-                FOR UPDATE OF r, i, c
-            """), {"re_id": re_id}).mappings().first()
+            report_row = REPORT_FOR_UPDATE.execute(db.session, {"re_id": re_id}).mappings().first()
 
             if not report_row:
                 db.session.rollback()
@@ -87,39 +233,27 @@ def conclude_report(token: str, re_id: int, data: dict):
 
             report_dict = dict(report_row)
             # 2. 更新檢舉結案狀態
-            db.session.execute(text("""
-                UPDATE report
-                SET r_conclusion = :r_conclusion, conclude_at = :conclude_at
-                WHERE re_id = :re_id
-            """),
-                               {"r_conclusion": data["r_conclusion"], "conclude_at": datetime.now(), "re_id": re_id})
+            CONCLUDE_REPORT.execute(db.session,
+                                    {"r_conclusion": data["r_conclusion"], "conclude_at": datetime.now(), "re_id": re_id})
+            if report_dict["previous_conclusion"] == "Pending":
+                release_staff(db.session, report_dict["assigned_s_id"], "report")
 
             target_c_id = report_dict["c_id"]
             target_i_id = report_dict["i_id"]
-            target_m_id = db.session.execute(text("""
-                SELECT m_id FROM item WHERE i_id = :i_id
-            """), {"i_id": target_i_id}).scalar()
+            target_m_id = ITEM_OWNER_ID.execute(db.session, {"i_id": target_i_id}).scalar()
 
             # 3. 處理 Ban Category
             if data["r_conclusion"] == "Ban Category":
                 # 使用 ON CONFLICT 處理並發，不需要 table lock
-                db.session.execute(text("""
-                    INSERT INTO category_ban (s_id, c_id, m_id, ban_at, is_deleted)
-                    VALUES (:s_id, :c_id, :m_id, :ban_at, false)
-                    ON CONFLICT (c_id, m_id) DO UPDATE
-                    SET is_deleted = false, ban_at = EXCLUDED.ban_at, s_id = EXCLUDED.s_id
-                """),
-                                   {"s_id": s_id, "c_id": target_c_id, "m_id": target_m_id, "ban_at": datetime.now()})
+                BAN_CATEGORY.execute(db.session,
+                                     {"s_id": s_id, "c_id": target_c_id, "m_id": target_m_id, "ban_at": datetime.now()})
+                bump_eligibility_version(db.session, [target_m_id])
                 
             deleted_reservations = []
             # 4. 處理 Delist 或 Ban Category (都需要下架商品)
             if data["r_conclusion"] in ["Delist", "Ban Category"]:
                 # A. 更新商品狀態
-                db.session.execute(text("""
-                    UPDATE item
-                    SET status = 'Not reservable'
-                    WHERE i_id = :i_id
-                """), {"i_id": target_i_id})
+                DELIST_ITEM.execute(db.session, {"i_id": target_i_id})
 
                 # B. 【新增】同步將 Contribution 設為無效
                 # 如果物品被下架，它就不該再算作有效的 Contribution
@@ -127,40 +261,24 @@ def conclude_report(token: str, re_id: int, data: dict):
 
                 # C. 【新增】清理尚未取貨的預約 (Pending Reservations)
                 # 找出該使用者在該類別下，且尚未產生 Loan (未取貨) 的預約
-                deleted_reservations = db.session.execute(text("""
-                    UPDATE reservation
-                    SET is_deleted = true
-                    WHERE m_id = :m_id
-                    AND r_id IN (
-                        SELECT r.r_id
-                        FROM reservation r
-                        JOIN reservation_detail rd ON r.r_id = rd.r_id
-                        JOIN item i ON rd.i_id = i.i_id
-                        LEFT JOIN loan l ON rd.rd_id = l.rd_id
-                        WHERE r.m_id = :m_id
-                        AND i.c_id = :c_id
-                        AND l.l_id IS NULL -- 沒有 Loan 代表還沒取貨
-                        AND r.is_deleted = false
-                    )
-                    RETURNING r_id
-                """), {"m_id": target_m_id, "c_id": target_c_id}).mappings().all()
+                deleted_reservations = CANCEL_PENDING_RESERVATIONS.execute(
+                    db.session, {"m_id": target_m_id, "c_id": target_c_id}).mappings().all()
                 deleted_reservations = [dict(row)
                                         for row in deleted_reservations]
+                # D. 取消的預約可能有其他明細已產生 loan，同步從 owner_upcoming_loans 移除
+                remove_upcoming_loans_for_reservations(
+                    db.session, [row["r_id"] for row in deleted_reservations])
 
             # 5. 檢查是否有正在進行中的借用 (Active Loans) 以便回傳警示
-            active_loans = db.session.execute(text("""
-                SELECT l.l_id, i.i_name
-                FROM loan l
-                JOIN reservation_detail rd ON l.rd_id = rd.rd_id
-                JOIN reservation r ON rd.r_id = r.r_id
-                JOIN item i ON rd.i_id = i.i_id
-                LEFT JOIN loan_event le_return ON l.l_id = le_return.l_id AND le_return.event_type = 'Return'
-                WHERE r.m_id = :m_id
-                AND i.c_id = :c_id
-                AND le_return.timestamp IS NULL -- 沒有歸還紀錄
-            """), {"m_id": target_m_id, "c_id": target_c_id}).mappings().all()
+            active_loans = ACTIVE_LOANS.execute(
+                db.session, {"m_id": target_m_id, "c_id": target_c_id}).mappings().all()
             active_loans = [dict(row) for row in active_loans]
 
+            outbox.enqueue(db.session, "report", re_id, "report_concluded", {
+                "re_id": re_id, "s_id": s_id, "i_id": target_i_id, "c_id": target_c_id, "m_id": target_m_id,
+                "r_conclusion": data["r_conclusion"],
+                "canceled_r_ids": [row["r_id"] for row in deleted_reservations],
+            }, dedup_key=f"report_concluded:{re_id}:{data['r_conclusion']}")
             db.session.commit()
 
             # 6. 建構回傳訊息
@@ -179,31 +297,260 @@ def conclude_report(token: str, re_id: int, data: dict):
     return False, {"message": "Unauthorized role"}
 
 
-def get_not_deal_verification(token: str):
+def _validate_batch(entries, id_key, conclusion_key, allowed):
+    """
+    檢查批次請求格式，回傳 (有效的 [(id, conclusion)], 無效項目的結果)。
+    同一個 ID 出現多次時只處理第一筆。
+    """
+    valid, results, seen = [], [], set()
+    for entry in entries:
+        entry_id = entry.get(id_key) if isinstance(entry, dict) else None
+        conclusion = entry.get(conclusion_key) if isinstance(entry, dict) else None
+        if not isinstance(entry_id, int):
+            results.append({id_key: entry_id, "ok": False, "message": f"Invalid {id_key}"})
+        elif conclusion not in allowed:
+            results.append({id_key: entry_id, "ok": False, "message": "Invalid conclusion"})
+        elif entry_id in seen:
+            results.append({id_key: entry_id, "ok": False, "message": "Duplicate entry"})
+        else:
+            seen.add(entry_id)
+            valid.append((entry_id, conclusion))
+    return valid, results
+
+
+LOCK_REPORTS = prepared("lock_reports", """
+    SELECT r.re_id, r.i_id, i.c_id, i.m_id AS owner_m_id,
+           r.r_conclusion AS previous_conclusion, r.s_id AS assigned_s_id
+    FROM report r
+    JOIN item i ON r.i_id = i.i_id
+    JOIN contribution c ON c.i_id = i.i_id
+    WHERE r.re_id = ANY(:re_ids)
+    FOR UPDATE OF r, i, c
+""")
+
+CONCLUDE_REPORTS = prepared("conclude_reports", """
+    UPDATE report r
+    SET r_conclusion = v.r_conclusion, conclude_at = :conclude_at
+    FROM unnest(CAST(:re_ids AS BIGINT[]), CAST(:conclusions AS VARCHAR[])) AS v(re_id, r_conclusion)
+    WHERE r.re_id = v.re_id
+""")
+
+BAN_CATEGORIES = prepared("ban_categories", """
+    INSERT INTO category_ban (s_id, c_id, m_id, ban_at, is_deleted)
+    SELECT CAST(:s_id AS BIGINT), b.c_id, b.m_id, CAST(:ban_at AS TIMESTAMP), false
+    FROM unnest(CAST(:c_ids AS BIGINT[]), CAST(:m_ids AS BIGINT[])) AS b(c_id, m_id)
+    ON CONFLICT (c_id, m_id) DO UPDATE
+    SET is_deleted = false, ban_at = EXCLUDED.ban_at, s_id = EXCLUDED.s_id
+""")
+
+DELIST_ITEMS = prepared("delist_items", """
+    UPDATE item SET status = 'Not reservable' WHERE i_id = ANY(:i_ids)
+""")
+
+CANCEL_PENDING_RESERVATIONS_BATCH = prepared("cancel_pending_reservations_batch", """
+    WITH targets AS (
+        SELECT DISTINCT r.r_id, t.m_id, t.c_id
+        FROM unnest(CAST(:m_ids AS BIGINT[]), CAST(:c_ids AS BIGINT[])) AS t(m_id, c_id)
+        JOIN reservation r ON r.m_id = t.m_id
+        JOIN reservation_detail rd ON r.r_id = rd.r_id
+        JOIN item i ON rd.i_id = i.i_id AND i.c_id = t.c_id
+        LEFT JOIN loan l ON rd.rd_id = l.rd_id AND l.est_start_at = rd.est_start_at
+        WHERE l.l_id IS NULL -- 沒有 Loan 代表還沒取貨
+        AND r.is_deleted = false
+    ),
+    canceled AS (
+        UPDATE reservation
+        SET is_deleted = true
+        WHERE r_id IN (SELECT r_id FROM targets)
+        RETURNING r_id
+    )
+    SELECT t.m_id, t.c_id, array_agg(DISTINCT t.r_id) AS r_ids
+    FROM targets t
+    JOIN canceled c ON c.r_id = t.r_id
+    GROUP BY t.m_id, t.c_id
+""")
+
+ACTIVE_LOANS_BATCH = prepared("active_loans_in_categories", """
+    SELECT t.m_id, t.c_id, array_agg(i.i_name ORDER BY l.l_id) AS i_names
+    FROM unnest(CAST(:m_ids AS BIGINT[]), CAST(:c_ids AS BIGINT[])) AS t(m_id, c_id)
+    JOIN reservation r ON r.m_id = t.m_id
+    JOIN reservation_detail rd ON r.r_id = rd.r_id
+    JOIN item i ON rd.i_id = i.i_id AND i.c_id = t.c_id
+    JOIN loan l ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+    WHERE l.status <> 'Returned' -- 尚未歸還
+    GROUP BY t.m_id, t.c_id
+""")
+
+
+def _conclude_report_chunk(s_id: int, chunk: list):
+    """
+    在一個 REPEATABLE READ transaction 內以集合式語句結案一批檢舉，回傳每筆的結果。
+    """
+    now = datetime.now()
+    db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+
+    # 1. 鎖定 report、item、contribution（與單筆結案相同的鎖定範圍）
+    rows = LOCK_REPORTS.execute(db.session, {"re_ids": [re_id for re_id, _ in chunk]}).mappings().all()
+    found = {row["re_id"]: dict(row) for row in rows}
+
+    targets = [(re_id, conclusion) for re_id, conclusion in chunk if re_id in found]
+    results = {re_id: {"re_id": re_id, "ok": False, "message": "Report not found"}
+               for re_id, _ in chunk if re_id not in found}
+    if not targets:
+        db.session.rollback()
+        return [results[re_id] for re_id, _ in chunk]
+
+    # 2. 更新檢舉結案狀態
+    CONCLUDE_REPORTS.execute(db.session, {"re_ids": [re_id for re_id, _ in targets],
+                                          "conclusions": [conclusion for _, conclusion in targets],
+                                          "conclude_at": now})
+
+    released = {}
+    for re_id, _ in targets:
+        if found[re_id]["previous_conclusion"] == "Pending":
+            assigned = found[re_id]["assigned_s_id"]
+            released[assigned] = released.get(assigned, 0) + 1
+    for assigned, count in released.items():
+        release_staff(db.session, assigned, "report", count)
+
+    # 3. Ban Category：同一個 (c_id, m_id) 只寫一次
+    bans = sorted({(found[re_id]["c_id"], found[re_id]["owner_m_id"])
+                   for re_id, conclusion in targets if conclusion == "Ban Category"})
+    if bans:
+        BAN_CATEGORIES.execute(db.session, {"s_id": s_id, "ban_at": now,
+                                            "c_ids": [c_id for c_id, _ in bans], "m_ids": [m_id for _, m_id in bans]})
+        bump_eligibility_version(db.session, [m_id for _, m_id in bans])
+
+    # 4. Delist / Ban Category：下架商品、更新 contribution、取消尚未取貨的預約
+    delisted = [re_id for re_id, conclusion in targets if conclusion in ["Delist", "Ban Category"]]
+    canceled = {}
+    active_loans = {}
+    if delisted:
+        delisted_items = sorted({(found[re_id]["owner_m_id"], found[re_id]["i_id"]) for re_id in delisted})
+        DELIST_ITEMS.execute(db.session, {"i_ids": [i_id for _, i_id in delisted_items]})
+        # contribution 的替換規則需逐一檢查 root category，沿用單筆的邏輯
+        for owner_m_id, i_id in delisted_items:
+            change_contribution(db.session, owner_m_id, i_id)
+
+        pairs = sorted({(found[re_id]["owner_m_id"], found[re_id]["c_id"]) for re_id in delisted})
+        pair_params = {"m_ids": [m_id for m_id, _ in pairs], "c_ids": [c_id for _, c_id in pairs]}
+        canceled_rows = CANCEL_PENDING_RESERVATIONS_BATCH.execute(db.session, pair_params).mappings().all()
+        canceled = {(row["m_id"], row["c_id"]): row["r_ids"] for row in canceled_rows}
+        # 取消的預約可能有其他明細已產生 loan，同步從 owner_upcoming_loans 移除
+        remove_upcoming_loans_for_reservations(
+            db.session, sorted({r_id for row in canceled_rows for r_id in row["r_ids"]}))
+
+        # 5. 進行中的借用 (Active Loans) 警示
+        loan_rows = ACTIVE_LOANS_BATCH.execute(db.session, pair_params).mappings().all()
+        active_loans = {(row["m_id"], row["c_id"]): row["i_names"] for row in loan_rows}
+
+    # 同一個 owner / 類別的多筆檢舉，取消的預約只記在第一筆（回傳訊息與事件相同）
+    canceled_by_report = {}
+    for re_id, conclusion in targets:
+        pair = (found[re_id]["owner_m_id"], found[re_id]["c_id"])
+        if conclusion in ["Delist", "Ban Category"] and pair in canceled:
+            canceled_by_report[re_id] = sorted(canceled.pop(pair))
+
+    outbox.enqueue_many(db.session, [
+        outbox.event("report", re_id, "report_concluded", {
+            "re_id": re_id, "s_id": s_id, "i_id": found[re_id]["i_id"], "c_id": found[re_id]["c_id"],
+            "m_id": found[re_id]["owner_m_id"], "r_conclusion": conclusion,
+            "canceled_r_ids": canceled_by_report.get(re_id, []),
+        }, dedup_key=f"report_concluded:{re_id}:{conclusion}")
+        for re_id, conclusion in targets])
+    db.session.commit()
+
+    # 6. 建構每筆的回傳訊息
+    for re_id, conclusion in targets:
+        msg = "Success"
+        if conclusion in ["Delist", "Ban Category"]:
+            pair = (found[re_id]["owner_m_id"], found[re_id]["c_id"])
+            if canceled_by_report.get(re_id):
+                msg += f", canceled {len(canceled_by_report[re_id])} pending reservations"
+            if active_loans.get(pair):
+                msg += f", WARNING: User has {len(active_loans[pair])} active loans (Items: {', '.join(active_loans[pair])})"
+        results[re_id] = {"re_id": re_id, "ok": True, "message": msg}
+    return [results[re_id] for re_id, _ in chunk]
+
+
+def conclude_reports_batch(token: str, data: dict):
+    """
+    處理批次結案檢舉請求。
+
+    接收 [{"re_id", "r_conclusion"}, ...]，每 BATCH_CHUNK_SIZE 筆一個 transaction，
+    某一批失敗只會回滾該批，回傳每個 re_id 的結果。
+    """
+    s_id, active_role = get_user(token)
+    if not s_id:
+        return False, {"message": "Unauthorized"}
+    if active_role != "staff":
+        return False, {"message": "Unauthorized role"}
+    entries = data.get("reports")
+    if not isinstance(entries, list) or not entries:
+        return False, {"message": "reports must be a non-empty list"}
+    if len(entries) > MAX_BATCH_SIZE:
+        return False, {"message": f"At most {MAX_BATCH_SIZE} reports per request"}
+
+    valid, results = _validate_batch(entries, "re_id", "r_conclusion", REPORT_CONCLUSIONS)
+    for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+        chunk = valid[start:start + BATCH_CHUNK_SIZE]
+        try:
+            results.extend(_conclude_report_chunk(s_id, chunk))
+        except Exception as e:
+            print(e)
+            db.session.rollback()
+            results.extend({"re_id": re_id, "ok": False, "message": str(e)} for re_id, _ in chunk)
+    succeeded = sum(1 for result in results if result["ok"])
+    return True, {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+def get_not_deal_verification(token: str, limit: int = 50, order: str = "asc", c_id: int = None,
+                              owner_m_id: int = None, after_create_at: datetime = None, after_id: int = None):
     """
     處理取得未處理的驗證資訊請求。
 
     接收 JWT Token，
-    取得未處理的驗證資訊後回傳。
+    依 create_at 排序、分頁（keyset：上一頁最後一筆的 (create_at, iv_id)）取得未處理的驗證資訊後回傳。
+    可依類別（含子類別）或物品 owner 過濾；沒有待處理的驗證時回傳空陣列。
     """
     s_id, active_role = get_user(token)
     if not s_id:
         return False, "Unauthorized"
     if active_role == "staff":
-        verification_row = db.session.execute(text("""
-            SELECT iv_id, i_id, v_conclusion, create_at
-            FROM item_verification
-            WHERE s_id = :s_id and v_conclusion = 'Pending'
-        """),
-                                              {"s_id": s_id}
-                                              ).mappings().all()
-        if not verification_row:
-            return False, {"message": "No pending verifications"}
-        verifications_list = [dict(row) for row in verification_row]
-        return True, {"verifications": verifications_list}
+        if order not in _QUEUE_ORDERS:
+            return False, "Invalid order"
+        limit = max(1, min(limit, 200))
+        verification_row = NOT_DEAL_VERIFICATIONS[order].execute(
+            db.session,
+            {"s_id": s_id, "c_id": c_id, "owner_m_id": owner_m_id,
+             "after_create_at": after_create_at, "after_id": after_id, "limit": limit + 1}
+        ).mappings().all()
+        verifications_list, next_cursor = _queue_page(verification_row, limit, "iv_id")
+        return True, {"verifications": verifications_list, "next_cursor": next_cursor}
     return False, "Unauthorized"
 
 
+CONCLUDE_VERIFICATION = prepared("conclude_verification", """
+    UPDATE item_verification iv
+    SET v_conclusion = :v_conclusion
+    FROM (
+        SELECT iv_id, s_id, v_conclusion
+        FROM item_verification
+        WHERE iv_id = :iv_id
+        FOR UPDATE
+    ) prev
+    WHERE iv.iv_id = prev.iv_id
+    RETURNING prev.s_id, prev.v_conclusion
+""")
+
+VERIFICATION_ITEM = prepared("verification_item", """
+    SELECT m_id, item.i_id
+    FROM item_verification
+    join item on item_verification.i_id = item.i_id
+    where item_verification.iv_id = :iv_id
+""")
+
+
 def conclude_verification(token: str, iv_id: int, data: dict):
     """
     處理結案驗證請求。
@@ -212,55 +559,24 @@ def conclude_verification(token: str, iv_id: int, data: dict):
     if not s_id:
         return False, {"message": "Unauthorized"}
     if active_role == "staff":
+        if data.get("v_conclusion") not in VERIFICATION_CONCLUSIONS:
+            return False, {"message": "Invalid conclusion"}
         try:
             db.session.execute(text("""
                 SET TRANSACTION ISOLATION LEVEL REPEATABLE READ
             """))
-            db.session.execute(text("""
-                UPDATE item_verification
-                SET v_conclusion = :v_conclusion
-                WHERE iv_id = :iv_id
-            """),
-                               {"v_conclusion": data["v_conclusion"], "iv_id": iv_id}
-                               )
-            result = db.session.execute(text("""
-                    SELECT m_id, item.i_id 
-                    FROM item_verification
-                    join item on item_verification.i_id = item.i_id
-                    where item_verification.iv_id = :iv_id
-                """),
-                                        {"iv_id": iv_id}
-                                        ).mappings().first()
+            previous = CONCLUDE_VERIFICATION.execute(
+                db.session, {"v_conclusion": data["v_conclusion"], "iv_id": iv_id}).mappings().first()
+            if previous and previous["v_conclusion"] == "Pending":
+                release_staff(db.session, previous["s_id"], "verification")
+            result = VERIFICATION_ITEM.execute(db.session, {"iv_id": iv_id}).mappings().first()
             if not result:
                 db.session.rollback()
                 return False, {"message": "Item verification not found"}
             result_dict = dict(result)
-            if data["v_conclusion"] == "Pass":
-                db.session.execute(text("""
-                    update contribution
-                    set is_active = true
-                    where m_id = :m_id and i_id = :i_id
-                """),
-                                   {"m_id": result_dict["m_id"],
-                                       "i_id": result_dict["i_id"]}
-                                   )
-            elif data["v_conclusion"] == "Fail":
-                check_have_contribution = db.session.execute(text("""
-                    SELECT COUNT(*) FROM contribution
-                    WHERE m_id = :m_id and i_id = :i_id
-                """),
-                                                             {"m_id": result_dict["m_id"],
-                                                                 "i_id": result_dict["i_id"]}
-                                                             ).scalar()
-                if check_have_contribution != 0:
-                    db.session.execute(text("""
-                        UPDATE contribution
-                        SET is_active = false
-                        WHERE m_id = :m_id and i_id = :i_id
-                    """),
-                                       {"m_id": result_dict["m_id"],
-                                           "i_id": result_dict["i_id"]}
-                                       )
+            if data["v_conclusion"] in ("Pass", "Fail"):
+                # Pass 啟用、Fail 停用 contribution（沒有 contribution 時不影響），同步更新額度帳本
+                set_contributions_active(db.session, [result_dict["i_id"]], data["v_conclusion"] == "Pass")
             db.session.commit()
 
             return True, {"message": "Success"}
@@ -268,3 +584,76 @@ def conclude_verification(token: str, iv_id: int, data: dict):
             print(e)
             return False, {"message": str(e)}
     return False, {"message": "Unauthorized"}
+
+
+CONCLUDE_VERIFICATIONS = prepared("conclude_verifications", """
+    UPDATE item_verification iv
+    SET v_conclusion = v.v_conclusion
+    FROM unnest(CAST(:iv_ids AS BIGINT[]), CAST(:conclusions AS VARCHAR[])) AS v(iv_id, v_conclusion),
+         (
+             SELECT iv_id, s_id, v_conclusion
+             FROM item_verification
+             WHERE iv_id = ANY(:iv_ids)
+             FOR UPDATE
+         ) prev
+    WHERE iv.iv_id = v.iv_id AND iv.iv_id = prev.iv_id
+    RETURNING iv.iv_id, iv.i_id, v.v_conclusion, prev.s_id, prev.v_conclusion AS previous_conclusion
+""")
+
+
+def _conclude_verification_chunk(chunk: list):
+    """
+    在一個 REPEATABLE READ transaction 內以集合式語句結案一批驗證，回傳每筆的結果。
+    """
+    db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    rows = CONCLUDE_VERIFICATIONS.execute(db.session, {"iv_ids": [iv_id for iv_id, _ in chunk],
+                                                       "conclusions": [conclusion for _, conclusion in chunk]}).mappings().all()
+    updated = {row["iv_id"]: dict(row) for row in rows}
+
+    released = {}
+    for row in updated.values():
+        if row["previous_conclusion"] == "Pending":
+            released[row["s_id"]] = released.get(row["s_id"], 0) + 1
+    for assigned, count in released.items():
+        release_staff(db.session, assigned, "verification", count)
+
+    # Pass 啟用、Fail 停用物品 owner 的 contribution（沒有 contribution 時不影響）
+    for conclusion, is_active in (("Pass", True), ("Fail", False)):
+        i_ids = [row["i_id"] for row in updated.values() if row["v_conclusion"] == conclusion]
+        set_contributions_active(db.session, i_ids, is_active)
+    db.session.commit()
+
+    return [{"iv_id": iv_id, "ok": True, "message": "Success"} if iv_id in updated
+            else {"iv_id": iv_id, "ok": False, "message": "Item verification not found"}
+            for iv_id, _ in chunk]
+
+
+def conclude_verifications_batch(token: str, data: dict):
+    """
+    處理批次結案驗證請求。
+
+    接收 [{"iv_id", "v_conclusion"}, ...]，每 BATCH_CHUNK_SIZE 筆一個 transaction，
+    某一批失敗只會回滾該批，回傳每個 iv_id 的結果。
+    """
+    s_id, active_role = get_user(token)
+    if not s_id:
+        return False, {"message": "Unauthorized"}
+    if active_role != "staff":
+        return False, {"message": "Unauthorized role"}
+    entries = data.get("verifications")
+    if not isinstance(entries, list) or not entries:
+        return False, {"message": "verifications must be a non-empty list"}
+    if len(entries) > MAX_BATCH_SIZE:
+        return False, {"message": f"At most {MAX_BATCH_SIZE} verifications per request"}
+
+    valid, results = _validate_batch(entries, "iv_id", "v_conclusion", VERIFICATION_CONCLUSIONS)
+    for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+        chunk = valid[start:start + BATCH_CHUNK_SIZE]
+        try:
+            results.extend(_conclude_verification_chunk(chunk))
+        except Exception as e:
+            print(e)
+            db.session.rollback()
+            results.extend({"iv_id": iv_id, "ok": False, "message": str(e)} for iv_id, _ in chunk)
+    succeeded = sum(1 for result in results if result["ok"])
+    return True, {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
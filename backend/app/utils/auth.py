@@ -0,0 +1,80 @@
+"""
+Auth middleware
+每個 request 只解析一次 Authorization header，結果放在 g 供 route / service 共用
+"""
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request
+
+from app.utils.jwt_utils import decode_token
+
+
+def load_current_user():
+    """
+    before_request：解析 Bearer token，並將結果存進 g。
+    這裡不擋 request，是否需要登入由 login_required / role_required 決定。
+    """
+    g.auth_token = None
+    g.user_id = None
+    g.active_role = None
+    g.auth_error = "Unauthorized: Missing or invalid token"
+
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return
+
+    token = auth_header.split(" ")[1]  # 取出 "Bearer " 後面的 token 字串
+    if not token:
+        return
+
+    try:
+        payload = decode_token(token)
+    except jwt.ExpiredSignatureError:
+        g.auth_error = "Unauthorized: Token expired"
+        return
+    except jwt.InvalidTokenError:
+        g.auth_error = "Unauthorized: Invalid token"
+        return
+
+    g.auth_token = token
+    g.user_id = payload["user_id"]
+    g.active_role = payload["active_role"]
+
+
+def init_auth(app):
+    """
+    在 create_app 中註冊 auth middleware
+    """
+    app.before_request(load_current_user)
+
+
+def login_required(view):
+    """
+    需要有效 token 的 route。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get("user_id") is None:
+            return jsonify({"error": g.get("auth_error", "Unauthorized")}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def role_required(*roles):
+    """
+    需要有效 token 且 active_role 在 roles 之中的 route。
+
+    範例：
+        @role_required("staff")
+        @role_required("member", "staff")
+    """
+    def decorator(view):
+        @wraps(view)
+        @login_required
+        def wrapper(*args, **kwargs):
+            if g.active_role not in roles:
+                return jsonify({"error": f"Unauthorized: {' or '.join(roles)} only"}), 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
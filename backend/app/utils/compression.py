@@ -0,0 +1,163 @@
+"""
+回應壓縮 middleware
+- 依 Accept-Encoding（含 q 值）選擇 br（有安裝 brotli 時）或 gzip
+- 只壓縮 COMPRESSION_MIMETYPES 中的類型，且大小至少 COMPRESSION_MIN_SIZE bytes；已帶 Content-Encoding 的回應不處理
+- 串流回應（generator、send_file）逐段壓縮，不會先把整個內容讀進記憶體
+- 前端靜態檔可事先產生 .br / .gz（flask compress-frontend），直接回傳而不需每次壓縮
+"""
+import gzip
+import os
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # 未安裝時只提供 gzip
+    brotli = None
+
+# 伺服器偏好的順序（q 值相同時）
+_PREFERRED = ("br", "gzip")
+
+# 預先壓縮檔的副檔名
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def supported_encodings():
+    return tuple(encoding for encoding in _PREFERRED if encoding != "br" or brotli is not None)
+
+
+def negotiate(accept_encoding: str, available=None):
+    """
+    依 Accept-Encoding 回傳要使用的編碼（"br" / "gzip"），都不接受時回傳 None。
+    """
+    available = supported_encodings() if available is None else available
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, level: int, quality: int) -> bytes:
+    """
+    level：gzip 壓縮等級（1-9）；quality：brotli 品質（0-11）。
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=quality)
+    return gzip.compress(data, compresslevel=level)
+
+
+def _stream(source, chunks, encoding: str, level: int, quality: int):
+    """
+    逐段壓縮 chunks；結束（或 client 中斷）時關閉原本的 iterable source（例如 send_file 的檔案）。
+    """
+    try:
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=quality)
+            process, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+            process, finish = compressor.compress, compressor.flush
+        for chunk in chunks:
+            data = process(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(source, "close", None)
+        if close:
+            close()
+
+
+def _add_vary(response):
+    if "accept-encoding" not in response.vary:
+        response.vary.add("Accept-Encoding")
+
+
+def compress_response(response):
+    config = current_app.config
+    if (not config.get("COMPRESSION_ENABLED", True)
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in config.get("COMPRESSION_MIMETYPES", ())):
+        return response
+
+    _add_vary(response)
+    encoding = negotiate(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+    level = config.get("COMPRESSION_LEVEL", 6)
+    quality = config.get("COMPRESSION_BROTLI_QUALITY", 4)
+    min_size = config.get("COMPRESSION_MIN_SIZE", 1024)
+
+    if response.is_streamed or response.direct_passthrough:
+        # 長度已知且小於門檻時不壓縮；未知長度的串流一律壓縮
+        if response.content_length is not None and response.content_length < min_size:
+            return response
+        response.direct_passthrough = False
+        response.response = _stream(response.response, response.iter_encoded(), encoding, level, quality)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding, level, quality))
+
+    response.headers["Content-Encoding"] = encoding
+    # 不同編碼的內容不同，強 ETag 需改為弱 ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def precompress_file(path: str, level: int = 9):
+    """
+    產生 path.gz（以及有 brotli 時的 path.br），回傳產生的檔案路徑。
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    outputs = {"gzip": gzip.compress(data, compresslevel=level)}
+    if brotli is not None:
+        outputs["br"] = brotli.compress(data, quality=11)
+    written = []
+    for encoding, compressed in outputs.items():
+        target = path + PRECOMPRESSED_SUFFIXES[encoding]
+        with open(target, "wb") as f:
+            f.write(compressed)
+        written.append(target)
+    return written
+
+
+def precompressed_variant(path: str, accept_encoding: str):
+    """
+    回傳 (預先壓縮檔路徑, 編碼)；沒有可用或比原檔舊的壓縮檔時回傳 (None, None)。
+    """
+    # 送出預先壓縮的 .br 不需要 brotli 套件
+    available = [encoding for encoding in _PREFERRED
+                 if os.path.exists(path + PRECOMPRESSED_SUFFIXES[encoding])
+                 and os.path.getmtime(path + PRECOMPRESSED_SUFFIXES[encoding]) >= os.path.getmtime(path)]
+    encoding = negotiate(accept_encoding, available)
+    if encoding is None:
+        return None, None
+    return path + PRECOMPRESSED_SUFFIXES[encoding], encoding
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,48 @@
+"""
+orjson 的 Flask JSON provider（取代 stdlib json 的 DefaultJSONProvider）
+- 查詢結果可直接回傳：RowMapping / Row 在序列化時才轉成 object，service 不需要先 [dict(row) for row in ...]
+- datetime / date 一律輸出 ISO-8601（例如 2025-01-01T10:00:00），與分頁游標的 isoformat() 一致
+- Decimal（AVG 評分）輸出為數字；dict 的非字串 key（例如 i_id）轉成字串，與 stdlib 相同
+"""
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+from sqlalchemy.engine import Row, RowMapping
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """
+    orjson 不支援的型別才會進到這裡。
+    """
+    if isinstance(obj, RowMapping):
+        return dict(obj)
+    if isinstance(obj, Row):
+        return dict(obj._mapping)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+class OrjsonProvider(JSONProvider):
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
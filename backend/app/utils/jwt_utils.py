@@ -1,6 +1,16 @@
 import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
-from flask import current_app
+from flask import current_app, g, has_request_context
+
+# 已驗證 token 的 claims 快取（LRU），key 為 token 的 sha256，避免同一 client 每次請求都重新驗簽
+_claims_cache = OrderedDict()
+_claims_cache_lock = threading.Lock()
+
 
 def generate_token(user_id, active_role):
     payload = {
@@ -10,20 +20,76 @@ def generate_token(user_id, active_role):
     }
     return jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
 
+
+def _token_key(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key):
+    """
+    從快取取得 claims；過期 (exp) 的項目會直接移除並視為未命中。
+    """
+    with _claims_cache_lock:
+        payload = _claims_cache.get(key)
+        if payload is None:
+            return None
+        if payload.get("exp") is not None and payload["exp"] <= time.time():
+            del _claims_cache[key]
+            return None
+        _claims_cache.move_to_end(key)
+        return payload
+
+
+def _cache_put(key, payload):
+    max_size = current_app.config.get("JWT_CLAIMS_CACHE_SIZE", 4096)
+    if max_size <= 0:
+        return
+    with _claims_cache_lock:
+        _claims_cache[key] = payload
+        _claims_cache.move_to_end(key)
+        while len(_claims_cache) > max_size:
+            _claims_cache.popitem(last=False)
+
+
+def clear_claims_cache():
+    with _claims_cache_lock:
+        _claims_cache.clear()
+
+
 def decode_token(token):
-    return jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
+    """
+    驗證並解析 token。
+    驗證成功的 claims 會放入 LRU 快取，直到 exp 為止都不需再驗簽。
+    """
+    key = _token_key(token)
+    payload = _cache_get(key)
+    if payload is not None:
+        return payload
+    payload = jwt.decode(
+        token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
+    _cache_put(key, payload)
+    return payload
+
 
 def get_user(token):
+    """
+    回傳 (user_id, active_role)；token 無效或過期時回傳 (None, None)。
+    若 auth middleware 已在這個 request 解析過同一個 token，直接使用 g 中的結果。
+    """
+    if has_request_context() and token and g.get("auth_token") == token:
+        return g.get("user_id"), g.get("active_role")
     try:
         payload = decode_token(token)
         return payload["user_id"], payload["active_role"]
     except jwt.ExpiredSignatureError:
-        return None
+        return None, None
     except jwt.InvalidTokenError:
-        return None
+        return None, None
+
 
 def get_user_id(token):
     return get_user(token)[0]
 
+
 def get_active_role(token):
-    return get_user(token)[1]
\ No newline at end of file
+    return get_user(token)[1]
@@ -0,0 +1,104 @@
+"""
+密碼雜湊子系統
+- 演算法與成本參數由 Config 設定（PASSWORD_HASH_METHOD）
+- 驗證在獨立、有上限的 process pool 執行，避免登入尖峰時 CPU 密集的雜湊卡住其他 request
+- 參數變更後，使用者下次登入成功時會自動以新參數重新雜湊
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = None
+
+
+def _get_pool():
+    """
+    取得（必要時建立）驗證用的 process pool 與其排隊上限，回傳 (pool, slots)；PASSWORD_VERIFY_WORKERS 為 0 時回傳 (None, None)。
+    兩者在 lock 內一起取出，避免另一個 thread 同時 shutdown_pool() 時拿到不一致的組合。
+    """
+    global _pool, _pool_slots
+    workers = current_app.config.get("PASSWORD_VERIFY_WORKERS", 0)
+    if workers <= 0:
+        return None, None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            # 同時排隊的驗證數量上限，超過時 request thread 等待而不是無限堆積
+            _pool_slots = threading.BoundedSemaphore(
+                workers * current_app.config.get("PASSWORD_VERIFY_QUEUE_FACTOR", 4))
+        return _pool, _pool_slots
+
+
+def shutdown_pool(broken=None):
+    """
+    關閉 process pool；有指定 broken 時只在目前的 pool 仍是它時關閉（其他 thread 可能已重建）。
+    """
+    global _pool, _pool_slots
+    with _pool_lock:
+        if broken is not None and _pool is not broken:
+            return
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_slots = None
+
+
+@lru_cache(maxsize=8)
+def _normalize_method(method):
+    """
+    將設定的 method 轉成 werkzeug 實際寫入 hash 的完整形式（例如 "pbkdf2:sha256" -> "pbkdf2:sha256:1000000"）。
+    """
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def _run(fn, *args):
+    """
+    有設定 process pool 時把 CPU 密集的雜湊交給 pool 執行，否則在目前 thread 執行。
+    pool 排隊已滿或執行逾時會丟出（內建的）TimeoutError。
+    """
+    pool, slots = _get_pool()
+    if pool is None:
+        return fn(*args)
+
+    timeout = current_app.config.get("PASSWORD_VERIFY_TIMEOUT", 10)
+    if not slots.acquire(timeout=timeout):
+        raise TimeoutError("password hashing queue is full")
+    try:
+        return pool.submit(fn, *args).result(timeout=timeout)
+    except FutureTimeoutError:
+        # Python 3.10 以前 concurrent.futures.TimeoutError 不是內建的 TimeoutError，統一轉換讓呼叫端只需處理一種
+        raise TimeoutError("password hashing timed out")
+    except BrokenProcessPool:
+        # worker 被系統砍掉時重建 pool，這次改在目前 thread 執行
+        shutdown_pool(pool)
+        return fn(*args)
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    """
+    以目前設定的演算法與成本參數產生密碼雜湊。
+    """
+    return _run(generate_password_hash, password, current_app.config["PASSWORD_HASH_METHOD"])
+
+
+def verify_password(pwhash, password):
+    """
+    驗證密碼是否與已存的 hash 相符。
+    """
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """
+    已存的 hash 與目前設定的演算法 / 成本參數不同時回傳 True。
+    """
+    stored_method = pwhash.split("$", 1)[0]
+    return stored_method != _normalize_method(current_app.config["PASSWORD_HASH_METHOD"])
@@ -0,0 +1,132 @@
+"""
+Prepared statement registry
+- 熱門的 service SQL 在 import 時以 prepared(name, sql) 登記一次；sql 使用與 text() 相同的 :name 參數
+- 執行時每個資料庫連線第一次用到時 PREPARE，之後以 EXECUTE name(...) 執行，
+  PostgreSQL 不必每個 request 重新 parse / analyze，重複執行後也會改用快取的 generic plan
+- PREPARE 是連線層級、不隨 transaction rollback 消失；已 PREPARE 的名稱記在連線的 info（連線池歸還後仍有效），
+  新連線上第一次使用時先查 pg_prepared_statements，避免重複 PREPARE
+- 非 PostgreSQL（例如 sqlite 測試）時退回一般的 text() 執行
+- statement_stats() 回傳 process 內每個語句的 PREPARE / EXECUTE 次數與命中率；
+  connection_plan_stats() 回傳目前連線上各語句的 generic / custom plan 次數（pg_prepared_statements）
+"""
+import re
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# 與 SQLAlchemy text() 相同的參數語法（排除 ::type 轉型）
+_BIND_PARAM = re.compile(r"(?<![:\w\\]):(\w+)(?!:)")
+_COMMENT = re.compile(r"--[^\n]*")
+
+# prepared statement does not exist
+INVALID_SQL_STATEMENT_NAME = "26000"
+
+_registry = {}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class PreparedQuery:
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.text = text(sql)
+        self.param_names = []
+
+        def to_positional(match):
+            param = match.group(1)
+            if param not in self.param_names:
+                self.param_names.append(param)
+            return f"${self.param_names.index(param) + 1}"
+
+        # 去掉 -- 註解（註解中的 ":xxx" 不是參數），再把 :name 換成 $n
+        self.server_sql = _BIND_PARAM.sub(to_positional, _COMMENT.sub("", sql))
+        placeholders = ", ".join(["%s"] * len(self.param_names))
+        self.execute_sql = f"EXECUTE {name}({placeholders})" if self.param_names else f"EXECUTE {name}"
+
+    def execute(self, session, params: dict = None):
+        """
+        以 session 目前的連線（含讀取副本路由）執行，回傳 CursorResult。
+        """
+        params = params or {}
+        connection = session.connection()
+        if connection.dialect.name != "postgresql":
+            return session.execute(self.text, params)
+        prepared = connection.info.setdefault("prepared_statements", set())
+        if self.name not in prepared:
+            self._prepare(connection)
+            prepared.add(self.name)
+        else:
+            _count(self.name, "hits")
+        _count(self.name, "executions")
+        try:
+            return connection.exec_driver_sql(self.execute_sql, tuple(params[name] for name in self.param_names))
+        except DBAPIError as e:
+            # 連線上的 prepared statement 已不存在（例如被 DEALLOCATE ALL）：下次使用時重新 PREPARE
+            if getattr(e.orig, "pgcode", None) == INVALID_SQL_STATEMENT_NAME:
+                prepared.discard(self.name)
+            raise
+
+    def _prepare(self, connection):
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (self.name,))
+            if cursor.fetchone() is None:
+                # 不帶參數執行，SQL 中的 % 不會被當成 placeholder
+                cursor.execute(f"PREPARE {self.name} AS {self.server_sql}")
+                _count(self.name, "prepares")
+            else:
+                _count(self.name, "hits")
+        finally:
+            cursor.close()
+
+
+def prepared(name: str, sql: str) -> PreparedQuery:
+    """
+    登記一個 prepared statement；名稱需唯一（同時是 PostgreSQL 的 prepared statement 名稱）。
+    """
+    if name in _registry:
+        raise ValueError(f"Prepared statement {name} already registered")
+    query = PreparedQuery(name, sql)
+    _registry[name] = query
+    return query
+
+
+def registered():
+    return dict(_registry)
+
+
+def _count(name, key):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {"prepares": 0, "executions": 0, "hits": 0})
+        stats[key] += 1
+
+
+def statement_stats():
+    """
+    {name: {"prepares", "executions", "hits", "hit_ratio"}}：hits 為不需要重新 PREPARE 的執行次數。
+    """
+    with _stats_lock:
+        return {
+            name: dict(stats, hit_ratio=round(stats["hits"] / stats["executions"], 4) if stats["executions"] else None)
+            for name, stats in _stats.items()
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def connection_plan_stats(session):
+    """
+    目前連線上已 PREPARE 的語句：{name: {"generic_plans", "custom_plans"}}（PostgreSQL 14+）。
+    """
+    rows = session.execute(text("""
+        SELECT name, generic_plans, custom_plans
+        FROM pg_prepared_statements
+        WHERE name = ANY(:names)
+    """), {"names": list(_registry)}).mappings().all()
+    return {row["name"]: {"generic_plans": row["generic_plans"], "custom_plans": row["custom_plans"]}
+            for row in rows}
@@ -0,0 +1,197 @@
+"""
+讀取副本（read replica）路由
+- 設定 REPLICA_DATABASE_URL 後多一個 "replica" bind；沒有設定時一切照舊走主庫
+- 以 @read_only 標記純讀取的 service 函式，函式內的 db.session 查詢改送到副本，結束後結束副本上的 transaction
+- 以下情況仍走主庫：
+  1. 呼叫時 session 已經在 transaction 中（可能有尚未 commit 的寫入，或呼叫端需要一致的讀取）
+  2. read-your-writes：成功的寫入 request（POST / PUT / PATCH / DELETE）回傳主庫目前的 WAL 位置（X-Last-Write-LSN header），
+     前端之後的 request 都帶上這個 header；副本尚未套用到該位置時走主庫。狀態在 client 端，多個 worker / 主機也成立
+  3. 副本延遲超過 REPLICA_MAX_LAG_SECONDS（每 REPLICA_LAG_CHECK_SECONDS 秒檢查一次）
+  4. 副本連線失敗：該次呼叫改在主庫重跑，REPLICA_RETRY_SECONDS 秒內不再使用副本
+- 副本延遲與套用位置是 process 內的快取（與 JWT 快取、派工 heap 相同），只影響是否改讀主庫，不影響正確性
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+REPLICA_BIND = "replica"
+LSN_HEADER = "X-Last-Write-LSN"
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+# 主庫上執行時 pg_is_in_recovery() 為 false，延遲視為 0、套用位置為 NULL（不限制）；WAL 已全部套用時延遲也是 0
+_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag,
+    pg_last_wal_replay_lsn()::text AS replay_lsn
+""")
+
+_CURRENT_LSN_SQL = text("SELECT pg_current_wal_lsn()::text")
+
+_use_replica = ContextVar("use_replica", default=False)
+
+_lock = threading.Lock()
+_lag = {"checked_at": 0.0, "ok": False, "replay_lsn": None}
+_down_until = 0.0
+
+
+class RoutingSession(Session):
+    """
+    在 @read_only 範圍內，沒有指定 bind 的查詢改用副本 engine。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica.get():
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_configured():
+    return REPLICA_BIND in current_app.config.get("SQLALCHEMY_BINDS", {})
+
+
+def parse_lsn(value):
+    """
+    "16/B374D848" 形式的 LSN 轉成整數；格式不正確時回傳 None。
+    """
+    try:
+        high, low = value.split("/")
+        return (int(high, 16) << 32) | int(low, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def required_lsn():
+    """
+    request 帶的 X-Last-Write-LSN（使用者最後一次寫入時主庫的 WAL 位置），沒有時回傳 None。
+    """
+    if not has_request_context():
+        return None
+    return parse_lsn(request.headers.get(LSN_HEADER))
+
+
+def replica_caught_up(lsn):
+    """
+    副本（最近一次檢查時）是否已套用到 lsn；快取的位置只會比實際舊，不會讀到使用者自己寫入前的資料。
+    """
+    if lsn is None:
+        return True
+    with _lock:
+        replay_lsn = _lag["replay_lsn"]
+    return replay_lsn is None or replay_lsn >= lsn
+
+
+def mark_replica_down():
+    global _down_until
+    with _lock:
+        _down_until = time.monotonic() + current_app.config.get("REPLICA_RETRY_SECONDS", 30)
+        _lag["checked_at"] = 0.0
+
+
+def replica_healthy():
+    """
+    副本延遲是否在 REPLICA_MAX_LAG_SECONDS 內；結果快取 REPLICA_LAG_CHECK_SECONDS 秒。
+    """
+    config = current_app.config
+    now = time.monotonic()
+    with _lock:
+        if now < _down_until:
+            return False
+        if now - _lag["checked_at"] < config.get("REPLICA_LAG_CHECK_SECONDS", 1):
+            return _lag["ok"]
+    engine = current_app.extensions["sqlalchemy"].engines[REPLICA_BIND]
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(_LAG_SQL).mappings().first()
+        lag = float(row["lag"] or 0)
+        ok = lag <= config.get("REPLICA_MAX_LAG_SECONDS", 5)
+    except DBAPIError:
+        current_app.logger.warning("讀取副本無法連線，改用主庫")
+        mark_replica_down()
+        return False
+    if not ok:
+        current_app.logger.warning(f"讀取副本延遲 {lag:.1f} 秒，改用主庫")
+    with _lock:
+        _lag.update(checked_at=time.monotonic(), ok=ok, replay_lsn=parse_lsn(row["replay_lsn"]))
+    return ok
+
+
+def should_use_replica():
+    if _use_replica.get():
+        return True
+    if not replica_configured():
+        return False
+    session = current_app.extensions["sqlalchemy"].session()
+    if session.in_transaction():
+        return False
+    return replica_healthy() and replica_caught_up(required_lsn())
+
+
+@contextmanager
+def replica_session():
+    """
+    with replica_session() as on_replica: ...
+    範圍內的 db.session 查詢送到副本（on_replica 為 False 時表示仍在主庫）；離開時結束副本上的 transaction。
+    已經在副本範圍內時直接沿用。
+    """
+    if _use_replica.get():
+        yield True
+        return
+    if not should_use_replica():
+        yield False
+        return
+    token = _use_replica.set(True)
+    try:
+        yield True
+    finally:
+        _use_replica.reset(token)
+        current_app.extensions["sqlalchemy"].session.rollback()
+
+
+def read_only(fn):
+    """
+    標記純讀取的 service 函式：可以時在副本執行；副本上發生連線錯誤（或與 WAL 套用衝突被取消）時改在主庫重跑一次。
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        nested = _use_replica.get()
+        on_replica = False
+        try:
+            with replica_session() as on_replica:
+                return fn(*args, **kwargs)
+        except OperationalError as e:
+            if not on_replica or nested:
+                raise
+            current_app.logger.warning(f"讀取副本查詢失敗，改在主庫重新執行: {str(e).splitlines()[0]}")
+            if e.connection_invalidated:
+                mark_replica_down()
+            current_app.extensions["sqlalchemy"].session.rollback()
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def track_writes(response):
+    """
+    after_request：成功的寫入 request 回傳主庫目前的 WAL 位置，前端之後的 request 以 X-Last-Write-LSN 帶回。
+    """
+    if request.method in WRITE_METHODS and response.status_code < 400 and replica_configured():
+        try:
+            with current_app.extensions["sqlalchemy"].engine.connect() as conn:
+                response.headers[LSN_HEADER] = conn.execute(_CURRENT_LSN_SQL).scalar()
+        except DBAPIError as e:
+            current_app.logger.warning(f"無法取得主庫 WAL 位置: {str(e).splitlines()[0]}")
+    return response
+
+
+def init_replica(app):
+    app.after_request(track_writes)
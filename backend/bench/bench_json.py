@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+JSON 序列化 microbenchmark
+比較 get_category_items / get_reviewable_items 回應的序列化時間：
+- stdlib：Flask DefaultJSONProvider，service 先把每列轉成 dict（原本的做法）
+- orjson + dict：OrjsonProvider，仍先轉 dict
+- orjson + RowMapping：OrjsonProvider 直接序列化查詢結果（目前的做法）
+
+預設以 SQLite 產生與實際查詢相同欄位與型別的 RowMapping（不需資料庫）；
+加上 --from-db 時改用 DATABASE_URL 中物品最多的類別與可評論物品最多的會員。
+
+用法：
+    cd backend
+    python bench/bench_json.py --rows 2000 --iterations 200
+    python bench/bench_json.py --from-db
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from sqlalchemy import DateTime, create_engine, text  # noqa: E402
+from app.utils.json_provider import OrjsonProvider  # noqa: E402
+
+STATUSES = ("Borrowed", "Reservable", "Not reservable", "Not verified")
+
+
+def synthetic_payloads(rows):
+    """
+    回傳 {名稱: RowMapping 列表}，欄位與 get_category_items / get_reviewable_items 相同。
+    """
+    engine = create_engine("sqlite://")
+    start = datetime(2025, 1, 1, 9, 30, 15, 123456)
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE TABLE item (i_id INTEGER, i_name TEXT, status TEXT, description TEXT,
+                               out_duration INTEGER, c_id INTEGER)
+        """))
+        conn.execute(text("INSERT INTO item VALUES (:i_id, :i_name, :status, :description, :out_duration, :c_id)"), [
+            {"i_id": i, "i_name": f"物品 {i}", "status": STATUSES[i % len(STATUSES)],
+             "description": "可借用的物品說明" * 5, "out_duration": 7 + i % 14, "c_id": i % 30}
+            for i in range(rows)])
+        conn.execute(text("""
+            CREATE TABLE reviewable (review_target TEXT, l_id INTEGER, i_id INTEGER, i_name TEXT,
+                                     object_name TEXT, actual_return_at TIMESTAMP)
+        """))
+        conn.execute(text("INSERT INTO reviewable VALUES (:review_target, :l_id, :i_id, :i_name, :object_name, :at)"), [
+            {"review_target": "owner" if i % 2 else "borrower", "l_id": i, "i_id": i, "i_name": f"物品 {i}",
+             "object_name": f"會員 {i % 97}", "at": start + timedelta(hours=i)}
+            for i in range(rows)])
+        category_items = conn.execute(text("SELECT * FROM item")).mappings().all()
+        reviewable_items = conn.execute(
+            text("SELECT * FROM reviewable").columns(actual_return_at=DateTime)).mappings().all()
+    return {
+        "get_category_items": ("items", category_items),
+        "get_reviewable_items": ("reviewable_items", reviewable_items),
+    }
+
+
+def db_payloads():
+    from app.extensions import db
+    from app.utils.jwt_utils import generate_token
+    from app.services import item_service, me_service
+    from bench.workload import create_bench_app
+
+    app = create_bench_app()
+    with app.app_context():
+        c_id = db.session.execute(text("""
+            SELECT c_id FROM item GROUP BY c_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)).scalar()
+        m_id = db.session.execute(text("""
+            SELECT r.m_id FROM loan l
+            JOIN reservation_detail rd ON l.rd_id = rd.rd_id AND l.est_start_at = rd.est_start_at
+            JOIN reservation r ON rd.r_id = r.r_id
+            WHERE l.status = 'Returned'
+            GROUP BY r.m_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)).scalar()
+        _, category_items = item_service.get_category_items(c_id)
+        _, reviewable_items = me_service.get_reviewable_items(generate_token(m_id, "member"))
+        db.session.remove()
+    return {
+        "get_category_items": ("items", category_items["items"]),
+        "get_reviewable_items": ("reviewable_items", reviewable_items["reviewable_items"]),
+    }
+
+
+def measure(fn, iterations):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON provider microbenchmark")
+    parser.add_argument("--rows", type=int, default=1000, help="合成資料的列數")
+    parser.add_argument("--iterations", type=int, default=200, help="每種序列化方式的執行次數")
+    parser.add_argument("--from-db", action="store_true", help="改用 DATABASE_URL 的實際查詢結果")
+    args = parser.parse_args()
+
+    payloads = db_payloads() if args.from_db else synthetic_payloads(args.rows)
+    app = Flask(__name__)
+    stdlib = DefaultJSONProvider(app)
+    fast = OrjsonProvider(app)
+
+    print(f"{'payload':<24}{'rows':>7}{'stdlib ms':>12}{'orjson+dict':>14}{'orjson+row':>13}{'speedup':>10}{'bytes':>10}")
+    for name, (key, rows) in payloads.items():
+        baseline = measure(lambda: stdlib.response({key: [dict(row) for row in rows]}), args.iterations)
+        with_dict = measure(lambda: fast.response({key: [dict(row) for row in rows]}), args.iterations)
+        direct = measure(lambda: fast.response({key: rows}), args.iterations)
+        size = len(fast.response({key: rows}).get_data())
+        print(f"{name:<24}{len(rows):>7}{baseline:>12.3f}{with_dict:>14.3f}{direct:>13.3f}"
+              f"{baseline / direct:>9.1f}x{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
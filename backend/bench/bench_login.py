@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+登入密碼驗證 benchmark
+量測目前 PASSWORD_HASH_METHOD 下，每個 worker 每秒能完成幾次登入驗證，
+並比較「request thread 直接驗證」與「交給 process pool 驗證」兩種模式。
+
+用法：
+    cd backend
+    python bench/bench_login.py --threads 16 --seconds 5
+    PASSWORD_HASH_METHOD=scrypt:32768:8:1 python bench/bench_login.py
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.utils.password import hash_password, verify_password, shutdown_pool  # noqa: E402
+
+
+def run(app, threads, seconds, pw_hash):
+    """
+    以 threads 個 thread 持續驗證密碼 seconds 秒，回傳 (完成次數, 實際秒數)
+    """
+    done = [0] * threads
+    stop_at = time.perf_counter() + seconds
+
+    def worker(idx):
+        with app.app_context():
+            while time.perf_counter() < stop_at:
+                if not verify_password(pw_hash, "benchmark-password"):
+                    raise RuntimeError("verification failed")
+                done[idx] += 1
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(done), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="logins/sec per worker benchmark")
+    parser.add_argument("--threads", type=int, default=8, help="同時登入的 request thread 數")
+    parser.add_argument("--seconds", type=float, default=5, help="每個模式量測秒數")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="process pool 大小（預設使用 PASSWORD_VERIFY_WORKERS）")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    workers = args.workers if args.workers is not None else app.config["PASSWORD_VERIFY_WORKERS"]
+
+    print(f"🔐 hash method: {app.config['PASSWORD_HASH_METHOD']}")
+    print(f"   threads: {args.threads}, seconds: {args.seconds}\n")
+
+    app.config["PASSWORD_VERIFY_WORKERS"] = 0
+    with app.app_context():
+        pw_hash = hash_password("benchmark-password")
+
+    count, elapsed = run(app, args.threads, args.seconds, pw_hash)
+    print(f"📋 inline (request thread): {count / elapsed:8.1f} logins/sec total")
+
+    if workers > 0:
+        app.config["PASSWORD_VERIFY_WORKERS"] = workers
+        count, elapsed = run(app, args.threads, args.seconds, pw_hash)
+        shutdown_pool()
+        print(f"📋 process pool ({workers} procs): {count / elapsed:8.1f} logins/sec total"
+              f"（{count / elapsed / workers:.1f} per proc）")
+
+
+if __name__ == "__main__":
+    main()
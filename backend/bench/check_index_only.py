@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Index-only scan 檢查
+1. VACUUM (ANALYZE) 相關資料表（更新 visibility map，index-only scan 才不需要回表）
+2. 呼叫 service 函式，以 SQLAlchemy event 攔截實際執行的 SQL 與參數
+3. 對每個語句做 EXPLAIN (ANALYZE, FORMAT JSON)，確認預期的資料表都是 Index Only Scan，並列出使用的 index 與 Heap Fetches
+
+任一資料表不是 Index Only Scan 時以 exit code 1 結束。
+SetDB.py 產生的資料集很小，planner 可能認為 Seq Scan 更便宜；加上 --disable-seqscan 可只確認 index 是否可用。
+
+用法：
+    cd backend
+    python bench/check_index_only.py
+    python bench/check_index_only.py --disable-seqscan
+"""
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import event, text  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.utils.jwt_utils import generate_token  # noqa: E402
+from app.services import item_service, me_service, reservation_service  # noqa: E402
+from bench.workload import create_bench_app  # noqa: E402
+
+TABLES = ["reservation", "reservation_detail", "item_pick", "pick_up_place", "item", "category",
+          "contribution", "category_ban"]
+
+
+def build_cases():
+    """
+    [(名稱, 無參數 callable, 預期 Index Only Scan 的資料表)]；參數取自有資料的物品與會員。
+    """
+    pickup_i_id = db.session.execute(text("""
+        SELECT i_id FROM item_pick WHERE is_deleted = false ORDER BY i_id LIMIT 1
+    """)).scalar()
+    borrowed_i_id = db.session.execute(text("""
+        SELECT i_id FROM reservation_detail WHERE est_due_at >= CURRENT_DATE ORDER BY i_id LIMIT 1
+    """)).scalar()
+    owner_m_id = db.session.execute(text("SELECT m_id FROM item ORDER BY m_id LIMIT 1")).scalar()
+    contributor_m_id = db.session.execute(text("""
+        SELECT m_id FROM contribution ORDER BY m_id LIMIT 1
+    """)).scalar()
+
+    cases = []
+    if pickup_i_id is not None:
+        cases.append(("get_pickup_places", lambda: reservation_service.get_pickup_places(pickup_i_id),
+                      ["item_pick", "pick_up_place"]))
+    if borrowed_i_id is not None:
+        cases.append(("get_item_borrowed_time", lambda: item_service.get_item_borrowed_time(borrowed_i_id),
+                      ["reservation_detail", "reservation"]))
+    if owner_m_id is not None:
+        token = generate_token(owner_m_id, "member")
+        cases.append(("get_my_items", lambda: me_service.get_my_items(token), ["item"]))
+    if contributor_m_id is not None:
+        token = generate_token(contributor_m_id, "member")
+        cases.append(("get_contributions_and_bans", lambda: me_service.get_contributions_and_bans(token),
+                      ["contribution", "item", "category", "category_ban"]))
+    return cases
+
+
+def capture_statements(fn):
+    """
+    執行 fn，回傳期間送到資料庫的 [(statement, parameters)]。
+    """
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def _walk(plan, scans):
+    if "Relation Name" in plan:
+        scans.append(plan)
+    for child in plan.get("Plans", []):
+        _walk(child, scans)
+
+
+def scan_nodes(statement, parameters, disable_seqscan):
+    """
+    EXPLAIN ANALYZE 單一語句，回傳所有掃描資料表的節點。
+    """
+    connection = db.session.connection()
+    if disable_seqscan:
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        connection.exec_driver_sql("SET LOCAL enable_bitmapscan = off")
+    plan = connection.exec_driver_sql(
+        "EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters or {}).scalar()
+    db.session.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    _walk(plan[0]["Plan"], scans)
+    return scans
+
+
+def _table_of(relation):
+    # 分區（例如 reservation_detail_p2025_01、reservation_detail_default）歸到父表
+    for table in TABLES:
+        if relation == table or relation.startswith(table + "_p") or relation == table + "_default":
+            return table
+    return relation
+
+
+def vacuum(tables):
+    conn = psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI.replace("postgresql+psycopg2://", "postgresql://"))
+    conn.autocommit = True
+    cursor = conn.cursor()
+    for table in tables:
+        cursor.execute(f"VACUUM (ANALYZE) {table}")
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check index-only scans of hot service queries")
+    parser.add_argument("--disable-seqscan", action="store_true",
+                        help="關閉 seq scan / bitmap scan（小資料集時確認 index 是否可用）")
+    parser.add_argument("--no-vacuum", action="store_true", help="不先執行 VACUUM (ANALYZE)")
+    args = parser.parse_args()
+
+    if not Config.SQLALCHEMY_DATABASE_URI:
+        print("❌ 錯誤: 請設定 DATABASE_URL 環境變數")
+        return 1
+
+    if not args.no_vacuum:
+        print("📋 VACUUM (ANALYZE)...")
+        vacuum(TABLES)
+
+    app = create_bench_app()
+    failed = 0
+    with app.app_context():
+        for name, fn, expected in build_cases():
+            statements = capture_statements(fn)
+            db.session.rollback()
+            seen = {}
+            for statement, parameters in statements:
+                for node in scan_nodes(statement, parameters, args.disable_seqscan):
+                    seen.setdefault(_table_of(node["Relation Name"]), []).append(node)
+            print(f"\n🔎 {name}")
+            for table in expected:
+                nodes = seen.get(table, [])
+                ok = bool(nodes) and all(node["Node Type"] == "Index Only Scan" for node in nodes)
+                failed += not ok
+                for node in nodes or [{"Node Type": "（未掃描）"}]:
+                    detail = (f"{node.get('Index Name', '-')}, heap fetches {node.get('Heap Fetches', '-')}"
+                              if "Relation Name" in node else "")
+                    print(f"   {'✅' if ok else '❌'} {table:<20}{node['Node Type']:<20}{detail}")
+        db.session.remove()
+
+    if failed:
+        print(f"\n❌ {failed} 個資料表沒有使用 index-only scan")
+        return 1
+    print("\n✅ 所有預期的資料表都使用 index-only scan")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
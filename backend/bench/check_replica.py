@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+讀取副本路由檢查（兩個本機 PostgreSQL instance 即可，例如 5432 為主庫、5433 為 streaming replica）
+1. 量測副本延遲
+2. @read_only 範圍內的查詢是否送到副本（以 inet_server_port() 區分）
+3. read-your-writes：寫入回應的 X-Last-Write-LSN 帶回時（副本尚未套用到該位置）走主庫，沒有帶時仍讀副本
+4. 已在 transaction 中時走主庫
+
+用法：
+    cd backend
+    DATABASE_URL=postgresql://...:5432/db REPLICA_DATABASE_URL=postgresql://...:5433/db python bench/check_replica.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import text  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.utils import replica  # noqa: E402
+from bench.workload import create_bench_app  # noqa: E402
+
+
+def served_by():
+    @replica.read_only
+    def port():
+        return db.session.execute(text("SELECT inet_server_port()")).scalar()
+    result = port()
+    db.session.rollback()
+    return result
+
+
+def main():
+    if not Config.SQLALCHEMY_DATABASE_URI or not Config.SQLALCHEMY_BINDS.get(replica.REPLICA_BIND):
+        print("❌ 錯誤: 請設定 DATABASE_URL 與 REPLICA_DATABASE_URL 環境變數")
+        return 1
+
+    app = create_bench_app()
+    failed = 0
+
+    def check(name, ok, detail):
+        nonlocal failed
+        failed += not ok
+        print(f"   {'✅' if ok else '❌'} {name:<36}{detail}")
+
+    with app.app_context():
+        primary_port = db.session.execute(text("SELECT inet_server_port()")).scalar()
+        db.session.rollback()
+        with db.engines[replica.REPLICA_BIND].connect() as conn:
+            replica_port = conn.execute(text("SELECT inet_server_port()")).scalar()
+            lag = conn.execute(replica._LAG_SQL).scalar()
+        print(f"📋 主庫 port {primary_port}，副本 port {replica_port}，副本延遲 {float(lag):.3f} 秒"
+              f"（上限 {app.config['REPLICA_MAX_LAG_SECONDS']} 秒）")
+
+        port = served_by()
+        check("@read_only 讀副本", port == replica_port or not replica.replica_healthy(), f"port {port}")
+
+        db.session.execute(text("SELECT 1"))
+        port = served_by()
+        check("transaction 中走主庫", port == primary_port, f"port {port}")
+        db.session.rollback()
+
+    with app.test_request_context("/", method="POST"):
+        response = replica.track_writes(app.response_class(status=200))
+        lsn = response.headers.get(replica.LSN_HEADER)
+        check("寫入回應帶有 WAL 位置", lsn is not None, f"{lsn}")
+        db.session.remove()
+
+    # 寫入後立即讀取：快取的副本套用位置在寫入之前，必定走主庫
+    with app.test_request_context("/", headers={replica.LSN_HEADER: lsn or ""}):
+        port = served_by()
+        check("帶 X-Last-Write-LSN 走主庫", port == primary_port, f"port {port}")
+        db.session.remove()
+    with app.test_request_context("/"):
+        port = served_by()
+        check("沒有帶 header 仍讀副本", port == replica_port or not replica.replica_healthy(), f"port {port}")
+        db.session.remove()
+
+    if failed:
+        print(f"\n❌ {failed} 項檢查失敗")
+        return 1
+    print("\n✅ 讀取副本路由正常")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
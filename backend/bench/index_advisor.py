@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Missing-index advisor
+1. 重設 pg_stat_statements，執行 bench/workload.py 的唯讀 workload
+2. 對最耗時的查詢做 EXPLAIN (GENERIC_PLAN)（PostgreSQL 16+），找出大表上的 Seq Scan
+   以及它們的等值過濾 / join 欄位
+3. 排除已有相同前導欄位的 index 後，產生 CREATE INDEX CONCURRENTLY 的 migration 檔
+   （app/db/migrations/NNNN_index_advisor.sql）
+4. 加上 --apply 時直接建立 index，並重跑 workload，列出每個查詢前後的平均延遲
+
+需求：postgresql.conf 的 shared_preload_libraries 需包含 pg_stat_statements
+
+用法：
+    cd backend
+    python bench/index_advisor.py                 # 只產生建議與 migration 檔
+    python bench/index_advisor.py --apply         # 建立 index 並量測前後延遲
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.config import Config  # noqa: E402
+from bench.workload import create_bench_app, run_workload  # noqa: E402
+
+MIGRATIONS_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "..", "app", "db", "migrations"))
+
+# 只分析 workload 會碰到的應用程式資料表
+_APP_TABLE_FILTER = r"\m(item|member|category|reservation|reservation_detail|loan|loan_event|review|contribution|category_ban|report|item_verification|item_pick|pick_up_place|staff|owner_upcoming_loans)\M"
+
+# 等值條件左側的欄位，例如 "(m_id = $1)"、"((status)::text = 'Pending'::text)"、"(rd.i_id = i.i_id)"
+_EQ_COLUMN = re.compile(r"\b(?:(\w+)\.)?(\w+)\)?(?:::[a-z ]+?)?\s*=\s*")
+
+
+def collect_statements(cursor, limit):
+    """
+    取得目前資料庫中最耗時的查詢：[(queryid, query, calls, mean_ms)]
+    """
+    cursor.execute("""
+        SELECT s.queryid, s.query, s.calls, s.mean_exec_time
+        FROM pg_stat_statements s
+        JOIN pg_database d ON s.dbid = d.oid
+        WHERE d.datname = current_database()
+        AND s.query ~* %s
+        AND s.query !~* '^\\s*(EXPLAIN|SET|BEGIN|COMMIT|ROLLBACK)'
+        ORDER BY s.total_exec_time DESC
+        LIMIT %s
+    """, (_APP_TABLE_FILTER, limit))
+    return cursor.fetchall()
+
+
+def _walk(plan, seq_scans, conditions):
+    for key in ("Hash Cond", "Merge Cond", "Join Filter", "Index Cond", "Recheck Cond"):
+        if key in plan:
+            conditions.append(plan[key])
+    if plan.get("Node Type") == "Seq Scan":
+        seq_scans.append(plan)
+    for child in plan.get("Plans", []):
+        _walk(child, seq_scans, conditions)
+
+
+def candidate_indexes(cursor, query, min_rows, table_columns, table_rows):
+    """
+    對單一查詢做 EXPLAIN (GENERIC_PLAN)，回傳 {(table, (col, ...))}
+    """
+    try:
+        cursor.execute("EXPLAIN (GENERIC_PLAN, FORMAT JSON) " + query)
+    except psycopg2.Error as e:
+        cursor.connection.rollback()
+        print(f"   ⚠️  無法 EXPLAIN: {str(e).splitlines()[0][:80]}")
+        return set()
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    seq_scans, conditions = [], []
+    _walk(plan[0]["Plan"], seq_scans, conditions)
+
+    candidates = set()
+    for scan in seq_scans:
+        table = scan.get("Relation Name")
+        alias = scan.get("Alias", table)
+        if table not in table_columns or table_rows.get(table, 0) < min_rows:
+            continue
+        columns = []
+        # 這個 relation 自己的過濾條件（未加 alias 的欄位）
+        for qualifier, column in _EQ_COLUMN.findall(scan.get("Filter", "")):
+            if qualifier in ("", alias) and column in table_columns[table] and column not in columns:
+                columns.append(column)
+        # 上層 join 條件中屬於這個 relation 的欄位
+        for cond in conditions:
+            for qualifier, column in re.findall(r"\b(\w+)\.(\w+)\b", cond):
+                if qualifier == alias and column in table_columns[table] and column not in columns:
+                    columns.append(column)
+        if columns:
+            candidates.add((table, tuple(columns[:3])))
+    return candidates
+
+
+def existing_index_prefixes(cursor):
+    """
+    {table: [(col, ...), ...]}：每個現有 index 的欄位順序
+    """
+    cursor.execute("""
+        SELECT t.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname = 'public'
+        GROUP BY t.relname, ix.indexrelid
+    """)
+    result = {}
+    for table, columns in cursor.fetchall():
+        result.setdefault(table, []).append(tuple(columns))
+    return result
+
+
+def is_covered(table, columns, existing):
+    return any(idx[:len(columns)] == columns for idx in existing.get(table, []))
+
+
+def load_table_rows(cursor):
+    """
+    {table: 預估列數}（pg_class.reltuples）
+    """
+    cursor.execute("""
+        SELECT c.relname, c.reltuples
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    """)
+    return dict(cursor.fetchall())
+
+
+def load_table_columns(cursor):
+    cursor.execute("""
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+    """)
+    result = {}
+    for table, column in cursor.fetchall():
+        result.setdefault(table, set()).add(column)
+    return result
+
+
+def next_migration_path(name):
+    os.makedirs(MIGRATIONS_DIR, exist_ok=True)
+    # 與 migrate.discover_migrations 相同：.sql 與 .py 共用版本號
+    versions = [int(match.group(1)) for match in (re.match(r"^(\d+)_(\w+)\.(sql|py)$", f)
+                                                  for f in os.listdir(MIGRATIONS_DIR)) if match]
+    version = max(versions, default=0) + 1
+    return os.path.join(MIGRATIONS_DIR, f"{version:04d}_{name}.sql")
+
+
+def index_ddl(table, columns):
+    name = f"idx_{table}_{'_'.join(columns)}"[:63]
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}({', '.join(columns)});"
+
+
+def snapshot(cursor, limit):
+    return {row[0]: row for row in collect_statements(cursor, limit)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pg_stat_statements driven index advisor")
+    parser.add_argument("--iterations", type=int, default=50, help="workload 每個查詢執行次數")
+    parser.add_argument("--top", type=int, default=30, help="分析最耗時的前幾個查詢")
+    parser.add_argument("--min-rows", type=int, default=1000, help="資料表列數低於此值時忽略其 Seq Scan")
+    parser.add_argument("--apply", action="store_true", help="直接建立 index 並量測前後延遲")
+    args = parser.parse_args()
+
+    if not Config.SQLALCHEMY_DATABASE_URI:
+        print("❌ 錯誤: 請設定 DATABASE_URL 環境變數")
+        return
+
+    app = create_bench_app()
+    conn = psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI.replace("postgresql+psycopg2://", "postgresql://"))
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    print("📋 步驟 1: 啟用並重設 pg_stat_statements...")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+        cursor.execute("SELECT pg_stat_statements_reset()")
+    except psycopg2.Error as e:
+        print(f"❌ 無法使用 pg_stat_statements: {e}")
+        print("   💡 提示: 請在 postgresql.conf 設定 shared_preload_libraries = 'pg_stat_statements' 後重啟")
+        conn.close()
+        return
+
+    print(f"\n📋 步驟 2: 執行 workload（每個查詢 {args.iterations} 次）...")
+    before_workload = run_workload(app, args.iterations)
+    before = snapshot(cursor, args.top)
+
+    print("\n📋 步驟 3: 分析查詢計畫...")
+    table_columns = load_table_columns(cursor)
+    table_rows = load_table_rows(cursor)
+    existing = existing_index_prefixes(cursor)
+    proposals = []
+    for queryid, query, calls, mean_ms in before.values():
+        for table, columns in sorted(candidate_indexes(cursor, query, args.min_rows, table_columns, table_rows)):
+            if is_covered(table, columns, existing) or (table, columns) in proposals:
+                continue
+            proposals.append((table, columns))
+            print(f"   💡 {table}({', '.join(columns)})  <- {mean_ms:.3f} ms x {calls}: {' '.join(query.split())[:70]}")
+
+    if not proposals:
+        print("✅ 沒有需要新增的 index")
+        conn.close()
+        return
+
+    path = next_migration_path("index_advisor")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("-- 由 bench/index_advisor.py 產生\n")
+        for table, columns in proposals:
+            f.write(index_ddl(table, columns) + "\n")
+    print(f"\n✅ 已寫入 migration: {os.path.relpath(path)}")
+
+    if not args.apply:
+        conn.close()
+        return
+
+    print("\n📋 步驟 4: 建立 index...")
+    for table, columns in proposals:
+        ddl = index_ddl(table, columns)
+        try:
+            cursor.execute(ddl)
+            print(f"   ✅ {ddl}")
+        except psycopg2.Error as e:
+            print(f"   ⚠️  {ddl} 失敗: {str(e)[:80]}")
+    cursor.execute("ANALYZE")
+
+    print("\n📋 步驟 5: 重新執行 workload 並比較延遲...")
+    cursor.execute("SELECT pg_stat_statements_reset()")
+    after_workload = run_workload(app, args.iterations)
+    after = snapshot(cursor, args.top * 2)
+
+    print(f"\n{'query':<60}{'before ms':>12}{'after ms':>12}")
+    for queryid, query, _, mean_ms in before.values():
+        if queryid in after:
+            print(f"{' '.join(query.split())[:58]:<60}{mean_ms:>12.3f}{after[queryid][3]:>12.3f}")
+    print(f"\n{'service call':<60}{'before ms':>12}{'after ms':>12}")
+    for name, ms in before_workload.items():
+        print(f"{name:<60}{ms:>12.3f}{after_workload.get(name, float('nan')):>12.3f}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+唯讀 benchmark workload
+直接呼叫 service 層的查詢函式（與線上 request 執行相同的 SQL），
+用來量測查詢延遲，也是 index advisor 收集 pg_stat_statements 的來源。
+
+用法：
+    cd backend
+    python bench/workload.py --iterations 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.utils.jwt_utils import generate_token  # noqa: E402
+from app.services import item_service, me_service, reservation_service, pickup_places_service, owner_service, staff_service  # noqa: E402
+
+
+def create_bench_app():
+    """
+    只初始化 SQLAlchemy 的 Flask app（不連 MongoDB、不註冊 route）
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+
+def _sample(sql, k):
+    rows = db.session.execute(text(sql)).scalars().all()
+    if not rows:
+        return []
+    return random.sample(rows, min(k, len(rows)))
+
+
+def build_workload(sample_size=50):
+    """
+    從資料庫取樣參數，回傳 [(名稱, 無參數 callable), ...]。
+    需在 app context 中呼叫。
+    """
+    members = _sample("SELECT DISTINCT m_id FROM item", sample_size)
+    staff = _sample("SELECT s_id FROM staff WHERE is_deleted = false", sample_size)
+    items = _sample("SELECT i_id FROM item", sample_size)
+    categories = _sample("SELECT c_id FROM category", sample_size)
+    reservations = _sample("SELECT r_id FROM reservation WHERE is_deleted = false", sample_size)
+
+    member_tokens = [generate_token(m_id, "member") for m_id in members]
+    staff_tokens = [generate_token(s_id, "staff") for s_id in staff]
+
+    def pick(values):
+        return random.choice(values)
+
+    workload = []
+    if items:
+        workload += [
+            ("get_item_detail", lambda: item_service.get_item_detail(pick(items))),
+            ("get_item_borrowed_time", lambda: item_service.get_item_borrowed_time(pick(items))),
+            ("get_items_availability", lambda: item_service.get_items_availability(
+                random.sample(items, min(10, len(items))), datetime.now(), datetime.now() + timedelta(days=30))),
+            ("get_pickup_places", lambda: reservation_service.get_pickup_places(pick(items))),
+        ]
+    if categories:
+        workload += [
+            ("get_category_items", lambda: item_service.get_category_items(pick(categories))),
+            ("get_subcategory", lambda: item_service.get_subcategory(pick(categories))),
+        ]
+    if member_tokens:
+        workload += [
+            ("get_profile_service", lambda: me_service.get_profile_service(pick(member_tokens))),
+            ("get_my_items", lambda: me_service.get_my_items(pick(member_tokens))),
+            ("get_my_reservations", lambda: me_service.get_my_reservations(pick(member_tokens))),
+            ("get_reviewable_items", lambda: me_service.get_reviewable_items(pick(member_tokens))),
+            ("get_contributions_and_bans", lambda: me_service.get_contributions_and_bans(pick(member_tokens))),
+            # 帶游標呼叫，避免第一頁的 lazy trigger 寫入 loan
+            ("get_upcoming_loans", lambda: owner_service.get_upcoming_loans(
+                pick(member_tokens), 20, datetime.min, 0)),
+        ]
+        if reservations:
+            workload.append(("get_reservation_detail", lambda: me_service.get_reservation_detail(
+                pick(member_tokens), pick(reservations))))
+    if staff_tokens:
+        workload += [
+            ("get_not_deal_reports", lambda: staff_service.get_not_deal_reports(pick(staff_tokens))),
+            ("get_not_deal_verification", lambda: staff_service.get_not_deal_verification(pick(staff_tokens))),
+            ("get_queue_counts", lambda: staff_service.get_queue_counts(pick(staff_tokens))),
+        ]
+    workload.append(("get_all_pickup_places", pickup_places_service.get_all_pickup_places))
+    return workload
+
+
+def run_workload(app, iterations=100, sample_size=50, seed=0):
+    """
+    每個查詢各執行 iterations 次，回傳 {名稱: 平均毫秒}
+    """
+    random.seed(seed)
+    with app.app_context():
+        workload = build_workload(sample_size)
+        timings = {}
+        for name, fn in workload:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+                db.session.rollback()  # 唯讀 workload，每次結束 transaction
+            timings[name] = (time.perf_counter() - start) * 1000 / iterations
+        db.session.remove()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="read-only service workload")
+    parser.add_argument("--iterations", type=int, default=100, help="每個查詢執行次數")
+    parser.add_argument("--sample-size", type=int, default=50, help="每種參數取樣數")
+    args = parser.parse_args()
+
+    if not Config.SQLALCHEMY_DATABASE_URI:
+        print("❌ 錯誤: 請設定 DATABASE_URL 環境變數")
+        return
+
+    timings = run_workload(create_bench_app(), args.iterations, args.sample_size)
+    print(f"{'query':<30}{'avg ms':>10}")
+    for name, ms in sorted(timings.items(), key=lambda kv: -kv[1]):
+        print(f"{name:<30}{ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,12 +12,26 @@ function getSessionId() {
     return sessionId;
 }
 
+// 寫入的回應帶有主庫的 WAL 位置，之後的請求帶回，讓後端在讀取副本追上之前改讀主庫（read-your-writes）
+axios.interceptors.response.use((response) => {
+    const lsn = response.headers['x-last-write-lsn'];
+    if (lsn) {
+        localStorage.setItem('last_write_lsn', lsn);
+    }
+    return response;
+});
+
 // 取得請求 headers（包含 Session ID 和 Token）
 function getHeaders(includeAuth = false) {
     const headers = {
         'X-Session-ID': getSessionId(),
         'Content-Type': 'application/json'
     };
+
+    const lastWriteLsn = localStorage.getItem('last_write_lsn');
+    if (lastWriteLsn) {
+        headers['X-Last-Write-LSN'] = lastWriteLsn;
+    }
     
     if (includeAuth) {
         const token = localStorage.getItem('token');
@@ -78,6 +92,40 @@ const api = {
         return response.data;
     },
 
+    async getItemsAvailability(i_ids, { start = null, end = null } = {}) {
+        const params = { i_ids: i_ids.join(',') };
+        if (start) params.start = start;
+        if (end) params.end = end;
+        const response = await axios.get(`${API_BASE_URL}/item/availability`, {
+            params,
+            headers: getHeaders()
+        });
+        return response.data;
+    },
+
+    async findAvailableItems(c_id, start, end, { p_id = null, limit = 20, cursor = null } = {}) {
+        const params = { start, end, limit };
+        if (p_id) params.p_id = p_id;
+        if (cursor) Object.assign(params, cursor);
+        const response = await axios.get(`${API_BASE_URL}/item/category/${c_id}/available`, {
+            params,
+            headers: getHeaders()
+        });
+        return response.data;
+    },
+
+    async searchItems(q, { c_id = null, status = null, limit = 20, cursor = null } = {}) {
+        const params = { q, limit };
+        if (c_id) params.c_id = c_id;
+        if (status) params.status = status;
+        if (cursor) Object.assign(params, cursor);
+        const response = await axios.get(`${API_BASE_URL}/item/search`, {
+            params,
+            headers: getHeaders()
+        });
+        return response.data;
+    },
+
     async uploadItem(data) {
         const response = await axios.post(`${API_BASE_URL}/item/upload`, data, {
             headers: getHeaders(true)
@@ -160,6 +208,16 @@ const api = {
     },
 
     // 物主相關
+    async getOverdueLoans({ limit = 20, cursor = null } = {}) {
+        const params = { limit };
+        if (cursor) Object.assign(params, cursor);
+        const response = await axios.get(`${API_BASE_URL}/owner/overdue`, {
+            params,
+            headers: getHeaders(true)
+        });
+        return response.data;
+    },
+
     async getFutureReservationDetails() {
         const response = await axios.get(`${API_BASE_URL}/owner/future_reservation_details`, {
             headers: getHeaders(true)
@@ -176,6 +234,15 @@ const api = {
         return response.data;
     },
 
+    async punchInLoans(events) {
+        const response = await axios.post(`${API_BASE_URL}/owner/punch_in_loans`, {
+            events
+        }, {
+            headers: getHeaders(true)
+        });
+        return response.data;
+    },
+
     // 預約相關
     async createReservation(rd_list) {
         const response = await axios.post(`${API_BASE_URL}/reservation/create`, {
@@ -229,8 +296,17 @@ const api = {
         return response.data;
     },
 
-    async getNotDealReports() {
+    async getNotDealReports(params = {}) {
+        // params: { limit, order, c_id, owner_m_id, reporter_m_id, after_create_at, after_id }
         const response = await axios.get(`${API_BASE_URL}/staff/report`, {
+            params,
+            headers: getHeaders(true)
+        });
+        return response.data;
+    },
+
+    async getQueueCounts() {
+        const response = await axios.get(`${API_BASE_URL}/staff/queue_counts`, {
             headers: getHeaders(true)
         });
         return response.data;
@@ -245,8 +321,18 @@ const api = {
         return response.data;
     },
 
-    async getNotDealVerification() {
+    async concludeReportsBatch(reports) {
+        // reports: [{ re_id, r_conclusion }]
+        const response = await axios.post(`${API_BASE_URL}/staff/report/batch`, { reports }, {
+            headers: getHeaders(true)
+        });
+        return response.data;
+    },
+
+    async getNotDealVerification(params = {}) {
+        // params: { limit, order, c_id, owner_m_id, after_create_at, after_id }
         const response = await axios.get(`${API_BASE_URL}/staff/verification`, {
+            params,
             headers: getHeaders(true)
         });
         return response.data;
@@ -259,6 +345,14 @@ const api = {
             headers: getHeaders(true)
         });
         return response.data;
+    },
+
+    async concludeVerificationsBatch(verifications) {
+        // verifications: [{ iv_id, v_conclusion }]
+        const response = await axios.post(`${API_BASE_URL}/staff/verification/batch`, { verifications }, {
+            headers: getHeaders(true)
+        });
+        return response.data;
     }
 };
 
@@ -299,6 +393,9 @@ createApp({
             bans: [],
             verifications: [],
             reports: [],
+            verificationsCursor: null,
+            reportsCursor: null,
+            queueCounts: { reports: 0, verifications: 0 },
             categories: [],
             selectedCategory: '',
             ownerReservations: [], // 物主的未來預約詳情
@@ -886,10 +983,11 @@ createApp({
             this.showReservationModal = true;
             this.showWishlist = false; // 關閉待借清單側邊欄
             
-            // 為每個物品載入取貨地點和借用時間
-            for (let i = 0; i < this.reservationForm.rd_list.length; i++) {
-                await this.loadReservationItemData(i);
-            }
+            // 為每個物品載入取貨地點，借用時間一次查詢全部物品
+            await Promise.all([
+                ...this.reservationForm.rd_list.map((rd, i) => this.loadReservationItemData(i, false)),
+                this.loadReservationBorrowedTimes(this.reservationForm.rd_list)
+            ]);
         },
         
         async addToReservationList(item) {
@@ -913,7 +1011,30 @@ createApp({
             this.showReservationModal = true;
         },
         
-        async loadReservationItemData(index) {
+        async loadReservationBorrowedTimes(rdList) {
+            const rows = rdList.filter(rd => rd.i_id);
+            if (rows.length === 0) {
+                return;
+            }
+            try {
+                const result = await api.getItemsAvailability(rows.map(rd => parseInt(rd.i_id)));
+                const busyById = {};
+                (result.availability || []).forEach(a => {
+                    busyById[a.i_id] = a.busy.map(b => ({ est_start_at: b.start, est_due_at: b.end }));
+                });
+                rows.forEach(rd => {
+                    rd.borrowed_times = busyById[parseInt(rd.i_id)] || [];
+                });
+            } catch (borrowedError) {
+                // 如果載入借用時間失敗，設為空陣列
+                console.warn('載入借用時間失敗:', borrowedError);
+                rows.forEach(rd => {
+                    rd.borrowed_times = [];
+                });
+            }
+        },
+        
+        async loadReservationItemData(index, withBorrowedTimes = true) {
             const rd = this.reservationForm.rd_list[index];
             if (!rd.i_id) {
                 rd.pickup_places = [];
@@ -927,13 +1048,8 @@ createApp({
                 rd.pickup_places = pickupResult.pickup_places || [];
                 
                 // 載入借用時間
-                try {
-                    const borrowedResult = await api.getItemBorrowedTime(rd.i_id);
-                    rd.borrowed_times = borrowedResult.borrowed_time || [];
-                } catch (borrowedError) {
-                    // 如果載入借用時間失敗，設為空陣列
-                    console.warn('載入借用時間失敗:', borrowedError);
-                    rd.borrowed_times = [];
+                if (withBorrowedTimes) {
+                    await this.loadReservationBorrowedTimes([rd]);
                 }
             } catch (error) {
                 console.error('載入物品資料失敗:', error);
@@ -1130,11 +1246,22 @@ createApp({
         },
         
         // 員工功能
-        async loadVerifications() {
+        async loadQueueCounts() {
+            try {
+                this.queueCounts = await api.getQueueCounts();
+            } catch (error) {
+                console.warn('載入待處理數量失敗:', error);
+            }
+        },
+        
+        async loadVerifications(more = false) {
             try {
                 this.loading = true;
-                const result = await api.getNotDealVerification();
-                this.verifications = result.verifications || [];
+                const result = await api.getNotDealVerification(more ? this.verificationsCursor : {});
+                const page = result.verifications || [];
+                this.verifications = more ? this.verifications.concat(page) : page;
+                this.verificationsCursor = result.next_cursor;
+                this.loadQueueCounts();
             } catch (error) {
                 this.showError(error.response?.data?.error || '載入失敗');
             } finally {
@@ -1155,11 +1282,14 @@ createApp({
             }
         },
         
-        async loadReports() {
+        async loadReports(more = false) {
             try {
                 this.loading = true;
-                const result = await api.getNotDealReports();
-                this.reports = result.reports || [];
+                const result = await api.getNotDealReports(more ? this.reportsCursor : {});
+                const page = result.reports || [];
+                this.reports = more ? this.reports.concat(page) : page;
+                this.reportsCursor = result.next_cursor;
+                this.loadQueueCounts();
             } catch (error) {
                 this.showError(error.response?.data?.error || '載入失敗');
             } finally {